@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import tempfile
+from datetime import datetime
+
+from fatigue_detector import EYE_CLOSED, GAZE_STABILITY_THRESHOLD_FRAMES, YAWN_MAR_THRESHOLD
+from landmark_features import F_EAR, F_MAR, F_GAZE_RATIO, F_NOSE_Y, F_FACE_HEIGHT
+
+# --- Tunable Parameters ---
+HALF_LIFE_SEC = 600.0 # Confident frames this old carry half the weight of the newest
+PRIOR_FRAMES = 300 # The stored profile counts as this many frames, so the first minutes move it gently
+MIN_CONFIDENT_FRAMES = 300 # Frames observed before outliers are clipped and estimates are applied
+OUTLIER_SIGMAS = 3.0 # Samples further than this from the mean are clipped to it, so a real shift is still followed
+MIN_SPREAD_FRACTION = 0.05 # Floor on the clipping band, as a fraction of the mean
+MAX_DRIFT_FRACTION = 0.30 # Estimates are held within this fraction of the last full calibration
+APPLY_INTERVAL_SEC = 10.0 # How often the detector and extractor pick up the current estimate
+CHECKPOINT_INTERVAL_SEC = 300.0 # How often a changed estimate is written to the profile file
+MAX_FRAME_GAP_SEC = 1.0 # Weight a frame after a long absence as if it followed the previous one closely
+MIN_SAVE_CHANGE = 0.01 # Relative change of any value that makes a checkpoint worth writing
+MAX_HISTORY = 100 # Profile versions kept in the file for drift inspection
+
+PROFILE_KEYS = ("ear_threshold", "avg_open_ear", "avg_face_height", "avg_center_gaze", "avg_nose_y")
+SOURCE_CALIBRATION = "calibration"
+SOURCE_ADAPTIVE = "adaptive"
+
+
+# --- Versioned Profile File ---
+def read_profile(path):
+    """The profile file as a dict, or None if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_profile(path, values, source):
+    """
+    Writes `values` (PROFILE_KEYS -> float) as the next version of the profile
+    and returns the written dict. The top-level keys stay where earlier
+    releases read them; `baseline` is the last full calibration, which
+    adaptive updates are bounded by, and `history` lists recent versions.
+    The file is replaced atomically, so a crash never leaves half a profile.
+    """
+    previous = read_profile(path) or {}
+    history = previous.get("history")
+    if history is None:
+        # A profile from before versioning counts as version 1, from a full calibration.
+        history = [{"version": 1, "source": SOURCE_CALIBRATION, "saved_at": None, **{key: previous.get(key) for key in PROFILE_KEYS}}] if previous else []
+    version = history[-1]["version"] + 1 if history else 1
+    entry = {"version": version, "source": source, "saved_at": datetime.now().isoformat(timespec='seconds'), **{key: values[key] for key in PROFILE_KEYS}}
+    if source == SOURCE_CALIBRATION:
+        baseline = entry
+    else:
+        baseline = previous.get("baseline") or next((h for h in reversed(history) if h["source"] == SOURCE_CALIBRATION), entry)
+    profile = {**entry, "baseline": baseline, "history": (history + [entry])[-MAX_HISTORY:]}
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".calibration_profile.", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(profile, f, indent=4)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+    return profile
+
+
+# --- Streaming Estimator ---
+class EwmaStats:
+    """Exponentially weighted mean and variance over time; constant memory, older samples fade with `half_life_sec`."""
+    __slots__ = ("mean", "var", "count", "half_life_sec", "prior_frames")
+
+    def __init__(self, initial_mean, half_life_sec=HALF_LIFE_SEC, prior_frames=PRIOR_FRAMES):
+        self.mean = initial_mean
+        self.var = 0.0
+        self.count = 0
+        self.half_life_sec = half_life_sec
+        self.prior_frames = prior_frames
+
+    def add(self, value, dt):
+        self.count += 1
+        # A running mean (with the prior counted as `prior_frames` samples) until the time-based decay is the larger weight.
+        alpha = max(1.0 - 0.5 ** (max(dt, 0.0) / self.half_life_sec), 1.0 / (self.count + self.prior_frames))
+        delta = value - self.mean
+        self.mean += alpha * delta
+        self.var = (1.0 - alpha) * (self.var + alpha * delta * delta)
+
+    @property
+    def std(self):
+        return math.sqrt(self.var)
+
+
+class AdaptiveCalibration:
+    """
+    Keeps the calibration profile current during monitoring.
+
+    Only confident open-eye frames are used: a face is present, gaze has been
+    stable on the screen long enough for blink detection, the eyes are
+    clearly open, the head is level and the mouth is closed. From these it
+    tracks open-eye EAR, face height, gaze ratio and nose height with
+    exponentially weighted statistics; once enough frames were seen, outliers
+    are clipped to the edge of the expected band rather than dropped, so a
+    sudden real change (a moved camera) is still followed, only gradually. The EAR threshold follows the open-eye EAR with the
+    threshold/open-EAR ratio of the last full calibration. Every estimate is
+    held within MAX_DRIFT_FRACTION of that calibration, so a bad stretch of
+    frames can never walk the profile off.
+
+    Args:
+        profile (dict): Current profile values (PROFILE_KEYS).
+        baseline (dict): Values of the last full calibration; defaults to `profile`.
+    """
+
+    def __init__(self, profile, baseline=None):
+        baseline = baseline or profile
+        self.baseline = {key: float(baseline[key]) for key in PROFILE_KEYS}
+        self.threshold_ratio = self.baseline["ear_threshold"] / self.baseline["avg_open_ear"]
+        self.open_ear = EwmaStats(float(profile["avg_open_ear"]))
+        self.face_height = EwmaStats(float(profile["avg_face_height"]))
+        self.gaze = EwmaStats(float(profile["avg_center_gaze"]))
+        self.nose_y = EwmaStats(float(profile["avg_nose_y"]))
+        self.clipped = 0
+        self.last_t = None
+        self.last_applied_t = None
+        self.last_checkpoint_t = None
+        self.saved_values = self.values()
+
+    @classmethod
+    def from_profile_file(cls, path):
+        """Starts from the stored profile, or None if there is no complete one to adapt."""
+        stored = read_profile(path)
+        if not stored or not all(stored.get(key) for key in PROFILE_KEYS):
+            return None
+        baseline = stored.get("baseline")
+        if not baseline or not all(baseline.get(key) for key in PROFILE_KEYS):
+            baseline = None
+        return cls(stored, baseline)
+
+    @staticmethod
+    def is_confident(detector, features):
+        return (detector.gaze_centered_frames > GAZE_STABILITY_THRESHOLD_FRAMES and detector.eye_state != EYE_CLOSED
+                and not detector.is_head_tilted and detector.last_ear > detector.reopen_threshold and features[F_MAR] < YAWN_MAR_THRESHOLD)
+
+    def observe(self, detector, features, t):
+        """Feeds one analysed frame; frames that are not confident open-eye frames are ignored. Returns True if used."""
+        if features is None or not self.is_confident(detector, features):
+            return False
+        dt = 0.0 if self.last_t is None else min(t - self.last_t, MAX_FRAME_GAP_SEC)
+        self.last_t = t
+        for stats, index in ((self.open_ear, F_EAR), (self.face_height, F_FACE_HEIGHT), (self.gaze, F_GAZE_RATIO), (self.nose_y, F_NOSE_Y)):
+            value = float(features[index])
+            if stats.count >= MIN_CONFIDENT_FRAMES:
+                band = max(OUTLIER_SIGMAS * stats.std, MIN_SPREAD_FRACTION * abs(stats.mean))
+                if abs(value - stats.mean) > band:
+                    self.clipped += 1
+                    value = stats.mean + band if value > stats.mean else stats.mean - band
+            stats.add(value, dt)
+        return True
+
+    @property
+    def ready(self):
+        return self.open_ear.count >= MIN_CONFIDENT_FRAMES
+
+    def _bounded(self, key, value):
+        base = self.baseline[key]
+        low, high = base * (1 - MAX_DRIFT_FRACTION), base * (1 + MAX_DRIFT_FRACTION)
+        return min(max(value, min(low, high)), max(low, high))
+
+    def values(self):
+        """The current estimate, in profile-file keys."""
+        open_ear = self._bounded("avg_open_ear", self.open_ear.mean)
+        return {
+            "ear_threshold": self._bounded("ear_threshold", open_ear * self.threshold_ratio),
+            "avg_open_ear": open_ear,
+            "avg_face_height": self._bounded("avg_face_height", self.face_height.mean),
+            "avg_center_gaze": self._bounded("avg_center_gaze", self.gaze.mean),
+            "avg_nose_y": self._bounded("avg_nose_y", self.nose_y.mean),
+        }
+
+    def drift(self):
+        """Relative change of each value from the last full calibration."""
+        current = self.values()
+        return {key: round(current[key] / self.baseline[key] - 1.0, 4) if self.baseline[key] else 0.0 for key in PROFILE_KEYS}
+
+    def maybe_apply(self, detector, extractor, t):
+        """Hands the estimate to the detector and feature extractor at most every APPLY_INTERVAL_SEC."""
+        if not self.ready or (self.last_applied_t is not None and t - self.last_applied_t < APPLY_INTERVAL_SEC):
+            return False
+        self.last_applied_t = t
+        current = self.values()
+        detector.set_calibration(current["ear_threshold"], current["avg_center_gaze"], current["avg_face_height"])
+        extractor.nose_baseline = current["avg_nose_y"]
+        return True
+
+    def maybe_checkpoint(self, path, t, force=False):
+        """Writes a new profile version if the estimate moved enough since the last one and, unless forced, enough time passed."""
+        if not self.ready:
+            return None
+        if not force and self.last_checkpoint_t is not None and t - self.last_checkpoint_t < CHECKPOINT_INTERVAL_SEC:
+            return None
+        if self.last_checkpoint_t is None and not force:
+            self.last_checkpoint_t = t # The first interval starts once the estimate is ready
+            return None
+        self.last_checkpoint_t = t
+        current = self.values()
+        if all(abs(current[key] - self.saved_values[key]) <= MIN_SAVE_CHANGE * abs(self.saved_values[key]) for key in PROFILE_KEYS):
+            return None
+        try:
+            profile = write_profile(path, current, SOURCE_ADAPTIVE)
+        except OSError as e:
+            print(f"[WARNING] Could not checkpoint the adapted calibration profile: {e}")
+            return None
+        self.saved_values = current
+        return profile
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "confident_frames": self.open_ear.count,
+            "clipped_samples": self.clipped,
+            "open_ear_std": round(self.open_ear.std, 4),
+            "values": {key: round(value, 4) for key, value in self.values().items()},
+            "drift": self.drift(),
+        }
@@ -0,0 +1,202 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+# --- Tunable Parameters ---
+PRIORITY_HIGH = 0 # Fatigue
+PRIORITY_NORMAL = 1 # Eye strain and breaks
+PRIORITY_LOW = 2 # Status announcements (paused, welcome back)
+NOTIFY_MIN_INTERVAL_SEC = 5.0 # Gap between two desktop notifications
+NOTIFY_MAX_PER_MINUTE = 6
+VOICE_MIN_INTERVAL_SEC = 1.0 # Gap after one spoken alert finishes before the next starts
+VOICE_MAX_PER_MINUTE = 8
+ALERT_MAX_AGE_SEC = 20.0 # A prompt that waited longer than this is no longer relevant and is dropped
+MAX_PENDING = 16 # Per channel; the lowest-priority alert makes room when full
+
+# Fields of a queued entry; a list, so a coalesced alert can be updated in place.
+_PRIORITY, _SEQ, _KEY, _PAYLOAD, _QUEUED_AT, _LIVE = range(6)
+
+
+class AlertChannel:
+    """
+    One output (desktop notifications, or the voice) with a single
+    long-lived worker thread that delivers alerts one at a time.
+
+    `submit()` never blocks: it queues the alert by priority and returns.
+    An alert whose key is already pending replaces it (the newest text
+    wins, the better priority is kept) rather than queueing a duplicate.
+    The worker honours a minimum gap between deliveries and a per-minute
+    cap; alerts that wait longer than `max_age_sec` are dropped unsent.
+
+    Args:
+        name (str): Used for the thread name and log lines.
+        deliver (callable): Called on the worker thread with each payload.
+        min_interval_sec (float): Gap between the end of one delivery and the start of the next.
+        max_per_minute (int): Deliveries allowed in any 60-second window.
+    """
+
+    def __init__(self, name, deliver, min_interval_sec, max_per_minute, max_age_sec=ALERT_MAX_AGE_SEC, max_pending=MAX_PENDING, clock=time.monotonic):
+        self.name = name
+        self.deliver = deliver
+        self.min_interval_sec = min_interval_sec
+        self.max_per_minute = max_per_minute
+        self.max_age_sec = max_age_sec
+        self.max_pending = max_pending
+        self.clock = clock
+        self.counts = {"queued": 0, "coalesced": 0, "sent": 0, "stale": 0, "evicted": 0, "failed": 0}
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {} # key -> live heap entry
+        self._seq = 0
+        self._sent_at = deque() # Delivery start times inside the last minute
+        self._next_allowed = 0.0
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, key, payload, priority=PRIORITY_NORMAL):
+        with self._cond:
+            if self._stopping:
+                return False
+            now = self.clock()
+            entry = self._pending.get(key)
+            if entry is not None:
+                self.counts["coalesced"] += 1
+                entry[_PAYLOAD] = payload
+                entry[_QUEUED_AT] = now # The repeat shows the alert is still current
+                if priority >= entry[_PRIORITY]:
+                    return True
+                # Re-queued at the better priority; the old heap entry is skipped when it surfaces.
+                entry[_LIVE] = False
+            elif len(self._pending) >= self.max_pending and not self._evict_below(priority):
+                self.counts["evicted"] += 1
+                return False
+            self._seq += 1
+            entry = [priority, self._seq, key, payload, now, True]
+            heapq.heappush(self._heap, entry)
+            self._pending[key] = entry
+            self.counts["queued"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"Alerts-{self.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return True
+
+    def _evict_below(self, priority):
+        # Drops the newest of the lowest-priority pending alerts, if it ranks below `priority`.
+        worst = max(self._pending.values(), key=lambda e: (e[_PRIORITY], e[_SEQ]))
+        if worst[_PRIORITY] <= priority:
+            return False
+        worst[_LIVE] = False
+        del self._pending[worst[_KEY]]
+        self.counts["evicted"] += 1
+        return True
+
+    def clear(self):
+        """Drops every pending alert (e.g. when the session that raised them ends)."""
+        with self._cond:
+            for entry in self._pending.values():
+                entry[_LIVE] = False
+            self._pending.clear()
+            self._heap.clear()
+
+    def close(self, timeout=None):
+        """Drops pending alerts and stops the worker once its current delivery returns."""
+        with self._cond:
+            self._stopping = True
+            self.clear()
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _wait_time(self, now):
+        while self._sent_at and now - self._sent_at[0] >= 60.0:
+            self._sent_at.popleft()
+        wait = self._next_allowed - now
+        if len(self._sent_at) >= self.max_per_minute:
+            wait = max(wait, self._sent_at[0] + 60.0 - now)
+        return wait
+
+    def _next_entry(self):
+        # Blocks until an alert may be delivered; returns None once the channel is closed.
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                while self._heap and not self._heap[0][_LIVE]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = self.clock()
+                entry = self._heap[0]
+                if now - entry[_QUEUED_AT] > self.max_age_sec:
+                    heapq.heappop(self._heap)
+                    del self._pending[entry[_KEY]]
+                    self.counts["stale"] += 1
+                    continue
+                wait = self._wait_time(now)
+                if wait > 0:
+                    # New submissions wake the worker too, so a higher-priority alert is considered first.
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                del self._pending[entry[_KEY]]
+                self._sent_at.append(now)
+                return entry
+
+    def _run(self):
+        while True:
+            entry = self._next_entry()
+            if entry is None:
+                return
+            try:
+                self.deliver(entry[_PAYLOAD])
+                self.counts["sent"] += 1
+            except Exception as e:
+                self.counts["failed"] += 1
+                print(f"[WARNING] {self.name} alert failed: {e}")
+            with self._cond:
+                self._next_allowed = self.clock() + self.min_interval_sec
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counts, pending=len(self._pending))
+
+
+class AlertDispatcher:
+    """
+    Routes monitoring alerts to the desktop-notification and voice channels.
+    The monitoring loop calls `alert()` and carries on; each channel's worker
+    does the slow part. A channel whose backend is unavailable is None and
+    its part of an alert is ignored.
+
+    Args:
+        notify (callable): Shows one notification, given (title, message); None to disable.
+        speak (callable): Speaks one text to completion; None to disable.
+    """
+
+    def __init__(self, notify=None, speak=None):
+        self.notifications = AlertChannel("notify", lambda payload: notify(*payload), NOTIFY_MIN_INTERVAL_SEC, NOTIFY_MAX_PER_MINUTE) if notify else None
+        self.voice = AlertChannel("voice", speak, VOICE_MIN_INTERVAL_SEC, VOICE_MAX_PER_MINUTE) if speak else None
+
+    def alert(self, key, title=None, message=None, speech=None, priority=PRIORITY_NORMAL):
+        """Queues a notification and/or a spoken line under `key`; duplicates of a pending key are merged."""
+        if title is not None and self.notifications is not None:
+            self.notifications.submit(key, (title, message), priority)
+        if speech is not None and self.voice is not None:
+            self.voice.submit(key, speech, priority)
+
+    def clear(self):
+        for channel in (self.notifications, self.voice):
+            if channel is not None:
+                channel.clear()
+
+    def close(self, timeout=None):
+        for channel in (self.notifications, self.voice):
+            if channel is not None:
+                channel.close(timeout)
+
+    def stats(self):
+        return {name: channel.stats() for name, channel in (("notify", self.notifications), ("voice", self.voice)) if channel is not None}
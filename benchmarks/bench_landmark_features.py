@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for per-frame landmark feature extraction.
+
+Compares the scalar `calculate_ear` / `calculate_mar` path that the
+monitoring loop used to run with `LandmarkFeatureExtractor`, on a synthetic
+478-point face. Run from the repository root:
+
+    python benchmarks/bench_landmark_features.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from landmark_features import (  # noqa: E402
+    LandmarkFeatureExtractor, calculate_ear, calculate_mar, NUM_LANDMARKS,
+    LEFT_EYE_INDICES, RIGHT_EYE_INDICES, LEFT_EYE_CORNER, RIGHT_EYE_CORNER,
+    NOSE_TIP_LANDMARK, FOREHEAD_LANDMARK, CHIN_LANDMARK,
+)
+
+try:
+    from mediapipe.framework.formats import landmark_pb2
+    MEDIAPIPE_AVAILABLE = True
+except ImportError:
+    MEDIAPIPE_AVAILABLE = False
+
+
+class _Point:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z):
+        self.x = x; self.y = y; self.z = z
+
+
+def make_landmarks(seed=0):
+    """Builds a landmark list shaped like MediaPipe's output (protobuf if available)."""
+    coords = np.random.default_rng(seed).uniform(0.2, 0.8, size=(NUM_LANDMARKS, 3))
+    if MEDIAPIPE_AVAILABLE:
+        landmark_list = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z in coords:
+            landmark_list.landmark.add(x=x, y=y, z=z)
+        return landmark_list
+    return [_Point(x, y, z) for x, y, z in coords]
+
+
+def legacy_features(landmarks, avg_nose_y=0.5):
+    """The per-frame feature code as it was inlined in run_monitoring_loop."""
+    avg_ear = (calculate_ear(landmarks, LEFT_EYE_INDICES) + calculate_ear(landmarks, RIGHT_EYE_INDICES)) / 2.0
+    left_eye_x = landmarks[LEFT_EYE_CORNER].x; right_eye_x = landmarks[RIGHT_EYE_CORNER].x; nose_x = landmarks[NOSE_TIP_LANDMARK].x
+    gaze_ratio = (nose_x - left_eye_x) / (right_eye_x - left_eye_x + 1e-6)
+    y_delta = landmarks[NOSE_TIP_LANDMARK].y - avg_nose_y
+    face_height = abs(landmarks[CHIN_LANDMARK].y - landmarks[FOREHEAD_LANDMARK].y)
+    mar = calculate_mar(landmarks)
+    return avg_ear, mar, gaze_ratio, y_delta, face_height
+
+
+def time_per_call(func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main(number=2000):
+    face_landmarks = make_landmarks()
+    landmarks = getattr(face_landmarks, 'landmark', face_landmarks)
+    extractor = LandmarkFeatureExtractor()
+    extractor.nose_baseline = 0.5
+
+    results = {
+        "legacy scalar functions": time_per_call(lambda: legacy_features(landmarks), number),
+        "extractor (landmarks -> array + features)": time_per_call(lambda: extractor.extract(face_landmarks), number),
+        "extractor (all landmarks copied first)": time_per_call(lambda: (extractor.load_landmarks(face_landmarks), extractor.compute()), number // 10),
+        "extractor (features only, array given)": time_per_call(lambda: extractor.compute(), number),
+    }
+    source = "protobuf" if MEDIAPIPE_AVAILABLE else "plain Python"
+    print(f"Per-frame feature cost, {NUM_LANDMARKS} {source} landmarks, best of 5 x {number} calls:")
+    for name, usec in results.items():
+        print(f"  {name:<42} {usec:8.1f} us/frame")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""
+Hot-path benchmark suite for the monitoring pipeline and dashboard API.
+
+Times each stage of the monitoring loop on synthetic landmarks and fixed
+frames, then times the dashboard endpoints and the session report against
+generated databases of increasing size. Results are written as JSON so runs
+can be compared across releases.
+
+    python benchmarks/run_benchmarks.py                        # 10k and 1M events
+    python benchmarks/run_benchmarks.py --sizes 10000,1000000,10000000 --db-dir ~/bench-dbs
+    python benchmarks/run_benchmarks.py --skip-api --output pipeline.json
+    python benchmarks/run_benchmarks.py --skip-api --video recording.mp4   # replay benchmarks on a real recording
+    python benchmarks/run_benchmarks.py --skip-api --streams 8             # multi-stream scaling up to 8 workers
+
+The replay benchmarks need a video with a face: --video, or a generated clip
+when scikit-image is installed; otherwise they are skipped.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic  # noqa: E402
+from bench_landmark_features import make_landmarks  # noqa: E402
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import real_time_eye_tracking as tracker  # noqa: E402
+import lazy_runtime  # noqa: E402
+import replay  # noqa: E402
+from input_scaler import InputScaler, SCALE_LEVELS  # noqa: E402
+import settings_cache  # noqa: E402
+import wellness_assistant  # noqa: E402
+from event_writer import EventWriter  # noqa: E402
+from fatigue_detector import FatigueDetector  # noqa: E402
+from landmark_features import LandmarkFeatureExtractor, F_EAR  # noqa: E402
+
+
+def measure(func, repeat, warmup=1):
+    """Calls `func` `repeat` times and summarises wall-clock latency in milliseconds."""
+    for _ in range(warmup):
+        func()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples[i] = time.perf_counter() - started
+    samples *= 1000.0
+    return {
+        "runs": repeat,
+        "mean_ms": round(float(samples.mean()), 4),
+        "median_ms": round(float(np.median(samples)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "min_ms": round(float(samples.min()), 4),
+    }
+
+
+def use_database(db_path):
+    """Points the monitoring module (and its settings cache) at `db_path`."""
+    tracker.DB_FILE = db_path
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracker.setup_database()
+    settings_cache.refresh(db_path)
+
+
+# --- Monitoring Loop Stages ---
+def bench_features(results, repeat):
+    face_landmarks = make_landmarks()
+    extractor = LandmarkFeatureExtractor()
+    results["features.landmarks_to_features"] = measure(lambda: extractor.extract(face_landmarks), repeat)
+    results["features.array_to_features"] = measure(extractor.compute, repeat)
+
+
+def bench_detector(results, repeat):
+    landmarks, timestamps = synthetic.make_trace(seconds=120)
+    extractor = LandmarkFeatureExtractor()
+    extractor.nose_baseline = synthetic.SYNTHETIC_PROFILE["avg_nose_y"]
+    features = np.full((len(timestamps), extractor.features.shape[0]), np.nan)
+    for i, points in enumerate(landmarks):
+        if not np.isnan(points[0, 0]):
+            features[i] = extractor.compute(points)
+    profile = synthetic.SYNTHETIC_PROFILE
+    calibration = (profile["ear_threshold"], profile["avg_center_gaze"], profile["avg_face_height"])
+
+    def stream():
+        detector = FatigueDetector(*calibration)
+        for row, t in zip(features, timestamps.tolist()):
+            detector.step(None if row[0] != row[0] else row, t)
+
+    frames = len(timestamps)
+    runs = max(3, repeat // 100)
+    per_session = measure(stream, runs)
+    results["detector.step"] = {"frames": frames, "per_frame_us": round(per_session["mean_ms"] * 1000 / frames, 3)}
+    per_session = measure(lambda: FatigueDetector(*calibration).run_batch(features, timestamps), runs)
+    results["detector.run_batch"] = {"frames": frames, "per_frame_us": round(per_session["mean_ms"] * 1000 / frames, 3)}
+
+
+def bench_inference(results, repeat):
+    import cv2
+    frames = synthetic.make_frames()
+    state = {"i": 0}
+    face_mesh = lazy_runtime.get_face_mesh()
+
+    def one_frame():
+        frame = cv2.flip(frames[state["i"] % len(frames)], 1)
+        face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        state["i"] += 1
+    results["inference.flip_convert_facemesh"] = measure(one_frame, max(10, repeat // 20))
+
+
+def read_video_rgb(video_path, max_frames=None):
+    """The video's frames as FaceMesh sees them: mirrored and converted to RGB."""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while max_frames is None or len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames
+
+
+def bench_input_scale(results, video_path):
+    """
+    FaceMesh time and landmark quality on a replayed face video at each input
+    scale the InputScaler can pick. EAR jitter is the mean |dEAR| between
+    consecutive frames; EAR error is against the full-resolution run.
+    """
+    import mediapipe as mp
+    frames = read_video_rgb(video_path)
+    extractor = LandmarkFeatureExtractor()
+    reference = None
+    for scale_index, scale in enumerate(SCALE_LEVELS):
+        face_mesh = mp.solutions.face_mesh.FaceMesh(**lazy_runtime.FACE_MESH_OPTIONS)
+        scaler = InputScaler()
+        scaler.scale_index = scale_index
+        samples = np.empty(len(frames))
+        ears = np.full(len(frames), np.nan)
+        for i, rgb_frame in enumerate(frames):
+            started = time.perf_counter()
+            faces = scaler.process(face_mesh, rgb_frame).multi_face_landmarks
+            samples[i] = time.perf_counter() - started
+            if faces:
+                ears[i] = extractor.extract(faces[0])[F_EAR]
+        face_mesh.close()
+        if reference is None:
+            reference = ears
+        samples *= 1000.0
+        results[f"input_scale[{scale}]"] = {
+            "frames": len(frames),
+            "mean_ms": round(float(samples.mean()), 3),
+            "p95_ms": round(float(np.percentile(samples, 95)), 3),
+            "face_found": round(float(np.mean(~np.isnan(ears))), 4),
+            "ear_jitter": round(float(np.nanmean(np.abs(np.diff(ears)))), 5),
+            "ear_error_vs_full": round(float(np.nanmean(np.abs(ears - reference))), 5),
+        }
+
+
+# Run in a fresh interpreter: spawned workers re-import the parent's main script, and this one loads the whole app.
+_MULTI_STREAM_SCRIPT = """
+import contextlib, io, json, sys, time
+import multi_stream
+db_path, profile_path, *sources = sys.argv[1:]
+with contextlib.redirect_stdout(io.StringIO()):
+    monitor = multi_stream.MultiStreamMonitor(sources, db_path, profile_path=profile_path)
+    started = time.perf_counter()
+    monitor.start()
+    while monitor.running:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    monitor.stop()
+print(json.dumps({"seconds": elapsed, "frames": sum(s["frames"] for s in monitor.stream_stats.values()), "errors": monitor.errors}))
+"""
+
+
+def bench_multi_stream(results, video_path, scratch_dir, streams):
+    """
+    Aggregate analysis throughput of multi_stream.py replaying the same video
+    on 1 and on `streams` worker processes, including worker start-up.
+    """
+    profile_path = os.path.join(scratch_dir, "profile.json")
+    with open(profile_path, "w") as f:
+        json.dump(synthetic.SYNTHETIC_PROFILE, f)
+    baseline_fps = None
+    for n in sorted({1, streams}):
+        db_path = os.path.join(scratch_dir, f"multi_stream_{n}.db")
+        use_database(db_path)
+        output = subprocess.run([sys.executable, "-c", _MULTI_STREAM_SCRIPT, db_path, profile_path] + [video_path] * n,
+                                cwd=REPO_DIR, check=True, capture_output=True, text=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        fps = run["frames"] / run["seconds"]
+        baseline_fps = baseline_fps or fps
+        results[f"multi_stream[{n}]"] = {"streams": n, "cpus": os.cpu_count(), "frames": run["frames"], "seconds": round(run["seconds"], 2),
+                                         "fps": round(fps, 1), "speedup": round(fps / baseline_fps, 2), "errors": run["errors"]}
+
+
+def bench_overlay(results, repeat):
+    frame = synthetic.make_frames(count=1)[0]
+    results["overlay.draw_monitoring_overlay"] = measure(
+        lambda: tracker.draw_monitoring_overlay(frame, True, 120, 0.3, 16.0, 2, 4, False, 0.01, 0.4), repeat)
+
+
+def bench_analysis_stage(results, scratch_dir):
+    """Replays a synthetic two-minute trace; covers state updates, overlays and event logging per frame."""
+    landmarks, timestamps = synthetic.make_trace(seconds=120)
+    trace_path = os.path.join(scratch_dir, "trace.npz")
+    profile_path = os.path.join(scratch_dir, "profile.json")
+    np.savez(trace_path, landmarks=landmarks, timestamps=timestamps)
+    with open(profile_path, "w") as f:
+        json.dump(synthetic.SYNTHETIC_PROFILE, f)
+    with contextlib.redirect_stdout(io.StringIO()):
+        outcome = replay.replay(trace_path, db_path=os.path.join(scratch_dir, "replay.db"), profile_path=profile_path)
+    analysis = outcome["pipeline"]["analysis"]
+    results["analysis.per_frame"] = {"runs": analysis["frames"], "mean_ms": analysis["avg_ms"], "max_ms": analysis["max_ms"]}
+    results["analysis.replay_fps"] = {"fps": outcome["fps"], "events": outcome["events"]}
+
+
+def bench_log_event(results, scratch_dir, repeat):
+    db_path = os.path.join(scratch_dir, "log_event.db")
+    use_database(db_path)
+    session_id = 1
+
+    # Enqueue cost seen by the capture loop while the background writer is running.
+    tracker.event_writer = EventWriter(db_path).start()
+    results["log_event.enqueue"] = measure(lambda: tracker.log_event(session_id, "BLINK"), repeat)
+    started = time.perf_counter()
+    tracker.event_writer.close()
+    drain_sec = time.perf_counter() - started
+    tracker.event_writer = None
+    results["log_event.drain"] = {"rows": repeat + 1, "drain_ms": round(drain_sec * 1000, 3)}
+
+    # Direct write path used when no session writer is active.
+    results["log_event.synchronous"] = measure(lambda: tracker.log_event(session_id, "BLINK"), max(10, repeat // 50))
+
+
+def bench_metrics(results, repeat):
+    """Cost the exported instruments add to each analysed frame, and the cost of one /metrics scrape."""
+    frames = 1000
+
+    def instrumented_frames():
+        for _ in range(frames):
+            started = time.perf_counter()
+            tracker.analysis_seconds.observe_since(started)
+            tracker.face_mesh_seconds.observe(0.012)
+            tracker.frame_latency_seconds.observe(0.03)
+            tracker.frames_analysed.inc()
+    per_batch = measure(instrumented_frames, max(3, repeat // 50))
+    results["metrics.per_frame"] = {"frames": frames, "per_frame_us": round(per_batch["mean_ms"] * 1000 / frames, 3)}
+    client = tracker.app.test_client()
+    results["metrics.scrape"] = measure(lambda: client.get("/metrics"), max(10, repeat // 10))
+
+
+# --- Dashboard API ---
+def generated_database(db_dir, size):
+    db_path = os.path.join(db_dir, f"bench_{size}.db")
+    if not os.path.exists(db_path):
+        print(f"[INFO] Generating {size:,} events in {db_path} ...")
+        use_database(db_path)
+        synthetic.populate_database(db_path, size)
+    return db_path
+
+
+def bench_api(results, sizes, db_dir, repeat):
+    client = tracker.app.test_client()
+    for size in sizes:
+        db_path = generated_database(db_dir, size)
+        use_database(db_path)
+        conn = sqlite3.connect(db_path)
+        session_id, start_time, end_time = conn.execute("SELECT session_id, start_time, end_time FROM sessions ORDER BY session_id DESC LIMIT 1").fetchone()
+        conn.close()
+
+        def get(url):
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        prefix = f"api[{size}]"
+        runs = max(3, repeat // max(1, size // 10000))
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[f"{prefix}./api/summary_stats"] = measure(lambda: get("/api/summary_stats"), runs)
+            results[f"{prefix}./api/weekly_report"] = measure(lambda: get("/api/weekly_report"), runs)
+            results[f"{prefix}./api/session_report/<id>"] = measure(lambda: get(f"/api/session_report/{session_id}"), runs)
+            results[f"{prefix}.generate_session_summary"] = measure(
+                lambda: wellness_assistant.generate_session_summary(session_id, start_time, end_time, db_path=db_path), runs)
+
+
+def bench_startup(results, repeat):
+    # A fresh interpreter each run; the module's own import is what delays the dashboard.
+    command = [sys.executable, "-c", "import real_time_eye_tracking"]
+    results["startup.import_tracker"] = measure(
+        lambda: subprocess.run(command, cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), repeat)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DrishtiAI monitoring hot paths and dashboard API.")
+    parser.add_argument("--sizes", default="10000,1000000", help="Comma-separated event counts for the API databases")
+    parser.add_argument("--db-dir", help="Directory to keep generated databases in between runs (default: temporary)")
+    parser.add_argument("--repeat", type=int, default=500, help="Iterations for the fast per-frame benchmarks")
+    parser.add_argument("--skip-api", action="store_true", help="Only run the monitoring-loop benchmarks")
+    parser.add_argument("--streams", type=int, default=max(2, os.cpu_count() or 1), help="Worker processes for the multi-stream benchmark (default: CPU count)")
+    parser.add_argument("--video", help="Face video for the replay benchmarks (default: a generated clip, if scikit-image is installed)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    scratch_dir = tempfile.mkdtemp(prefix="drishti_bench_")
+    db_dir = args.db_dir or scratch_dir
+    os.makedirs(db_dir, exist_ok=True)
+
+    results = {}
+    bench_startup(results, 3)
+    bench_features(results, args.repeat)
+    bench_detector(results, args.repeat)
+    bench_inference(results, args.repeat)
+    bench_overlay(results, args.repeat)
+    bench_log_event(results, scratch_dir, args.repeat)
+    bench_metrics(results, args.repeat)
+    bench_analysis_stage(results, scratch_dir)
+    video_path = args.video or synthetic.make_face_video(os.path.join(scratch_dir, "face.mp4"), seconds=20)
+    if video_path:
+        bench_input_scale(results, video_path)
+        bench_multi_stream(results, video_path, scratch_dir, args.streams)
+    else:
+        print("[INFO] Skipping the replay benchmarks: pass --video or install scikit-image.")
+    if not args.skip_api:
+        bench_api(results, [int(s) for s in args.sizes.split(",") if s], db_dir, max(3, args.repeat // 25))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, value in results.items():
+        summary = value.get("mean_ms", value.get("fps", value.get("drain_ms", value.get("per_frame_us"))))
+        print(f"{name:<50} {summary}")
+    print(f"[INFO] Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Deterministic synthetic inputs for the benchmark suite: landmark arrays with
+controllable eye and mouth openness, landmark traces with blinks, yawns and
+absences, camera-like frames, a face video, and populated monitoring
+databases.
+"""
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rollups  # noqa: E402
+from db_schema import EVENT_TYPE_IDS, record_session_metrics, to_ms  # noqa: E402
+from landmark_features import (  # noqa: E402
+    NUM_LANDMARKS, LEFT_EYE_INDICES, RIGHT_EYE_INDICES, LEFT_EYE_CORNER, RIGHT_EYE_CORNER,
+    NOSE_TIP_LANDMARK, FOREHEAD_LANDMARK, CHIN_LANDMARK,
+    TOP_LIP_LANDMARK, BOTTOM_LIP_LANDMARK, MOUTH_LEFT_CORNER, MOUTH_RIGHT_CORNER,
+)
+
+# Calibration profile matching the geometry produced by make_face_points().
+SYNTHETIC_PROFILE = {"ear_threshold": 0.2, "avg_open_ear": 0.3, "avg_face_height": 0.4, "avg_center_gaze": 0.5, "avg_nose_y": 0.5}
+
+
+def make_face_points(ear=0.3, mar=0.1, jitter=0.0, rng=None):
+    """Returns a (478, 3) landmark array for a centred face with the given EAR and MAR."""
+    p = np.full((NUM_LANDMARKS, 3), 0.5, dtype=np.float32)
+    eye_w = 0.04
+    for indices, cx in ((LEFT_EYE_INDICES, 0.56), (RIGHT_EYE_INDICES, 0.44)):
+        p1, p2, p3, p4, p5, p6 = indices
+        v = ear * eye_w
+        p[p1, :2] = (cx - eye_w / 2, 0.45); p[p4, :2] = (cx + eye_w / 2, 0.45)
+        p[p2, :2] = (cx - 0.01, 0.45 - v / 2); p[p6, :2] = (cx - 0.01, 0.45 + v / 2)
+        p[p3, :2] = (cx + 0.01, 0.45 - v / 2); p[p5, :2] = (cx + 0.01, 0.45 + v / 2)
+    p[LEFT_EYE_CORNER, 0] = 0.4; p[RIGHT_EYE_CORNER, 0] = 0.6
+    p[NOSE_TIP_LANDMARK, :2] = (0.5, 0.5)
+    p[FOREHEAD_LANDMARK, 1] = 0.3; p[CHIN_LANDMARK, 1] = 0.7
+    p[TOP_LIP_LANDMARK, :2] = (0.5, 0.6); p[BOTTOM_LIP_LANDMARK, :2] = (0.5, 0.6 + mar * 0.1)
+    p[MOUTH_LEFT_CORNER, :2] = (0.45, 0.62); p[MOUTH_RIGHT_CORNER, :2] = (0.55, 0.62)
+    if jitter and rng is not None:
+        p[:, :2] += rng.normal(0.0, jitter, size=(NUM_LANDMARKS, 2)).astype(np.float32)
+    return p
+
+
+def make_trace(seconds=120, fps=30, seed=0):
+    """
+    Builds a landmark trace with a blink roughly every 3 seconds, a yawn
+    every 40 seconds and a short absence near the end. Returns
+    (landmarks (T, 478, 3) float32 with NaN for absent frames, timestamps (T,)).
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * fps)
+    ears = np.full(total, 0.3)
+    mars = np.full(total, 0.1)
+    for start in range(2 * fps, total - 6, int(3.3 * fps)):
+        ears[start:start + 5] = (0.22, 0.12, 0.08, 0.15, 0.28)
+    for start in range(20 * fps, total - 2 * fps, 40 * fps):
+        mars[start:start + 2 * fps] = 0.8
+    landmarks = np.stack([make_face_points(e, m, jitter=0.0005, rng=rng) for e, m in zip(ears, mars)])
+    absent_from = int(total * 0.85)
+    landmarks[absent_from:absent_from + 3 * fps] = np.nan
+    return landmarks, np.arange(total) / float(fps)
+
+
+def make_frames(count=8, height=480, width=640, seed=0):
+    """Fixed camera-sized frames (smooth gradient plus noise), identical on every run."""
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None].repeat(height, 0).repeat(3, 2)
+    return [np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8) for _ in range(count)]
+
+
+def make_face_video(path, seconds=10, fps=30, height=480, width=640):
+    """
+    Writes a camera-sized clip of a real face photo (scikit-image's
+    `astronaut`) that drifts and zooms slightly, like a user moving in front
+    of the camera, so FaceMesh has a face to track. Returns `path`, or None
+    if scikit-image is not installed.
+    """
+    try:
+        from skimage.data import astronaut
+    except ImportError:
+        return None
+    import cv2
+    face = cv2.cvtColor(astronaut(), cv2.COLOR_RGB2BGR)
+    face_h, face_w = face.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        t = i / fps
+        zoom = 1.0 + 0.1 * math.sin(2 * math.pi * t / 5.0)
+        dx = 40 * math.sin(2 * math.pi * t / 4.0); dy = 15 * math.sin(2 * math.pi * t / 3.0)
+        transform = np.float32([[zoom, 0, (width - face_w * zoom) / 2 + dx], [0, zoom, (height - face_h * zoom) / 2 + dy]])
+        writer.write(cv2.warpAffine(face, transform, (width, height), borderMode=cv2.BORDER_REPLICATE))
+    writer.release()
+    return path
+
+
+# Relative frequency of each event type in a typical session.
+_EVENT_MIX = [("BLINK", 0.86), ("SUMMARY_EAR", 0.05), ("SUMMARY_BPM", 0.05), ("YAWN_DETECTED", 0.01),
+              ("STARE_ALERT_TRIGGERED", 0.01), ("LOW_BPM_ALERT_TRIGGERED", 0.01), ("MICRO_SLEEP_DETECTED", 0.005),
+              ("FATIGUE_SCORE_ALERT", 0.005)]
+
+
+def populate_database(db_path, event_count, events_per_session=4000, days=180, seed=0, chunk_size=50000):
+    """
+    Fills a freshly created monitoring database with `event_count` events
+    spread over hour-long sessions in the last `days` days. Returns the
+    number of sessions created.
+    """
+    rng = np.random.default_rng(seed)
+    session_count = max(1, event_count // events_per_session)
+    now = datetime.now().replace(microsecond=0)
+    starts = sorted(now - timedelta(days=float(d)) for d in rng.uniform(0.1, days, session_count))
+    names = [name for name, _ in _EVENT_MIX]
+    weights = np.array([w for _, w in _EVENT_MIX]); weights /= weights.sum()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany("INSERT INTO sessions (session_id, start_time, end_time, total_active_time_sec, total_idle_time_sec, start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     [(i + 1, s.isoformat(), (s + timedelta(hours=1)).isoformat(), 3300, 300, to_ms(s.timestamp()), to_ms(s.timestamp() + 3600))
+                      for i, s in enumerate(starts)])
+    type_ids = [EVENT_TYPE_IDS[name] for name in names]
+    summary_bpm = EVENT_TYPE_IDS["SUMMARY_BPM"]; summary_ear = EVENT_TYPE_IDS["SUMMARY_EAR"]
+
+    def rows():
+        remaining = event_count
+        for session_index, start in enumerate(starts):
+            n = remaining if session_index == session_count - 1 else min(remaining, events_per_session)
+            remaining -= n
+            start_ms = to_ms(start.timestamp())
+            offsets_ms = np.sort(rng.uniform(0, 3600, n)) * 1000.0
+            kinds = rng.choice(len(names), size=n, p=weights)
+            values = rng.uniform(5, 25, n)
+            for offset_ms, kind, value in zip(offsets_ms.tolist(), kinds.tolist(), values.tolist()):
+                type_id = type_ids[kind]
+                yield (session_index + 1, start_ms + int(offset_ms), type_id,
+                       value if type_id in (summary_bpm, summary_ear) else None, None)
+
+    insert_sql = "INSERT INTO events (session_id, ts_ms, type_id, value_numeric, value_text) VALUES (?, ?, ?, ?, ?)"
+    batch = []
+    for row in rows():
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            conn.executemany(insert_sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(insert_sql, batch)
+    rollups.rebuild(conn)
+    record_session_metrics(conn)
+    conn.commit()
+    conn.close()
+    return session_count
@@ -0,0 +1,213 @@
+import json
+import math
+import threading
+import time
+import uuid
+
+# --- Tunable Parameters ---
+CALIBRATION_FRAMES_OPEN = 150
+CALIBRATION_FRAMES_BLINK = 150
+MAX_KEPT_JOBS = 10 # Finished jobs remembered for status queries
+STREAM_HEARTBEAT_SEC = 15.0
+STREAM_MIN_INTERVAL_SEC = 0.25 # Per-frame progress is coalesced to at most 4 messages per second
+
+STAGE_OPEN_EYES = "OPEN_EYES"
+STAGE_BLINK = "BLINK"
+STAGE_DONE = "DONE"
+
+STATUS_RUNNING = "running"
+STATUS_COMPLETE = "complete"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINISHED_STATUSES = (STATUS_COMPLETE, STATUS_FAILED, STATUS_CANCELLED)
+
+
+class RunningStats:
+    """Streaming mean and variance (Welford's algorithm), so calibration never keeps the samples."""
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class CalibrationSamples:
+    """Running statistics for every feature calibration measures, by stage."""
+
+    def __init__(self):
+        self.open_ear = RunningStats()
+        self.face_height = RunningStats()
+        self.nose_y = RunningStats()
+        self.gaze_ratio = RunningStats()
+        self.blink_ear = RunningStats()
+
+    def add_open(self, ear, face_height, nose_y, gaze_ratio):
+        self.open_ear.add(ear)
+        self.face_height.add(face_height)
+        self.nose_y.add(nose_y)
+        self.gaze_ratio.add(gaze_ratio)
+
+    def add_blink(self, ear):
+        self.blink_ear.add(ear)
+
+    @property
+    def complete(self):
+        return self.open_ear.count > 0 and self.blink_ear.count > 0
+
+    def profile(self):
+        """The calibration profile values, in `save_calibration_profile` argument order."""
+        ear_threshold = (self.open_ear.mean + self.blink_ear.mean) / 2.0
+        return ear_threshold, self.open_ear.mean, self.face_height.mean, self.gaze_ratio.mean, self.nose_y.mean
+
+    def summary(self):
+        return {
+            "open_ear": {"mean": round(self.open_ear.mean, 4), "std": round(self.open_ear.std, 4), "frames": self.open_ear.count},
+            "blink_ear": {"mean": round(self.blink_ear.mean, 4), "std": round(self.blink_ear.std, 4), "frames": self.blink_ear.count},
+            "face_height_std": round(self.face_height.std, 4),
+            "gaze_ratio_std": round(self.gaze_ratio.std, 4),
+        }
+
+
+class CalibrationJob:
+    """
+    One calibration run on a background thread, as seen by the dashboard.
+
+    The calibration loop calls `report()` once per counted frame and
+    `finish()` at the end; request threads read `as_dict()` or block in
+    `wait_for_change()`. `cancel()` only raises a flag, which the loop checks
+    between frames.
+    """
+
+    def __init__(self, user_name=None):
+        self.id = uuid.uuid4().hex
+        self.user_name = user_name
+        self.status = STATUS_RUNNING
+        self.stage = STAGE_OPEN_EYES
+        self.frames_done = 0
+        self.frames_total = CALIBRATION_FRAMES_OPEN + CALIBRATION_FRAMES_BLINK
+        self.message = None
+        self.stats = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.version = 0 # Bumped on every change, for streaming
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, stage, frames_done, stats=None):
+        with self._cond:
+            self.stage = stage
+            self.frames_done = frames_done
+            if stats is not None:
+                self.stats = stats
+            self.version += 1
+            self._cond.notify_all()
+
+    def finish(self, status, message=None, stats=None):
+        with self._cond:
+            self.status = status
+            self.message = message
+            if stats is not None:
+                self.stats = stats
+            self.finished_at = time.time()
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait_for_change(self, seen_version, timeout):
+        """Blocks until the job changes past `seen_version` or `timeout` passes; returns the current state."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen_version, timeout)
+            return self.version, self.as_dict()
+
+    def as_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "frames_done": self.frames_done,
+            "frames_total": self.frames_total,
+            "progress": round(self.frames_done / self.frames_total, 3),
+            "message": self.message,
+            "stats": self.stats,
+            "elapsed_sec": round((self.finished_at or time.time()) - self.started_at, 1),
+        }
+
+
+class CalibrationJobs:
+    """The registry of calibration jobs; at most one runs at a time, since they share the camera."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.active = None
+
+    def start(self, target, user_name=None):
+        """
+        Creates a job and runs `target(job)` on a daemon thread. Returns
+        `(job, True)`, or `(running_job, False)` if a job is already running.
+        """
+        with self._lock:
+            if self.active is not None and not self.active.finished:
+                return self.active, False
+            job = CalibrationJob(user_name)
+            self._jobs[job.id] = job
+            self.active = job
+            for old_id in list(self._jobs)[:-MAX_KEPT_JOBS]:
+                del self._jobs[old_id]
+        threading.Thread(target=self._run, args=(target, job), name="Calibration", daemon=True).start()
+        return job, True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    @property
+    def running(self):
+        job = self.active
+        return job is not None and not job.finished
+
+    @staticmethod
+    def _run(target, job):
+        try:
+            target(job)
+        except Exception as e:
+            print(f"[ERROR] Calibration job {job.id} failed: {e}")
+            job.finish(STATUS_FAILED, message=str(e))
+        if not job.finished:
+            job.finish(STATUS_FAILED, message="Calibration ended without a result.")
+
+
+def job_event_stream(job, heartbeat_sec=STREAM_HEARTBEAT_SEC):
+    """Server-Sent Events of a job's full state on every change, ending once the job finishes."""
+    seen_version = -1
+    yield "retry: 3000\n\n"
+    while True:
+        version, state = job.wait_for_change(seen_version, heartbeat_sec)
+        if version == seen_version:
+            yield ": keep-alive\n\n"
+            continue
+        seen_version = version
+        yield f"id: {version}\ndata: {json.dumps(state, separators=(',', ':'))}\n\n"
+        if state["status"] in FINISHED_STATUSES:
+            return
+        time.sleep(STREAM_MIN_INTERVAL_SEC)
@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Tunable Parameters ---
+DEFAULT_ENDPOINT = "https://drishtiai-website.vercel.app/api/chat"
+ENDPOINT = os.environ.get("DRISHTI_CHAT_URL", DEFAULT_ENDPOINT) # Point at a local stand-in server for testing
+CONNECT_TIMEOUT_SEC = 5.0
+READ_TIMEOUT_SEC = float(os.environ.get("DRISHTI_CHAT_TIMEOUT", 30))
+POOL_SIZE = 4 # Kept-alive connections to the chat proxy
+CONTEXT_TTL_SEC = 60.0 # How long the history-wide stats sent with each message are reused
+MAX_HISTORY_MESSAGES = 20
+MAX_HISTORY_TOKENS = 2000 # Estimated as characters / 4
+CHARS_PER_TOKEN = 4
+
+
+def _estimate_tokens(entry):
+    return len(json.dumps(entry, separators=(',', ':'))) // CHARS_PER_TOKEN + 1
+
+
+def trim_history(history, max_messages=MAX_HISTORY_MESSAGES, max_tokens=MAX_HISTORY_TOKENS):
+    """
+    Keeps the newest history entries that fit both limits. A reply left at
+    the front without the message it answered is dropped as well.
+    """
+    kept = []
+    tokens = 0
+    for entry in reversed(history):
+        tokens += _estimate_tokens(entry)
+        if len(kept) >= max_messages or tokens > max_tokens:
+            break
+        kept.append(entry)
+    kept.reverse()
+    while kept and isinstance(kept[0], dict) and kept[0].get("role") in ("model", "assistant"):
+        kept.pop(0)
+    return kept
+
+
+class ChatContextCache:
+    """
+    The history-wide stats sent with every chat message, recomputed from the
+    rollup tables at most once per `ttl_sec`. They move by minutes, not by
+    messages, so a conversation reuses one computation.
+    """
+
+    def __init__(self, db_path, ttl_sec=CONTEXT_TTL_SEC, clock=time.monotonic):
+        self.db_path = db_path
+        self.ttl_sec = ttl_sec
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0.0
+
+    def get(self):
+        value = self._value
+        if value is not None and self.clock() < self._expires:
+            return value
+        with self._lock:
+            if self._value is None or self.clock() >= self._expires:
+                self._value = self._compute()
+                self._expires = self.clock() + self.ttl_sec
+            return self._value
+
+    def invalidate(self):
+        self._expires = 0.0
+
+    def _compute(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            bpm_sum, bpm_count = conn.execute("SELECT TOTAL(bpm_sum), SUM(bpm_count) FROM hourly_rollups").fetchone()
+            hotspot = conn.execute("SELECT printf('%02d', hour), SUM(yawns + micro_sleeps + fatigue_alerts) AS count FROM hourly_rollups GROUP BY hour HAVING count > 0 ORDER BY count DESC LIMIT 1").fetchone()
+        finally:
+            conn.close()
+        avg_bpm = bpm_sum / bpm_count if bpm_count else 15
+        return {
+            "avg_bpm": int(avg_bpm),
+            "health_score": min(100, int((avg_bpm / 20.0) * 100)),
+            "fatigue_hotspot_hour": f"{hotspot[0]}:00" if hotspot else "Not enough data",
+        }
+
+
+class ChatClient:
+    """
+    Client for the chat proxy. One keep-alive `requests.Session` is shared
+    by every call, so a message costs one round trip rather than a new
+    TCP/TLS handshake. The conversation history lives here, trimmed to
+    MAX_HISTORY_MESSAGES / MAX_HISTORY_TOKENS after every exchange.
+
+    Args:
+        endpoint (str): The chat proxy URL.
+        timeout (tuple): (connect, read) timeouts in seconds.
+    """
+
+    def __init__(self, endpoint=ENDPOINT, timeout=(CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC), pool_size=POOL_SIZE):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.history = []
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter); session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def _payload(self, message, user_name, stats, stream):
+        payload = {"message": message, "history": list(self.history), "user_name": user_name, "stats": stats}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def send(self, message, user_name, stats):
+        """Sends one message and returns the reply; raises `requests.exceptions.RequestException` on failure."""
+        response = self.session.post(self.endpoint, json=self._payload(message, user_name, stats, False), timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        # The proxy returns the updated history; it is trimmed before it is sent back next time.
+        with self._lock:
+            self.history = trim_history(data.get("history", []))
+        return data.get("reply")
+
+    def stream(self, message, user_name, stats):
+        """
+        Sends one message asking for a streamed reply and yields text chunks
+        as they arrive. A proxy that answers with plain JSON instead yields
+        the whole reply at once.
+        """
+        response = self.session.post(self.endpoint, json=self._payload(message, user_name, stats, True), timeout=self.timeout, stream=True)
+        response.raise_for_status()
+        with response:
+            if response.headers.get("Content-Type", "").startswith("application/json"):
+                data = response.json()
+                with self._lock:
+                    self.history = trim_history(data.get("history", []))
+                yield data.get("reply") or ""
+                return
+            # Without a charset, requests decodes text/* as ISO-8859-1 and yields bytes when there is no Content-Type at all.
+            if "charset=" not in response.headers.get("Content-Type", "").lower():
+                response.encoding = "utf-8"
+            parts = []
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+        # A streamed reply carries no history, so the exchange is appended here in the proxy's message format.
+        with self._lock:
+            self.history = trim_history(self.history + [
+                {"role": "user", "parts": [{"text": message}]},
+                {"role": "model", "parts": [{"text": "".join(parts)}]},
+            ])
+
+    def reset(self):
+        with self._lock:
+            self.history = []
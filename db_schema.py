@@ -0,0 +1,285 @@
+"""
+Monitoring database schema and its migrations.
+
+Schema versions are tracked in `PRAGMA user_version`. Version 2:
+
+- `events` stores `ts_ms`, integer milliseconds since the Unix epoch, and a
+  `type_id` from the small `event_types` table, with composite indexes on
+  (session_id, type_id) and (type_id, ts_ms).
+- `sessions` gains `start_ms` / `end_ms` next to the ISO-8601 text columns
+  that reports display, and is indexed on `start_ms`.
+
+Version 3 adds `session_metrics`, one row of report metrics per finished
+session (blinks, BPM, stare alerts, fatigue events), so historical baselines
+never have to touch `events`.
+
+Version 4 adds `event_aggregates`, where the retention engine (see
+retention.py) keeps old events as per-minute or per-hour counts and value
+sums once the raw rows are deleted. Every query that counts events also
+reads this table, so reports give the same results on compacted history.
+New databases are created with incremental auto-vacuum.
+
+Version 5 tags `sessions` with `stream_id` and `face_id`, set when a
+session belongs to one face on one stream of a multi-stream run (see
+multi_stream.py); single-camera sessions leave them NULL.
+
+Version 6 adds `session_reports`, each finished session's report stored as
+JSON text under the version of the goal settings it was built with (see
+session_reports.py).
+
+Version 1 databases (TEXT timestamps and event types) are migrated in small
+batches, each in its own transaction, so the dashboard keeps working while a
+large history is converted and an interrupted migration resumes where it
+stopped. The old table is only replaced once every row has been copied.
+
+    python db_schema.py                       # migrate the user's own database
+    python db_schema.py --db monitoring_data.db --batch-size 20000
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+SCHEMA_VERSION = 6
+DEFAULT_DB_FILE = os.path.join(os.path.expanduser('~'), '.DrishtiAI', 'monitoring_data.db')
+MIGRATION_BATCH_SIZE = 50000
+
+# Fixed ids for every event type the application writes; ids never change once assigned, and new types are appended.
+EVENT_TYPES = (
+    "SESSION_START", "SESSION_END", "BLINK", "YAWN_DETECTED", "MICRO_SLEEP_DETECTED",
+    "STARE_ALERT_TRIGGERED", "LOW_BPM_ALERT_TRIGGERED", "FATIGUE_SCORE_ALERT", "20_20_20_BREAK_TAKEN",
+    "SUMMARY_EAR", "SUMMARY_BPM", "USER_IDLE_START", "USER_ACTIVE_RESUME",
+)
+EVENT_TYPE_IDS = {name: i + 1 for i, name in enumerate(EVENT_TYPES)}
+# Event types found only in migrated v1 history get ids from here up, clear of any type EVENT_TYPES adds later.
+LEGACY_TYPE_ID_BASE = 1000
+FATIGUE_EVENT_IDS = (EVENT_TYPE_IDS["YAWN_DETECTED"], EVENT_TYPE_IDS["MICRO_SLEEP_DETECTED"], EVENT_TYPE_IDS["FATIGUE_SCORE_ALERT"])
+
+SESSIONS_SQL = '''CREATE TABLE IF NOT EXISTS sessions (session_id INTEGER PRIMARY KEY AUTOINCREMENT, start_time TEXT NOT NULL, end_time TEXT, total_active_time_sec INTEGER DEFAULT 0, total_idle_time_sec INTEGER DEFAULT 0, start_ms INTEGER, end_ms INTEGER, stream_id TEXT, face_id INTEGER)'''
+EVENT_TYPES_SQL = '''CREATE TABLE IF NOT EXISTS event_types (type_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)'''
+EVENTS_SQL = '''CREATE TABLE IF NOT EXISTS {table} (event_id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL, ts_ms INTEGER NOT NULL, type_id INTEGER NOT NULL, value_numeric REAL, value_text TEXT, FOREIGN KEY (session_id) REFERENCES sessions (session_id), FOREIGN KEY (type_id) REFERENCES event_types (type_id))'''
+INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_events_session_type ON {table} (session_id, type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_events_type_ts ON {table} (type_id, ts_ms)",
+)
+SESSION_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_sessions_start_ms ON sessions (start_ms)"
+SESSION_METRICS_SQL = '''CREATE TABLE IF NOT EXISTS session_metrics (session_id INTEGER PRIMARY KEY, start_ms INTEGER, active_sec INTEGER NOT NULL, blinks INTEGER NOT NULL, bpm REAL NOT NULL, stare_alerts INTEGER NOT NULL, fatigue_events INTEGER NOT NULL, FOREIGN KEY (session_id) REFERENCES sessions (session_id))'''
+SESSION_METRICS_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_session_metrics_start_ms ON session_metrics (start_ms)"
+# `bucket_ms` is the start of a local-time minute or hour; `bucket_sec` is 60 or 3600. Positive sums feed the BPM rollups.
+EVENT_AGGREGATES_SQL = '''CREATE TABLE IF NOT EXISTS event_aggregates (session_id INTEGER NOT NULL, type_id INTEGER NOT NULL, bucket_sec INTEGER NOT NULL, bucket_ms INTEGER NOT NULL, count INTEGER NOT NULL, value_count INTEGER NOT NULL DEFAULT 0, value_sum REAL NOT NULL DEFAULT 0, value_min REAL, value_max REAL, positive_sum REAL NOT NULL DEFAULT 0, positive_count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (session_id, type_id, bucket_sec, bucket_ms)) WITHOUT ROWID'''
+EVENT_AGGREGATES_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_event_aggregates_bucket ON event_aggregates (bucket_sec, bucket_ms)"
+# One row per finished session; `goal_version` identifies the goal settings the stored report was built with.
+SESSION_REPORTS_SQL = '''CREATE TABLE IF NOT EXISTS session_reports (session_id INTEGER PRIMARY KEY, goal_version TEXT NOT NULL, etag TEXT NOT NULL, report_json TEXT NOT NULL, created_ms INTEGER NOT NULL, FOREIGN KEY (session_id) REFERENCES sessions (session_id))'''
+_STARE_ID = EVENT_TYPE_IDS["STARE_ALERT_TRIGGERED"]
+_BLINK_ID = EVENT_TYPE_IDS["BLINK"]
+_METRIC_TYPE_IDS = ", ".join(map(str, (_BLINK_ID, _STARE_ID, *FATIGUE_EVENT_IDS)))
+# Computes session_metrics rows for finished sessions from raw events (through the (session_id, type_id) index) plus compacted aggregates.
+_RECORD_METRICS_SQL = f'''
+    INSERT OR REPLACE INTO session_metrics (session_id, start_ms, active_sec, blinks, bpm, stare_alerts, fatigue_events)
+    SELECT session_id, start_ms, active_sec, blinks,
+           CASE WHEN active_sec > 0 THEN blinks * 60.0 / active_sec ELSE 0 END, stare_alerts, fatigue_events
+    FROM (
+        SELECT s.session_id, s.start_ms, IFNULL(s.total_active_time_sec, 0) AS active_sec,
+               IFNULL(SUM(c.n * (c.type_id = {_BLINK_ID})), 0) AS blinks,
+               IFNULL(SUM(c.n * (c.type_id = {_STARE_ID})), 0) AS stare_alerts,
+               IFNULL(SUM(c.n * (c.type_id IN {FATIGUE_EVENT_IDS})), 0) AS fatigue_events
+        FROM sessions s
+        LEFT JOIN (
+            SELECT session_id, type_id, COUNT(*) AS n FROM events WHERE type_id IN ({_METRIC_TYPE_IDS}) {{event_where}} GROUP BY session_id, type_id
+            UNION ALL
+            SELECT session_id, type_id, SUM(count) FROM event_aggregates WHERE type_id IN ({_METRIC_TYPE_IDS}) {{event_where}} GROUP BY session_id, type_id
+        ) c ON c.session_id = s.session_id
+        WHERE s.end_time IS NOT NULL {{where}}
+        GROUP BY s.session_id)'''
+
+# Local ISO-8601 text -> epoch milliseconds, as SQL (v1 timestamps were written with datetime.now().isoformat()).
+_ISO_TO_MS_SQL = "CAST(round((julianday({column}, 'utc') - 2440587.5) * 86400000.0) AS INTEGER)"
+
+
+def to_ms(timestamp):
+    """Epoch seconds (float) -> integer epoch milliseconds."""
+    return int(round(timestamp * 1000))
+
+
+def iso_to_ms(iso_text):
+    """Local ISO-8601 text -> integer epoch milliseconds (None for None)."""
+    if iso_text is None:
+        return None
+    return to_ms(datetime.fromisoformat(iso_text).timestamp())
+
+
+def event_type_id(name):
+    """Returns the id stored in `events.type_id` for an event type name."""
+    return EVENT_TYPE_IDS[name]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _seed_event_types(conn):
+    """
+    Makes `event_types` hold every EVENT_TYPE_IDS entry under its fixed id.
+    A legacy type sitting on a fixed id (from a migration before ids were
+    reserved) moves to the legacy range, and a legacy name that has since
+    become a known type joins its fixed id; their rows move with them.
+    """
+    conn.execute(EVENT_TYPES_SQL)
+    misplaced = [(type_id, name) for type_id, name in conn.execute("SELECT type_id, name FROM event_types").fetchall()
+                 if type_id != EVENT_TYPE_IDS.get(name, type_id if type_id >= LEGACY_TYPE_ID_BASE else None)]
+    for type_id, name in misplaced:
+        legacy_id = _next_legacy_type_id(conn)
+        _move_event_type(conn, type_id, legacy_id)
+        if name in EVENT_TYPE_IDS:
+            # Every misplaced type is out of the way first, so the fixed id is free now.
+            _move_event_type(conn, legacy_id, EVENT_TYPE_IDS[name])
+    conn.executemany("INSERT OR IGNORE INTO event_types (type_id, name) VALUES (?, ?)",
+                     [(type_id, name) for name, type_id in EVENT_TYPE_IDS.items()])
+
+
+def _next_legacy_type_id(conn):
+    return conn.execute("SELECT IFNULL(MAX(type_id) + 1, ?1) FROM event_types WHERE type_id >= ?1", (LEGACY_TYPE_ID_BASE,)).fetchone()[0]
+
+
+def _move_event_type(conn, old_id, new_id):
+    # `new_id` is unused, so the (type_id, ...) keys of event_aggregates cannot collide.
+    conn.execute("UPDATE event_types SET type_id = ? WHERE type_id = ?", (new_id, old_id))
+    for table in ("events", "event_aggregates"):
+        if "type_id" in _columns(conn, table):
+            conn.execute(f"UPDATE {table} SET type_id = ? WHERE type_id = ?", (new_id, old_id))
+
+
+def record_session_metrics(conn, session_id=None):
+    """
+    Stores the session_metrics row for a finished session (or, with no id,
+    for every finished session). Call it after the session's end time and
+    active time are saved and its events are on disk.
+    """
+    if session_id is None:
+        conn.execute(_RECORD_METRICS_SQL.format(where="", event_where=""))
+    else:
+        conn.execute(_RECORD_METRICS_SQL.format(where="AND s.session_id = ?1", event_where="AND session_id = ?1"), (session_id,))
+
+
+def ensure_schema(conn, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+    """
+    Creates the current schema, or migrates an older database to it. Safe to
+    call on every start-up; once the database is current it only adds event
+    types that EVENT_TYPES gained since.
+
+    Args:
+        conn: An open sqlite3 connection (in the default transaction mode).
+        batch_size (int): Events copied per transaction while migrating.
+        progress (callable): Optional `progress(copied, total)` callback.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        with conn:
+            _seed_event_types(conn)
+        return
+    if not conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+        # Only takes effect before the first table exists; older databases need one full VACUUM (retention.py --vacuum).
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if version < 2:
+        _upgrade_to_v2(conn, batch_size, progress)
+    with conn:
+        _seed_event_types(conn)
+        conn.execute(EVENT_AGGREGATES_SQL)
+        conn.execute(EVENT_AGGREGATES_INDEX_SQL)
+        conn.execute(SESSION_REPORTS_SQL)
+        if version < 3:
+            conn.execute(SESSION_METRICS_SQL)
+            conn.execute(SESSION_METRICS_INDEX_SQL)
+            record_session_metrics(conn)
+        session_columns = _columns(conn, "sessions")
+        for column, column_type in (("stream_id", "TEXT"), ("face_id", "INTEGER")):
+            if column not in session_columns:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {column_type}")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _upgrade_to_v2(conn, batch_size, progress):
+    with conn:
+        conn.execute(SESSIONS_SQL)
+        _seed_event_types(conn)
+        session_columns = _columns(conn, "sessions")
+        for column in ("start_ms", "end_ms"):
+            if column not in session_columns:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} INTEGER")
+
+    if "timestamp" in _columns(conn, "events"):
+        _migrate_events(conn, batch_size, progress)
+    else:
+        with conn:
+            conn.execute(EVENTS_SQL.format(table="events"))
+            for sql in INDEX_SQL:
+                conn.execute(sql.format(table="events"))
+
+    with conn:
+        conn.execute(f"UPDATE sessions SET start_ms = {_ISO_TO_MS_SQL.format(column='start_time')} WHERE start_ms IS NULL")
+        conn.execute(f"UPDATE sessions SET end_ms = {_ISO_TO_MS_SQL.format(column='end_time')} WHERE end_ms IS NULL AND end_time IS NOT NULL")
+        conn.execute(SESSION_INDEX_SQL)
+        conn.execute("PRAGMA user_version = 2")
+
+
+def _migrate_events(conn, batch_size, progress):
+    """Copies v1 `events` into `events_v2` batch by batch, then swaps the tables."""
+    with conn:
+        # Event types the application no longer writes keep their history under new ids.
+        legacy_names = [row[0] for row in conn.execute("SELECT DISTINCT event_type FROM events WHERE event_type NOT IN (SELECT name FROM event_types)")]
+        first_id = _next_legacy_type_id(conn)
+        conn.executemany("INSERT INTO event_types (type_id, name) VALUES (?, ?)", [(first_id + i, name) for i, name in enumerate(legacy_names)])
+        conn.execute(EVENTS_SQL.format(table="events_v2"))
+        # The v1 table has no indexes, so the final index names are free to use on the copy.
+        for sql in INDEX_SQL:
+            conn.execute(sql.format(table="events_v2"))
+    total = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    copy_sql = f'''
+        INSERT INTO events_v2 (event_id, session_id, ts_ms, type_id, value_numeric, value_text)
+        SELECT e.event_id, e.session_id, {_ISO_TO_MS_SQL.format(column='e.timestamp')}, t.type_id, e.value_numeric, e.value_text
+        FROM events e JOIN event_types t ON t.name = e.event_type
+        WHERE e.event_id > ? ORDER BY e.event_id LIMIT ?'''
+
+    def copy_batch():
+        last_id = conn.execute("SELECT IFNULL(MAX(event_id), 0) FROM events_v2").fetchone()[0]
+        return conn.execute(copy_sql, (last_id, batch_size)).rowcount
+
+    done = conn.execute("SELECT COUNT(*) FROM events_v2").fetchone()[0] # Non-zero when resuming
+    while True:
+        with conn:
+            copied = copy_batch()
+        done += copied
+        if progress is not None:
+            progress(done, total)
+        if copied < batch_size:
+            break
+
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        # Rows written to the old table since the last batch are picked up inside the swap transaction.
+        while copy_batch() >= batch_size:
+            pass
+        conn.execute("DROP TABLE events")
+        conn.execute("ALTER TABLE events_v2 RENAME TO events")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a DrishtiAI monitoring database to the current schema.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="Monitoring database (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE, help="Events copied per transaction")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    started = time.perf_counter()
+    ensure_schema(conn, args.batch_size, progress=lambda copied, total: print(f"[INFO] Migrated {copied:,} / {total:,} events", end="\r"))
+    conn.close()
+    print(f"\n[INFO] {args.db}: schema v{max(version, 1)} -> v{SCHEMA_VERSION} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import rollups
+
+# Marker placed on the queue to tell the worker to drain and exit.
+_STOP = object()
+
+
+class _FlushRequest:
+    """Queue marker: the worker writes everything queued before it, then sets `done`."""
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class EventWriter:
+    """
+    Asynchronous sink for monitoring events.
+
+    The capture loop only enqueues rows; a single background thread owns one
+    long-lived WAL-mode connection and writes the queued rows with
+    `executemany`, either when a batch fills up or when the oldest pending
+    row has waited longer than `flush_interval_sec`. The dashboard rollups
+    are updated in the same transaction as each batch.
+
+    Rows that arrive while the queue is full are dropped, never written
+    synchronously, so a stalled disk cannot block the caller; they are
+    counted in `dropped_count`. A caller that can afford to wait passes
+    `block=True` to `submit()` instead.
+
+    Args:
+        db_path (str): The path to the SQLite database file.
+        max_queue_size (int): Upper bound on rows waiting in memory.
+        batch_size (int): Number of rows that triggers an immediate flush.
+        flush_interval_sec (float): Maximum time a row may wait before it is written.
+    """
+
+    INSERT_SQL = "INSERT INTO events (session_id, ts_ms, type_id, value_numeric, value_text) VALUES (?, ?, ?, ?, ?)"
+
+    def __init__(self, db_path, max_queue_size=10000, batch_size=64, flush_interval_sec=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.dropped_count = 0
+        self.written_count = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="EventWriter", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def submit(self, row, block=False):
+        """
+        Queues one event row without blocking. Returns False if the writer is
+        not running, or if the queue is full, in which case the row is dropped
+        and counted. With `block`, waits for room in the queue instead and
+        never drops the row.
+        """
+        if self._thread is None:
+            return False
+        if block:
+            self._queue.put(row)
+            return True
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            if self.dropped_count == 1 or self.dropped_count % 1000 == 0:
+                print(f"[WARNING] Event queue full, {self.dropped_count} event(s) dropped so far.")
+            return False
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every row submitted before this call is on disk, while
+        the writer keeps running. Returns False on timeout or if the writer
+        is not running.
+        """
+        if self._thread is None:
+            return False
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Drains every queued row to disk and stops the worker thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _flush(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(self.INSERT_SQL, batch)
+                rollups.apply_events(conn, batch)
+            self.written_count += len(batch)
+        except sqlite3.Error as e:
+            print(f"[ERROR] Could not write {len(batch)} event(s): {e}")
+        batch.clear()
+
+    def _run(self):
+        conn = self._connect()
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    # Drain anything that raced in behind the stop marker.
+                    waiting = []
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if isinstance(item, _FlushRequest):
+                            waiting.append(item)
+                        elif item is not _STOP:
+                            batch.append(item)
+                    if batch:
+                        self._flush(conn, batch)
+                    for request in waiting:
+                        request.done.set()
+                    return
+
+                if isinstance(item, _FlushRequest):
+                    if batch:
+                        self._flush(conn, batch)
+                    deadline = None
+                    item.done.set()
+                    continue
+
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval_sec
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._flush(conn, batch)
+                    deadline = None
+        finally:
+            conn.close()
@@ -0,0 +1,265 @@
+"""
+Streaming export of the monitoring history for analysis elsewhere.
+
+`events`, `sessions` and the compacted `aggregates` (see retention.py) can
+be exported for a time range and/or a list of sessions as NDJSON, CSV or
+Parquet. Rows are read through a single SQLite cursor CHUNK_ROWS at a time
+and each chunk is encoded and written out before the next is read, so
+memory use stays flat however much history is exported. The dashboard
+serves the same streams from /api/export/<dataset> as chunked responses.
+
+Parquet is a compressed columnar format and needs the optional `pyarrow`
+package; each chunk becomes one row group.
+
+    python export.py events --since 2025-01-01 --format csv --output events.csv
+    python export.py events --sessions 12,13 --format parquet --output events.parquet
+    python export.py sessions --since 2025-01-01 --until 2025-02-01 > sessions.ndjson
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from db_schema import DEFAULT_DB_FILE, iso_to_ms
+
+# --- Tunable Parameters ---
+CHUNK_ROWS = 2000 # Rows fetched and encoded per chunk for the text formats
+ROW_GROUP_ROWS = 50000 # Rows per Parquet row group (and per fetch when exporting Parquet)
+PARQUET_COMPRESSION = "zstd"
+FORMATS = {"ndjson": ("application/x-ndjson", "ndjson"), "csv": ("text/csv", "csv"), "parquet": ("application/vnd.apache.parquet", "parquet")}
+PYARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+class Dataset:
+    """One exportable table: its query, the columns a time range and a session list filter on, and its output columns."""
+
+    def __init__(self, select_sql, time_column, session_column, order_by, columns):
+        self.select_sql = select_sql
+        self.time_column = time_column
+        self.session_column = session_column
+        self.order_by = order_by
+        self.columns = columns # (name, pyarrow type name)
+
+    @property
+    def column_names(self):
+        return [name for name, _ in self.columns]
+
+
+DATASETS = {
+    # Ordered by rowid: events are appended in time order, and a rowid scan needs no sort.
+    "events": Dataset(
+        "SELECT e.event_id, e.session_id, e.ts_ms, t.name, e.value_numeric, e.value_text FROM events e JOIN event_types t ON t.type_id = e.type_id",
+        "e.ts_ms", "e.session_id", "e.event_id",
+        [("event_id", "int64"), ("session_id", "int64"), ("ts_ms", "int64"), ("type", "string"), ("value_numeric", "float64"), ("value_text", "string")]),
+    "sessions": Dataset(
+        "SELECT session_id, start_time, end_time, start_ms, end_ms, total_active_time_sec, total_idle_time_sec, stream_id, face_id FROM sessions",
+        "start_ms", "session_id", "session_id",
+        [("session_id", "int64"), ("start_time", "string"), ("end_time", "string"), ("start_ms", "int64"), ("end_ms", "int64"),
+         ("total_active_time_sec", "int64"), ("total_idle_time_sec", "int64"), ("stream_id", "string"), ("face_id", "int64")]),
+    "aggregates": Dataset(
+        "SELECT a.session_id, t.name, a.bucket_sec, a.bucket_ms, a.count, a.value_count, a.value_sum, a.value_min, a.value_max FROM event_aggregates a JOIN event_types t ON t.type_id = a.type_id",
+        "a.bucket_ms", "a.session_id", "a.session_id, a.type_id, a.bucket_sec, a.bucket_ms",
+        [("session_id", "int64"), ("type", "string"), ("bucket_sec", "int64"), ("bucket_ms", "int64"), ("count", "int64"),
+         ("value_count", "int64"), ("value_sum", "float64"), ("value_min", "float64"), ("value_max", "float64")]),
+}
+
+
+def parse_time(value):
+    """Epoch milliseconds, or local ISO-8601 date/time text -> epoch milliseconds; None passes through."""
+    if value is None or value == "":
+        return None
+    if str(value).isdigit():
+        return int(value)
+    return iso_to_ms(str(value))
+
+
+def parse_session_ids(value):
+    """'12,13' (or a list) -> [12, 13]; None or empty -> None."""
+    if not value:
+        return None
+    items = value.split(",") if isinstance(value, str) else value
+    return [int(item) for item in items if str(item).strip()]
+
+
+def validate(dataset, fmt):
+    """Returns an error message for a request that cannot be served, or None."""
+    if dataset not in DATASETS:
+        return f"Unknown dataset '{dataset}'; expected one of {', '.join(DATASETS)}"
+    if fmt not in FORMATS:
+        return f"Unknown format '{fmt}'; expected one of {', '.join(FORMATS)}"
+    if fmt == "parquet" and not PYARROW_AVAILABLE:
+        return "Parquet export needs the 'pyarrow' package"
+    return None
+
+
+def build_query(dataset, since_ms=None, until_ms=None, session_ids=None):
+    clauses, params = [], []
+    if since_ms is not None:
+        clauses.append(f"{dataset.time_column} >= ?"); params.append(since_ms)
+    if until_ms is not None:
+        clauses.append(f"{dataset.time_column} < ?"); params.append(until_ms)
+    if session_ids is not None:
+        # One JSON parameter instead of one placeholder per id, so long session lists stay under SQLite's variable limit.
+        clauses.append(f"{dataset.session_column} IN (SELECT value FROM json_each(?))"); params.append(json.dumps(session_ids))
+    sql = dataset.select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return f"{sql} ORDER BY {dataset.order_by}", params
+
+
+def iter_chunks(conn, dataset, since_ms=None, until_ms=None, session_ids=None, chunk_rows=CHUNK_ROWS):
+    """Yields lists of at most `chunk_rows` rows from one cursor; SQLite steps the query only as far as it is read."""
+    sql, params = build_query(dataset, since_ms, until_ms, session_ids)
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def _ndjson(dataset, chunks):
+    names = dataset.column_names
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(names, row)), separators=(',', ':')) + "\n" for row in rows).encode("utf-8")
+
+
+def _csv(dataset, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(dataset.column_names)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0); buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8") # Header only: nothing matched
+
+
+class _ChunkSink:
+    """Write-only file object for pyarrow; `drain()` returns what was written since the last call."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _parquet(dataset, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # An explicit schema, so a chunk where a column is all NULL still gets the column's real type.
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in dataset.columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    try:
+        for rows in chunks:
+            columns = zip(*rows)
+            writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain() # Footer
+
+
+ENCODERS = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}
+
+
+def stream_export(db_path, dataset, fmt="ndjson", since_ms=None, until_ms=None, session_ids=None, stats=None):
+    """
+    Yields the encoded export as byte chunks. The database is opened
+    read-only for the duration; `stats`, if given, receives the row count.
+    """
+    spec = DATASETS[dataset]
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        chunks = iter_chunks(conn, spec, since_ms, until_ms, session_ids, ROW_GROUP_ROWS if fmt == "parquet" else CHUNK_ROWS)
+        if stats is not None:
+            chunks = _counted(chunks, stats)
+        yield from ENCODERS[fmt](spec, chunks)
+    finally:
+        conn.close()
+
+
+def _counted(chunks, stats):
+    stats.setdefault("rows", 0)
+    for rows in chunks:
+        stats["rows"] += len(rows)
+        yield rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export DrishtiAI monitoring data as NDJSON, CSV or Parquet.")
+    parser.add_argument("dataset", choices=list(DATASETS), help="What to export")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="Monitoring database (default: %(default)s)")
+    parser.add_argument("--format", default="ndjson", choices=list(FORMATS), help="Output format (default: %(default)s)")
+    parser.add_argument("--since", help="Start of the time range (inclusive): ISO date/time or epoch milliseconds")
+    parser.add_argument("--until", help="End of the time range (exclusive): ISO date/time or epoch milliseconds")
+    parser.add_argument("--sessions", help="Comma-separated session ids")
+    parser.add_argument("--output", help="File to write (default: standard output)")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    error = validate(args.dataset, args.format)
+    if error:
+        parser.error(error)
+    # Parsed before the output is opened, so a bad filter leaves no empty file behind.
+    try:
+        since_ms, until_ms = parse_time(args.since), parse_time(args.until)
+        session_ids = parse_session_ids(args.sessions)
+    except ValueError as e:
+        parser.error(f"invalid filter: {e}")
+
+    stats = {}
+    started = time.perf_counter()
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.db, args.dataset, args.format, since_ms, until_ms, session_ids, stats):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+    # Progress goes to stderr, so it never mixes with data written to stdout.
+    print(f"[INFO] Exported {stats.get('rows', 0):,} {args.dataset} rows as {args.format} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
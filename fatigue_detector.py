@@ -0,0 +1,347 @@
+import numpy as np
+
+from landmark_features import F_EAR, F_MAR, F_GAZE_RATIO, F_NOSE_DELTA
+from signal_window import SignalWindow
+
+# --- Tunable Parameters ---
+# Drowsiness Score Parameters
+DROWSINESS_SCORE_THRESHOLD = 9
+SCORE_INCREMENT_LONG_BLINK = 5
+SCORE_INCREMENT_YAWN = 3
+SCORE_DECAY_RATE = 1
+SCORE_DECAY_INTERVAL_SEC = 10
+SCORE_INCREMENT_PERCLOS = 2 # Added instead of the decay step while PERCLOS stays high
+PERCLOS_DROWSY_THRESHOLD = 0.15 # Fraction of the last minute with the eyes closed
+PERCLOS_MIN_SPAN_SEC = 30 # PERCLOS only counts once the window covers this much time
+GAZE_STABILITY_THRESHOLD_FRAMES = 5
+GAZE_CALIBRATED_TOLERANCE = 0.26
+# Other Parameters
+IDLE_TIME_THRESHOLD_SEC = 45; YAWN_MAR_THRESHOLD = 0.6; YAWN_DURATION_SEC = 1.5; MICRO_SLEEP_THRESHOLD_MS = 700; DROWSINESS_ALERT_DEBOUNCE_SEC = 10; EAR_VELOCITY_THRESHOLD = -0.008; NO_BLINK_THRESHOLD_SEC = 10; LOW_BLINK_RATE_THRESHOLD = 10; BLINK_RATE_WINDOW_SEC = 60; BREAK_DURATION_SEC = 20; NOTIFICATION_DEBOUNCE_SEC = 30; SUMMARY_LOG_INTERVAL_SEC = 15;HEAD_TILT_DOWN_THRESHOLD_PERCENT = 0.22;HEAD_TILT_UP_THRESHOLD_PERCENT = 0.19
+DEFAULT_EAR_THRESHOLD = 0.20
+DEFAULT_BREAK_INTERVAL_SEC = 20 * 60
+
+# --- Events ---
+# Values are the event_type strings stored in the events table.
+EVENT_BLINK = "BLINK"
+EVENT_YAWN = "YAWN_DETECTED"
+EVENT_MICRO_SLEEP = "MICRO_SLEEP_DETECTED"
+EVENT_STARE = "STARE_ALERT_TRIGGERED"
+EVENT_LOW_BPM = "LOW_BPM_ALERT_TRIGGERED"
+EVENT_FATIGUE = "FATIGUE_SCORE_ALERT"
+EVENT_BREAK = "20_20_20_BREAK_TAKEN"
+EVENT_SUMMARY_EAR = "SUMMARY_EAR"
+EVENT_SUMMARY_BPM = "SUMMARY_BPM"
+EVENT_IDLE_START = "USER_IDLE_START"
+EVENT_ACTIVE_RESUME = "USER_ACTIVE_RESUME"
+EVENT_LONG_BLINK_IGNORED = "LONG_BLINK_IGNORED" # Informational only; never written to the database
+NO_EVENTS = ()
+
+# Eye states
+EYE_OPEN = 0
+EYE_CLOSING = 1
+EYE_CLOSED = 2
+
+_NEVER = float("-inf")
+
+
+class FatigueDetector:
+    """
+    Streaming blink, yawn and fatigue state machine.
+
+    Feed it one feature row (see landmark_features) per analysed frame with
+    `step()`, or a whole recorded session through `run_batch()`. It keeps all
+    of its state in slots, performs no I/O, and reports what happened as
+    `(event_type, value)` pairs; logging, notifications and speech are left
+    to the caller.
+
+    Args:
+        ear_threshold (float): Calibrated closed-eye EAR threshold.
+        center_gaze (float): Calibrated gaze ratio when looking at the
+            screen; 0 disables gaze centring (every frame counts as away).
+        face_height (float): Calibrated face height, the scale for head tilt.
+        break_interval_sec (float): Working time between 20-20-20 breaks.
+            May be changed between frames.
+        t0 (float): Session start time on the same clock as `step()`.
+    """
+    __slots__ = (
+        "ear_threshold", "reopen_threshold", "center_gaze", "face_height", "break_interval_sec",
+        "_gaze_min", "_gaze_max", "_tilt_down_limit", "_tilt_up_limit",
+        "eye_state", "time_eye_closed_start", "last_blink_time", "prev_ear", "gaze_centered_frames",
+        "yawn_start_time", "yawn_counted", "drowsiness_score", "last_score_decay_time",
+        "last_drowsiness_alert_time", "last_no_blink_alert_time", "last_low_bpm_alert_time",
+        "signals",
+        "on_break", "break_start_time", "last_break_time", "last_summary_time",
+        "is_active", "time_no_face_start", "last_status_change_time", "active_time_sec", "idle_time_sec",
+        "blink_count", "yawn_count", "blink_rate_bpm",
+        "last_ear", "last_y_delta", "is_gaze_centered", "is_head_tilted", "steady_open",
+        "_events",
+    )
+
+    def __init__(self, ear_threshold=DEFAULT_EAR_THRESHOLD, center_gaze=0.0, face_height=0.0,
+                 break_interval_sec=DEFAULT_BREAK_INTERVAL_SEC, t0=0.0):
+        self.set_calibration(ear_threshold, center_gaze, face_height)
+        self.break_interval_sec = break_interval_sec
+
+        self.eye_state = EYE_OPEN
+        self.time_eye_closed_start = 0.0
+        self.last_blink_time = t0
+        self.prev_ear = 0.0
+        self.gaze_centered_frames = 0
+        self.yawn_start_time = None
+        self.yawn_counted = False
+        self.drowsiness_score = 0
+        self.last_score_decay_time = t0
+        self.last_drowsiness_alert_time = _NEVER
+        self.last_no_blink_alert_time = _NEVER
+        self.last_low_bpm_alert_time = _NEVER
+        # Per-frame EAR/MAR/gaze, eye closure and blinks over the blink-rate window.
+        self.signals = SignalWindow(BLINK_RATE_WINDOW_SEC)
+
+        self.on_break = False
+        self.break_start_time = 0.0
+        self.last_break_time = t0
+        self.last_summary_time = _NEVER
+        self.is_active = True
+        self.time_no_face_start = None
+        self.last_status_change_time = t0
+        self.active_time_sec = 0.0
+        self.idle_time_sec = 0.0
+
+        self.blink_count = 0
+        self.yawn_count = 0
+        self.blink_rate_bpm = 0.0
+        # Per-frame outputs for overlays and the input scaler.
+        self.last_ear = 0.0
+        self.last_y_delta = 0.0
+        self.is_gaze_centered = False
+        self.is_head_tilted = False
+        self.steady_open = False
+        self._events = []
+
+    def set_calibration(self, ear_threshold, center_gaze, face_height):
+        """Applies a (new) calibration; takes effect from the next frame."""
+        self.ear_threshold = ear_threshold
+        self.reopen_threshold = ear_threshold * 1.1
+        self.center_gaze = center_gaze or 0.0
+        self.face_height = face_height or 0.0
+        self._gaze_min = self.center_gaze - GAZE_CALIBRATED_TOLERANCE
+        self._gaze_max = self.center_gaze + GAZE_CALIBRATED_TOLERANCE
+        self._tilt_down_limit = self.face_height * HEAD_TILT_DOWN_THRESHOLD_PERCENT
+        self._tilt_up_limit = -(self.face_height * HEAD_TILT_UP_THRESHOLD_PERCENT)
+
+    def break_time_left(self, t):
+        """Seconds left in the current break (<= 0 when not on a break)."""
+        if not self.on_break:
+            return 0.0
+        return BREAK_DURATION_SEC - (t - self.break_start_time)
+
+    def step(self, features, t):
+        """
+        Advances the detector by one frame.
+
+        Args:
+            features: Feature row for the frame's face, or None when no face was found.
+            t (float): Capture time of the frame in seconds.
+
+        Returns:
+            tuple: `(event_type, value)` pairs emitted on this frame; the shared
+            empty tuple NO_EVENTS on the (usual) frames where nothing happens.
+        """
+        if features is None:
+            self._advance(t, False, 0.0, False, False, False, 0.0, 0.0)
+        else:
+            gaze = float(features[F_GAZE_RATIO])
+            y_delta = float(features[F_NOSE_DELTA])
+            self.last_y_delta = y_delta
+            tilted_down = y_delta > self._tilt_down_limit
+            centered = (self.center_gaze > 0 and self._gaze_min < gaze < self._gaze_max
+                        and not tilted_down and not y_delta < self._tilt_up_limit)
+            mar = float(features[F_MAR])
+            self._advance(t, True, float(features[F_EAR]), centered, tilted_down, mar > YAWN_MAR_THRESHOLD, mar, gaze)
+        if not self._events:
+            return NO_EVENTS
+        events = tuple(self._events)
+        self._events.clear()
+        return events
+
+    def run_batch(self, feature_array, timestamps, face_present=None):
+        """
+        Runs the detector over a whole recorded session and collects the
+        events with their frame indices.
+
+        A convenience wrapper around the same per-frame state machine as
+        `step()`, not a fast path: blinks, breaks, idle tracking and the
+        score all depend on earlier frames, so every frame still runs in
+        Python. Only the gaze, head-tilt and yawn tests are computed up
+        front, which saves about 15% over calling `step()` in a loop.
+
+        Args:
+            feature_array (np.ndarray): (T, NUM_FEATURES) feature rows.
+            timestamps (np.ndarray): (T,) capture times in seconds.
+            face_present (np.ndarray): Optional (T,) bool mask; defaults to
+                rows whose EAR is not NaN.
+
+        Returns:
+            list: `(frame_index, event_type, value)` for every emitted event.
+        """
+        features = np.asarray(feature_array, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        ear = features[:, F_EAR]
+        if face_present is None:
+            face_present = ~np.isnan(ear)
+        else:
+            face_present = np.asarray(face_present, dtype=bool)
+        gaze = features[:, F_GAZE_RATIO]
+        y_delta = features[:, F_NOSE_DELTA]
+        with np.errstate(invalid='ignore'):
+            tilted_down = y_delta > self._tilt_down_limit
+            centered = (gaze > self._gaze_min) & (gaze < self._gaze_max) & ~tilted_down & ~(y_delta < self._tilt_up_limit)
+            if not self.center_gaze > 0:
+                centered[:] = False
+            yawning = features[:, F_MAR] > YAWN_MAR_THRESHOLD
+        ear = np.where(face_present, ear, 0.0)
+        mar = np.where(face_present, features[:, F_MAR], 0.0)
+        gaze = np.where(face_present, gaze, 0.0)
+
+        emitted = []
+        pending = self._events
+        advance = self._advance
+        rows = zip(timestamps.tolist(), face_present.tolist(), ear.tolist(), centered.tolist(), tilted_down.tolist(), yawning.tolist(), mar.tolist(), gaze.tolist())
+        for i, (t, present, frame_ear, frame_centered, frame_tilted, frame_yawning, frame_mar, frame_gaze) in enumerate(rows):
+            advance(t, present, frame_ear, frame_centered, frame_tilted, frame_yawning, frame_mar, frame_gaze)
+            if pending:
+                for event_type, value in pending:
+                    emitted.append((i, event_type, value))
+                pending.clear()
+        if len(y_delta):
+            present_rows = np.flatnonzero(face_present)
+            if len(present_rows):
+                self.last_y_delta = float(y_delta[present_rows[-1]])
+        return emitted
+
+    @property
+    def perclos(self):
+        """PERCLOS over the last minute, or 0 until the window covers PERCLOS_MIN_SPAN_SEC."""
+        if self.signals.span_sec < PERCLOS_MIN_SPAN_SEC:
+            return 0.0
+        return self.signals.perclos()
+
+    def finalize(self, t):
+        """Closes the current active/idle period at `t` and returns (active_sec, idle_sec)."""
+        if self.is_active:
+            self.active_time_sec += t - self.last_status_change_time
+        else:
+            self.idle_time_sec += t - self.last_status_change_time
+        self.last_status_change_time = t
+        return self.active_time_sec, self.idle_time_sec
+
+    # --- State Machine ---
+    def _advance(self, t, present, ear, centered, tilted_down, yawning, mar, gaze):
+        self.last_ear = 0.0
+        self.is_head_tilted = False
+        self.steady_open = False
+        events = self._events
+
+        if self.on_break:
+            if t - self.break_start_time < BREAK_DURATION_SEC:
+                return
+            self.on_break = False; self.last_break_time = t
+
+        if not present:
+            if self.time_no_face_start is None:
+                self.time_no_face_start = t
+            elif t - self.time_no_face_start > IDLE_TIME_THRESHOLD_SEC and self.is_active:
+                active_duration = t - self.last_status_change_time
+                self.active_time_sec += active_duration
+                events.append((EVENT_IDLE_START, active_duration))
+                self.is_active = False; self.last_status_change_time = t
+            return
+
+        if not self.is_active:
+            idle_duration = t - self.last_status_change_time
+            self.idle_time_sec += idle_duration
+            events.append((EVENT_ACTIVE_RESUME, idle_duration))
+            self.last_blink_time = t; self.last_break_time = t; self.last_status_change_time = t
+        self.is_active = True; self.time_no_face_start = None
+
+        prev_ear = self.prev_ear
+        self.prev_ear = ear
+        self.last_ear = ear
+        self.is_head_tilted = tilted_down
+        self.is_gaze_centered = centered
+        # Closure only counts while looking at the screen, the same gating blinks get; looking down at a keyboard lowers EAR too.
+        self.signals.push(t, ear, mar, gaze, centered and ear < self.ear_threshold)
+
+        if t - self.last_break_time > self.break_interval_sec:
+            self.on_break = True; self.break_start_time = t
+            events.append((EVENT_BREAK, None))
+            return
+
+        if yawning:
+            if self.yawn_start_time is None:
+                self.yawn_start_time = t
+            elif not self.yawn_counted and t - self.yawn_start_time > YAWN_DURATION_SEC:
+                self.yawn_count += 1
+                self.drowsiness_score += SCORE_INCREMENT_YAWN
+                events.append((EVENT_YAWN, None))
+                self.yawn_counted = True
+        else:
+            self.yawn_start_time = None; self.yawn_counted = False
+
+        if centered:
+            self.gaze_centered_frames += 1
+        else:
+            self.gaze_centered_frames = 0
+            self.eye_state = EYE_OPEN
+            self.time_eye_closed_start = 0.0
+            self.last_blink_time = t
+
+        if self.gaze_centered_frames > GAZE_STABILITY_THRESHOLD_FRAMES:
+            eye_state = self.eye_state
+            if eye_state == EYE_OPEN and ear - prev_ear < EAR_VELOCITY_THRESHOLD:
+                self.eye_state = EYE_CLOSING
+            elif eye_state == EYE_CLOSING and ear < self.ear_threshold:
+                self.blink_count += 1; self.last_blink_time = t
+                self.signals.mark_blink()
+                events.append((EVENT_BLINK, None))
+                self.eye_state = EYE_CLOSED; self.time_eye_closed_start = t
+            elif eye_state == EYE_CLOSED and ear > self.reopen_threshold:
+                self.eye_state = EYE_OPEN
+                blink_duration_ms = (t - self.time_eye_closed_start) * 1000
+                if blink_duration_ms > MICRO_SLEEP_THRESHOLD_MS:
+                    if tilted_down:
+                        self.drowsiness_score += SCORE_INCREMENT_LONG_BLINK
+                        events.append((EVENT_MICRO_SLEEP, blink_duration_ms))
+                    else:
+                        events.append((EVENT_LONG_BLINK_IGNORED, blink_duration_ms))
+                self.time_eye_closed_start = 0.0
+            self.steady_open = self.eye_state == EYE_OPEN
+
+            time_since_last_blink = t - self.last_blink_time
+            if time_since_last_blink > NO_BLINK_THRESHOLD_SEC and t - self.last_no_blink_alert_time > NOTIFICATION_DEBOUNCE_SEC:
+                events.append((EVENT_STARE, time_since_last_blink))
+                self.last_no_blink_alert_time = t
+
+            blink_total = self.signals.blink_count
+            self.blink_rate_bpm = self.signals.blink_rate_bpm()
+            if (t - self.last_break_time > BLINK_RATE_WINDOW_SEC and self.blink_rate_bpm < LOW_BLINK_RATE_THRESHOLD
+                    and blink_total > 1 and t - self.last_low_bpm_alert_time > NOTIFICATION_DEBOUNCE_SEC):
+                events.append((EVENT_LOW_BPM, self.blink_rate_bpm))
+                self.last_low_bpm_alert_time = t
+
+        # Score decay and the master fatigue alert apply regardless of gaze stability.
+        if t - self.last_score_decay_time > SCORE_DECAY_INTERVAL_SEC:
+            if self.perclos >= PERCLOS_DROWSY_THRESHOLD:
+                self.drowsiness_score += SCORE_INCREMENT_PERCLOS
+            elif self.drowsiness_score > 0:
+                self.drowsiness_score = max(0, self.drowsiness_score - SCORE_DECAY_RATE)
+            self.last_score_decay_time = t
+
+        if self.drowsiness_score >= DROWSINESS_SCORE_THRESHOLD and t - self.last_drowsiness_alert_time > DROWSINESS_ALERT_DEBOUNCE_SEC:
+            events.append((EVENT_FATIGUE, self.drowsiness_score))
+            self.last_drowsiness_alert_time = t
+
+        if t - self.last_summary_time > SUMMARY_LOG_INTERVAL_SEC:
+            events.append((EVENT_SUMMARY_EAR, ear))
+            events.append((EVENT_SUMMARY_BPM, self.blink_rate_bpm))
+            self.last_summary_time = t
@@ -0,0 +1,226 @@
+import queue
+import threading
+import time
+
+import cv2
+
+
+class FramePacket:
+    """One camera frame as it moves through the pipeline."""
+    __slots__ = ("seq", "capture_time", "frame", "results", "inference_sec")
+
+    def __init__(self, seq, capture_time, frame):
+        self.seq = seq
+        self.capture_time = capture_time # Clock reading taken right after the frame was grabbed
+        self.frame = frame
+        self.results = None
+        self.inference_sec = 0.0 # Time spent in FaceMesh for this frame
+
+
+class StageTimer:
+    """Running latency totals for one pipeline stage."""
+    __slots__ = ("count", "total_sec", "max_sec")
+
+    def __init__(self):
+        self.count = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+
+    def record(self, elapsed_sec):
+        self.count += 1
+        self.total_sec += elapsed_sec
+        if elapsed_sec > self.max_sec:
+            self.max_sec = elapsed_sec
+
+    def as_dict(self):
+        avg_ms = (self.total_sec / self.count * 1000) if self.count else 0.0
+        return {"frames": self.count, "avg_ms": round(avg_ms, 2), "max_ms": round(self.max_sec * 1000, 2)}
+
+
+class FramePipeline:
+    """
+    Runs capture and FaceMesh inference on their own threads so a slow stage
+    never leaves the analysis stage working on stale camera frames.
+
+    - The grabber thread reads the camera continuously and keeps only the
+      newest frame; a frame that is replaced before inference picks it up is
+      counted as dropped.
+    - The inference thread flips the newest frame, converts it to RGB and runs
+      `face_mesh.process`, then hands the packet to a small bounded queue. If
+      analysis falls behind, the oldest waiting packet is discarded.
+    - The analysis stage is the caller, which pulls packets with `get()` and
+      reports its own processing time with `record_analysis()`.
+
+    Args:
+        cap: An opened `cv2.VideoCapture` (or anything with `read()`/`isOpened()`).
+        face_mesh: The MediaPipe FaceMesh instance to run on each frame.
+        clock (callable): Source of capture timestamps, `time.time` by default.
+        max_pending (int): Capacity of the inference -> analysis queue.
+        input_scaler (InputScaler): Optional; picks the resolution FaceMesh runs at.
+        scheduler (FrameRateScheduler): Optional; frames arriving before its
+            `frame_interval` has passed are skipped at capture.
+        drop_frames (bool): When False, stages wait for each other instead of
+            dropping, so every frame is analysed (used for offline replay).
+    """
+
+    def __init__(self, cap, face_mesh, clock=time.time, max_pending=2, input_scaler=None, drop_frames=True, scheduler=None):
+        self.cap = cap
+        self.scheduler = scheduler
+        self.drop_frames = drop_frames
+        self.face_mesh = face_mesh
+        self.input_scaler = input_scaler
+        self.clock = clock
+        self._latest = None
+        self._latest_cond = threading.Condition()
+        self._results = queue.Queue(maxsize=max_pending)
+        self._running = False
+        self._capture_done = False
+        self._threads = []
+
+        self.captured_count = 0
+        self.dropped_before_inference = 0
+        self.dropped_before_analysis = 0
+        self.capture_timer = StageTimer()
+        self.inference_timer = StageTimer()
+        self.analysis_timer = StageTimer()
+        self.end_to_end_timer = StageTimer()
+
+    # --- Lifecycle ---
+    def start(self):
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._grab_loop, name="FrameGrabber", daemon=True),
+            threading.Thread(target=self._inference_loop, name="FrameInference", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._latest_cond:
+            self._latest_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def release(self):
+        """Stops the pipeline and releases the capture device."""
+        self.stop()
+        self.cap.release()
+
+    @property
+    def finished(self):
+        """True once the source is exhausted and every packet has been consumed."""
+        return not any(t.is_alive() for t in self._threads) and self._results.empty()
+
+    # --- Analysis Stage Interface ---
+    def get(self, timeout=0.5):
+        """Returns the next inferred packet, or None if none arrived within `timeout`."""
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def record_analysis(self, packet, started_at):
+        """Records analysis time for a packet; `started_at` is a `time.perf_counter()` reading."""
+        self.analysis_timer.record(time.perf_counter() - started_at)
+        self.end_to_end_timer.record(max(0.0, self.clock() - packet.capture_time))
+
+    def stats(self):
+        return {
+            "input_scale": self.input_scaler.stats() if self.input_scaler else None,
+            "scheduler": self.scheduler.stats() if self.scheduler else None,
+            "captured": self.captured_count,
+            "dropped_before_inference": self.dropped_before_inference,
+            "dropped_before_analysis": self.dropped_before_analysis,
+            "capture": self.capture_timer.as_dict(),
+            "inference": self.inference_timer.as_dict(),
+            "analysis": self.analysis_timer.as_dict(),
+            "end_to_end": self.end_to_end_timer.as_dict(),
+        }
+
+    # --- Worker Threads ---
+    def _grab_loop(self):
+        seq = 0
+        scheduler = self.scheduler
+        # With a scheduler, frames are grabbed first and only decoded (retrieve) when they will be processed.
+        split_read = scheduler is not None and hasattr(self.cap, "grab") and hasattr(self.cap, "retrieve")
+        last_kept = float("-inf")
+        try:
+            while self._running and self.cap.isOpened():
+                started = time.perf_counter()
+                if split_read:
+                    if not self.cap.grab():
+                        break
+                    capture_time = self.clock()
+                    if scheduler.should_skip(capture_time - last_kept):
+                        continue
+                    ret, frame = self.cap.retrieve()
+                else:
+                    ret, frame = self.cap.read()
+                    capture_time = self.clock()
+                if not ret:
+                    break
+                if scheduler is not None and not split_read and scheduler.should_skip(capture_time - last_kept):
+                    continue
+                last_kept = capture_time
+                packet = FramePacket(seq, capture_time, frame)
+                seq += 1
+                self.captured_count += 1
+                self.capture_timer.record(time.perf_counter() - started)
+                with self._latest_cond:
+                    if not self.drop_frames:
+                        while self._latest is not None and self._running:
+                            self._latest_cond.wait()
+                    if self._latest is not None:
+                        self.dropped_before_inference += 1
+                    self._latest = packet
+                    self._latest_cond.notify()
+        finally:
+            with self._latest_cond:
+                self._capture_done = True
+                self._latest_cond.notify_all()
+
+    def _inference_loop(self):
+        while True:
+            with self._latest_cond:
+                while self._latest is None and self._running and not self._capture_done:
+                    self._latest_cond.wait()
+                packet = self._latest
+                self._latest = None
+                self._latest_cond.notify_all()
+            if packet is None:
+                return # Stopped, or the source ran dry and the last frame has been handled.
+            if not self._running:
+                return
+
+            started = time.perf_counter()
+            packet.frame = cv2.flip(packet.frame, 1)
+            rgb_frame = cv2.cvtColor(packet.frame, cv2.COLOR_BGR2RGB)
+            if self.input_scaler is not None:
+                packet.results = self.input_scaler.process(self.face_mesh, rgb_frame)
+            else:
+                packet.results = self.face_mesh.process(rgb_frame)
+            packet.inference_sec = time.perf_counter() - started
+            self.inference_timer.record(packet.inference_sec)
+
+            if not self.drop_frames:
+                while self._running:
+                    try:
+                        self._results.put(packet, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                continue
+
+            while True:
+                try:
+                    self._results.put_nowait(packet)
+                    break
+                except queue.Full:
+                    try:
+                        self._results.get_nowait()
+                        self.dropped_before_analysis += 1
+                    except queue.Empty:
+                        pass
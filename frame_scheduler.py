@@ -0,0 +1,97 @@
+from input_scaler import EAR_NOISE_JUMP_CAP
+from fatigue_detector import EYE_CLOSED
+
+# --- Tunable Parameters ---
+PRESENCE_CHECK_FPS = 2.0 # While idle, on a break, or with no face in view
+STEADY_FPS = 15.0 # During long, stable open-eye stretches
+STEADY_AFTER_SEC = 1.0 # Steady open-eye time after the last blink before downshifting
+NO_FACE_DOWNSHIFT_SEC = 2.0 # Face missing this long drops to the presence-check rate
+STEADY_EAR_MARGIN = 1.25 # Steady only while EAR stays this far above the calibrated threshold
+BLINK_ONSET_DROP = EAR_NOISE_JUMP_CAP # A frame-to-frame EAR drop this large is a blink starting, not noise
+PACING_SLACK = 0.9 # Keep a frame once 90% of the interval has passed, so camera jitter doesn't halve the rate
+
+MODE_FULL = "full"
+MODE_STEADY = "steady"
+MODE_PRESENCE = "presence"
+_MODE_INTERVALS = {MODE_FULL: 0.0, MODE_STEADY: 1.0 / STEADY_FPS, MODE_PRESENCE: 1.0 / PRESENCE_CHECK_FPS}
+
+
+class FrameRateScheduler:
+    """
+    Chooses how often the pipeline runs inference, from what the detector
+    saw on the last analysed frame.
+
+    - presence: the user is idle, on a break, or has been out of view for a
+      while; a few frames per second are enough to notice them return.
+    - steady: gaze centred and EAR well above the closed-eye threshold for
+      STEADY_AFTER_SEC; a blink still spans a couple of frames at this rate.
+    - full: everything else, including any sign of a blink starting (EAR
+      near the threshold or dropping sharply) and the first frame a face
+      reappears.
+
+    Downshifts wait for the condition to hold; upshifts happen on the very
+    next analysed frame. The capture stage reads `frame_interval` and skips
+    frames that arrive sooner, so skipped frames are never decoded (when the
+    source supports `grab()`) nor passed to FaceMesh.
+    """
+
+    def __init__(self):
+        self.mode = MODE_FULL
+        self.frame_interval = 0.0 # Minimum seconds between frames sent to inference
+        self._steady_since = None
+        self._no_face_since = None
+        self._prev_ear = None
+        self._mode_since = None
+        self.mode_seconds = {mode: 0.0 for mode in _MODE_INTERVALS}
+        self.upshifts = 0
+        self.skipped_frames = 0
+
+    def should_skip(self, elapsed):
+        """True if a frame `elapsed` seconds after the last kept one should not be processed."""
+        if elapsed < self.frame_interval * PACING_SLACK:
+            self.skipped_frames += 1
+            return True
+        return False
+
+    def update(self, detector, face_present, t):
+        """Picks the mode for the frames after this one; call once per analysed frame."""
+        ear = detector.last_ear if face_present else None
+        falling = ear is not None and self._prev_ear is not None and self._prev_ear - ear > BLINK_ONSET_DROP
+        self._prev_ear = ear
+
+        if face_present:
+            self._no_face_since = None
+        elif self._no_face_since is None:
+            self._no_face_since = t
+
+        if detector.on_break or not detector.is_active or (self._no_face_since is not None and t - self._no_face_since >= NO_FACE_DOWNSHIFT_SEC):
+            mode = MODE_PRESENCE
+            self._steady_since = None
+        elif (face_present and detector.is_gaze_centered and detector.eye_state != EYE_CLOSED
+              and ear > detector.ear_threshold * STEADY_EAR_MARGIN and not falling):
+            if self._steady_since is None:
+                self._steady_since = t
+            mode = MODE_STEADY if t - self._steady_since >= STEADY_AFTER_SEC else MODE_FULL
+        else:
+            mode = MODE_FULL
+            self._steady_since = None
+        self._set_mode(mode, t)
+
+    def _set_mode(self, mode, t):
+        if self._mode_since is not None:
+            self.mode_seconds[self.mode] += float(t - self._mode_since)
+        self._mode_since = t
+        if mode == self.mode:
+            return
+        if _MODE_INTERVALS[mode] < self.frame_interval:
+            self.upshifts += 1
+        self.mode = mode
+        self.frame_interval = _MODE_INTERVALS[mode]
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "skipped_frames": self.skipped_frames,
+            "upshifts": self.upshifts,
+            "mode_seconds": {mode: round(sec, 1) for mode, sec in self.mode_seconds.items()},
+        }
@@ -0,0 +1,108 @@
+import cv2
+
+from landmark_features import FOREHEAD_LANDMARK, CHIN_LANDMARK
+
+# --- Tunable Parameters ---
+SCALE_LEVELS = (1.0, 0.5) # Halving is the only step whose resize costs less than it saves
+MIN_INPUT_SHORT_SIDE_PX = 480 # FaceMesh resizes internally; below this, a smaller input no longer saves time
+MIN_FACE_INPUT_PX = 160 # Don't downscale once the face box would fall below this size
+EAR_NOISE_TARGET = 0.010 # Acceptable mean |dEAR| between consecutive open-eye frames
+EAR_NOISE_UPPER = 0.015 # Above this, step back up to a finer scale immediately
+EAR_NOISE_SAMPLES = 90 # Open-eye frames observed before considering a coarser scale
+EAR_NOISE_JUMP_CAP = 0.05 # Larger frame-to-frame changes are blinks, not noise
+
+# Left and right edges of the face oval; with the forehead and chin they bound the face.
+FACE_LEFT_LANDMARK = 234
+FACE_RIGHT_LANDMARK = 454
+
+
+class InputScaler:
+    """
+    Picks the resolution FaceMesh sees each frame at.
+
+    The whole frame is always passed in, so FaceMesh's own tracking, which
+    predicts the next face region from the previous frame's landmarks, works
+    on a fixed field of view. Large frames are downscaled while the EAR
+    signal stays smooth (see `report_ear`) and the face stays large enough,
+    and scaled back up as soon as it gets noisy; frames at webcam resolution
+    are never scaled. Landmarks are normalized to the frame, so they need no
+    remapping at any scale.
+    """
+
+    def __init__(self, scale_levels=SCALE_LEVELS):
+        self.scale_levels = scale_levels
+        self.scale_index = 0
+        self._face_px = 0 # Shorter side of the smallest face box in full-frame pixels
+        self._frame_px = 0 # Shorter side of the frame
+        self._last_ear = None
+        self._noise_sum = 0.0
+        self._noise_count = 0
+
+        self.face_frames = 0
+        self.scale_changes = 0
+
+    @property
+    def scale(self):
+        return self.scale_levels[self.scale_index]
+
+    def process(self, face_mesh, rgb_frame):
+        """Runs FaceMesh on `rgb_frame` at the current scale."""
+        image = rgb_frame
+        frame_h, frame_w = rgb_frame.shape[:2]
+        self._frame_px = min(frame_h, frame_w)
+        if self.scale < 1.0:
+            image = cv2.resize(rgb_frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        results = face_mesh.process(image)
+        if results.multi_face_landmarks:
+            self.face_frames += 1
+            self._face_px = min(_face_size_px(face_landmarks.landmark, frame_w, frame_h) for face_landmarks in results.multi_face_landmarks)
+        return results
+
+    def report_ear(self, ear):
+        """
+        Feeds one open-eye EAR sample from the analysis stage. Frame-to-frame
+        jitter drives the resolution policy: coarser while it stays below
+        EAR_NOISE_TARGET, finer as soon as it exceeds EAR_NOISE_UPPER.
+        """
+        last = self._last_ear
+        self._last_ear = ear
+        if last is None:
+            return
+        jump = abs(ear - last)
+        if jump > EAR_NOISE_JUMP_CAP:
+            return
+        self._noise_sum += jump
+        self._noise_count += 1
+        if self._noise_count < 10:
+            return
+
+        noise = self._noise_sum / self._noise_count
+        if noise > EAR_NOISE_UPPER and self.scale_index > 0:
+            self._set_scale_index(self.scale_index - 1)
+        elif (self._noise_count >= EAR_NOISE_SAMPLES and noise < EAR_NOISE_TARGET
+              and self.scale_index + 1 < len(self.scale_levels) and self._fits(self.scale_levels[self.scale_index + 1])):
+            self._set_scale_index(self.scale_index + 1)
+        elif self._noise_count >= EAR_NOISE_SAMPLES:
+            # Start a fresh measurement window at the current scale.
+            self._noise_sum = 0.0; self._noise_count = 0
+
+    def stats(self):
+        return {
+            "scale": self.scale,
+            "face_frames": self.face_frames,
+            "scale_changes": self.scale_changes,
+        }
+
+    def _fits(self, scale):
+        return self._frame_px * scale >= MIN_INPUT_SHORT_SIDE_PX and self._face_px * scale >= MIN_FACE_INPUT_PX
+
+    def _set_scale_index(self, index):
+        self.scale_index = index
+        self.scale_changes += 1
+        self._noise_sum = 0.0; self._noise_count = 0; self._last_ear = None
+
+
+def _face_size_px(landmarks, frame_w, frame_h):
+    width = abs(landmarks[FACE_RIGHT_LANDMARK].x - landmarks[FACE_LEFT_LANDMARK].x) * frame_w
+    height = abs(landmarks[CHIN_LANDMARK].y - landmarks[FOREHEAD_LANDMARK].y) * frame_h
+    return min(width, height)
@@ -0,0 +1,134 @@
+import numpy as np
+
+# --- MediaPipe FaceMesh Landmark Indices ---
+RIGHT_EYE_INDICES = [33, 160, 158, 133, 153, 144]
+LEFT_EYE_INDICES = [362, 385, 387, 263, 373, 380]
+LEFT_EYE_CORNER = 130
+RIGHT_EYE_CORNER = 359
+NOSE_TIP_LANDMARK = 1
+TOP_LIP_LANDMARK = 13
+BOTTOM_LIP_LANDMARK = 14
+MOUTH_LEFT_CORNER = 61
+MOUTH_RIGHT_CORNER = 291
+FOREHEAD_LANDMARK = 10
+CHIN_LANDMARK = 152
+NUM_LANDMARKS = 478 # 468 mesh points + 10 iris points with refine_landmarks=True
+
+# --- Feature Vector Layout ---
+F_EAR_LEFT = 0
+F_EAR_RIGHT = 1
+F_EAR = 2
+F_MAR = 3
+F_GAZE_RATIO = 4
+F_NOSE_Y = 5
+F_NOSE_DELTA = 6
+F_FACE_HEIGHT = 7
+NUM_FEATURES = 8
+
+# Endpoints of every distance the features need, in this order:
+# left eye (p2-p6, p3-p5, p1-p4), right eye (same), mouth (vertical, horizontal).
+_PAIR_START = np.array([LEFT_EYE_INDICES[1], LEFT_EYE_INDICES[2], LEFT_EYE_INDICES[0],
+                        RIGHT_EYE_INDICES[1], RIGHT_EYE_INDICES[2], RIGHT_EYE_INDICES[0],
+                        TOP_LIP_LANDMARK, MOUTH_LEFT_CORNER], dtype=np.intp)
+_PAIR_END = np.array([LEFT_EYE_INDICES[5], LEFT_EYE_INDICES[4], LEFT_EYE_INDICES[3],
+                      RIGHT_EYE_INDICES[5], RIGHT_EYE_INDICES[4], RIGHT_EYE_INDICES[3],
+                      BOTTOM_LIP_LANDMARK, MOUTH_RIGHT_CORNER], dtype=np.intp)
+# Single landmarks read directly: left eye corner, right eye corner, nose tip, forehead, chin.
+_POINT_INDICES = np.array([LEFT_EYE_CORNER, RIGHT_EYE_CORNER, NOSE_TIP_LANDMARK, FOREHEAD_LANDMARK, CHIN_LANDMARK], dtype=np.intp)
+# Every landmark the features read; `extract` copies only these.
+_USED_INDICES = np.unique(np.concatenate((_PAIR_START, _PAIR_END, _POINT_INDICES)))
+_USED_INDEX_LIST = _USED_INDICES.tolist()
+
+
+# --- Scalar Reference Implementations ---
+def calculate_ear(landmarks, eye_indices):
+    p1=np.array([landmarks[eye_indices[0]].x, landmarks[eye_indices[0]].y]);p2=np.array([landmarks[eye_indices[1]].x, landmarks[eye_indices[1]].y]);p3=np.array([landmarks[eye_indices[2]].x, landmarks[eye_indices[2]].y]);p4=np.array([landmarks[eye_indices[3]].x, landmarks[eye_indices[3]].y]);p5=np.array([landmarks[eye_indices[4]].x, landmarks[eye_indices[4]].y]);p6=np.array([landmarks[eye_indices[5]].x, landmarks[eye_indices[5]].y]);v1=np.linalg.norm(p2-p6);v2=np.linalg.norm(p3-p5);h=np.linalg.norm(p1-p4);return(v1+v2)/(2.0*h+1e-6)
+def calculate_mar(landmarks):
+    t=np.array([landmarks[TOP_LIP_LANDMARK].x, landmarks[TOP_LIP_LANDMARK].y]);b=np.array([landmarks[BOTTOM_LIP_LANDMARK].x, landmarks[BOTTOM_LIP_LANDMARK].y]);l=np.array([landmarks[MOUTH_LEFT_CORNER].x, landmarks[MOUTH_LEFT_CORNER].y]);r=np.array([landmarks[MOUTH_RIGHT_CORNER].x, landmarks[MOUTH_RIGHT_CORNER].y]);vd=np.linalg.norm(t-b);hd=np.linalg.norm(l-r);return vd/(hd+1e-6)
+
+
+class LandmarkFeatureExtractor:
+    """
+    Turns one face's landmarks into the per-frame feature vector used by
+    calibration and monitoring.
+
+    The landmarks the features use are copied into a preallocated (N, 3)
+    float32 array, and every distance is computed in one batch of vector ops
+    on buffers that are reused across frames. `extract` returns `self.features`, which
+    is overwritten on the next call; copy it if you need to keep it.
+
+    Args:
+        max_landmarks (int): Capacity of the landmark buffer.
+    """
+
+    def __init__(self, max_landmarks=NUM_LANDMARKS):
+        self.points = np.zeros((max_landmarks, 3), dtype=np.float32)
+        self.features = np.zeros(NUM_FEATURES, dtype=np.float32)
+        self.nose_baseline = 0.0 # Calibrated nose Y; F_NOSE_DELTA is measured against it.
+        self._start = np.zeros((len(_PAIR_START), 3), dtype=np.float32)
+        self._end = np.zeros((len(_PAIR_END), 3), dtype=np.float32)
+        self._dist = np.zeros(len(_PAIR_START), dtype=np.float32)
+        self._single = np.zeros((len(_POINT_INDICES), 3), dtype=np.float32)
+
+    def load_landmarks(self, face_landmarks):
+        """
+        Copies all of one face's landmarks into `self.points`.
+
+        Accepts a MediaPipe `NormalizedLandmarkList` (as found in
+        `results.multi_face_landmarks`), an (N, 3) array such as a row of a
+        recorded landmark trace, or any sequence of objects with x, y and z
+        attributes.
+        """
+        landmarks = getattr(face_landmarks, 'landmark', face_landmarks)
+        n = len(landmarks)
+        if n > len(self.points):
+            self.points = np.zeros((n, 3), dtype=np.float32)
+        if isinstance(landmarks, np.ndarray):
+            self.points[:n] = landmarks[:, :3]
+        else:
+            self.points[:n] = [(p.x, p.y, p.z) for p in landmarks]
+        return self.points
+
+    def extract(self, face_landmarks):
+        """
+        Computes the feature vector for one face's landmarks. Only the
+        landmarks the features use are copied into `self.points`; call
+        `load_landmarks` first if every point is needed.
+        """
+        landmarks = getattr(face_landmarks, 'landmark', face_landmarks)
+        if isinstance(landmarks, np.ndarray):
+            self.load_landmarks(landmarks)
+        else:
+            self.points[_USED_INDICES] = [(p.x, p.y, p.z) for p in map(landmarks.__getitem__, _USED_INDEX_LIST)]
+        return self.compute()
+
+    def compute(self, points=None):
+        """
+        Computes the feature vector from an (N, 3) array of normalized
+        landmarks, or from `self.points` if no array is given.
+        """
+        pts = self.points if points is None else points
+        np.take(pts, _PAIR_START, axis=0, out=self._start)
+        np.take(pts, _PAIR_END, axis=0, out=self._end)
+        np.subtract(self._start, self._end, out=self._start)
+        np.multiply(self._start, self._start, out=self._start)
+        # Distances are 2D, like the scalar reference implementation.
+        np.add(self._start[:, 0], self._start[:, 1], out=self._dist)
+        np.sqrt(self._dist, out=self._dist)
+        np.take(pts, _POINT_INDICES, axis=0, out=self._single)
+        # The remaining arithmetic is on a handful of scalars, which is cheaper on Python floats.
+        d0, d1, d2, d3, d4, d5, d6, d7 = self._dist.tolist()
+        (left_x, _, _), (right_x, _, _), (nose_x, nose_y, _), (_, forehead_y, _), (_, chin_y, _) = self._single.tolist()
+
+        ear_left = (d0 + d1) / (2.0 * d2 + 1e-6)
+        ear_right = (d3 + d4) / (2.0 * d5 + 1e-6)
+        f = self.features
+        f[F_EAR_LEFT] = ear_left
+        f[F_EAR_RIGHT] = ear_right
+        f[F_EAR] = (ear_left + ear_right) / 2.0
+        f[F_MAR] = d6 / (d7 + 1e-6)
+        f[F_GAZE_RATIO] = (nose_x - left_x) / (right_x - left_x + 1e-6)
+        f[F_NOSE_Y] = nose_y
+        f[F_NOSE_DELTA] = nose_y - self.nose_baseline
+        f[F_FACE_HEIGHT] = abs(chin_y - forehead_y)
+        return f
@@ -0,0 +1,134 @@
+import threading
+import time
+
+# --- Tunable Parameters ---
+FACE_MESH_OPTIONS = dict(static_image_mode=False, max_num_faces=1, refine_landmarks=True, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+TTS_RATE = 150
+TTS_VOLUME = 0.9
+WARM_CAMERA_HOLD_SEC = 30.0 # How long a camera handed over by calibration stays open waiting for monitoring
+
+_face_mesh_lock = threading.Lock()
+_tts_lock = threading.Lock() # Separate locks, so a slow voice engine never holds up the first frame
+_prewarm_lock = threading.Lock()
+_face_mesh = None
+_tts_engine = None
+_tts_loaded = False # Set once pyttsx3 was tried, so a failed init is not retried on every alert
+_prewarm_thread = None
+_camera_lock = threading.Lock()
+_warm_camera = None # (camera_index, capture, release timer)
+load_seconds = {} # Seconds each subsystem took to load, for the startup report
+
+
+def get_face_mesh():
+    """
+    Returns the shared MediaPipe FaceMesh, importing MediaPipe and building
+    the model on first use. Callers block until it is ready; if a prewarm is
+    already loading it, they wait for that instead of loading a second copy.
+    """
+    global _face_mesh
+    if _face_mesh is not None:
+        return _face_mesh
+    with _face_mesh_lock:
+        if _face_mesh is None:
+            started = time.perf_counter()
+            import mediapipe as mp
+            _face_mesh = mp.solutions.face_mesh.FaceMesh(**FACE_MESH_OPTIONS)
+            load_seconds["face_mesh"] = round(time.perf_counter() - started, 3)
+            print(f"[INFO] FaceMesh ready in {load_seconds['face_mesh']:.2f}s")
+    return _face_mesh
+
+
+def get_tts_engine():
+    """Returns the shared pyttsx3 engine, initialising it on first use; None if voice alerts are unavailable."""
+    global _tts_engine, _tts_loaded
+    if _tts_loaded:
+        return _tts_engine
+    with _tts_lock:
+        if not _tts_loaded:
+            started = time.perf_counter()
+            try:
+                import pyttsx3
+                engine = pyttsx3.init()
+                engine.setProperty('rate', TTS_RATE)
+                engine.setProperty('volume', TTS_VOLUME)
+                _tts_engine = engine
+            except Exception as e:
+                print(f"[WARNING] pyttsx3 initialization failed: {e}. Voice alerts will be disabled.")
+            load_seconds["tts"] = round(time.perf_counter() - started, 3)
+            _tts_loaded = True
+    return _tts_engine
+
+
+def tts_engine_if_loaded():
+    """The pyttsx3 engine if it was ever initialised, without triggering a load (for shutdown paths)."""
+    return _tts_engine
+
+
+def park_camera(camera_index, cap):
+    """
+    Keeps an opened capture so monitoring started soon after calibration can
+    reuse it instead of re-opening the device. Released after
+    WARM_CAMERA_HOLD_SEC if nobody takes it.
+    """
+    global _warm_camera
+    timer = threading.Timer(WARM_CAMERA_HOLD_SEC, release_parked_camera)
+    timer.daemon = True
+    with _camera_lock:
+        previous, _warm_camera = _warm_camera, (camera_index, cap, timer)
+    if previous is not None:
+        previous[2].cancel(); previous[1].release()
+    timer.start()
+
+
+def take_camera(camera_index):
+    """Returns the parked capture for `camera_index` if it is still open, else None; the caller owns it afterwards."""
+    global _warm_camera
+    with _camera_lock:
+        parked, _warm_camera = _warm_camera, None
+    if parked is None:
+        return None
+    index, cap, timer = parked
+    timer.cancel()
+    if index == camera_index and cap.isOpened():
+        return cap
+    cap.release()
+    return None
+
+
+def release_parked_camera():
+    global _warm_camera
+    with _camera_lock:
+        parked, _warm_camera = _warm_camera, None
+    if parked is not None:
+        parked[2].cancel(); parked[1].release()
+
+
+def prewarm():
+    """
+    Loads OpenCV, FaceMesh and the voice engine on a background thread so the
+    first calibration or monitoring request does not pay for them. Safe to
+    call repeatedly; only the first call starts a thread.
+    """
+    global _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is not None:
+            return _prewarm_thread
+        _prewarm_thread = threading.Thread(target=_prewarm_all, name="Prewarm", daemon=True)
+        _prewarm_thread.start()
+    return _prewarm_thread
+
+
+def _prewarm_all():
+    started = time.perf_counter()
+    try:
+        import cv2 # noqa: F401
+    except ImportError as e:
+        print(f"[WARNING] OpenCV could not be loaded: {e}")
+        return
+    load_seconds["cv2"] = round(time.perf_counter() - started, 3)
+    try:
+        get_face_mesh()
+    except Exception as e:
+        # The monitoring or calibration request that needs it will load it again and report the error there.
+        print(f"[WARNING] Prewarming FaceMesh failed: {e}")
+    get_tts_engine()
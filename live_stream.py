@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+DEFAULT_MAX_HZ = 4.0 # Upper bound on messages per second to one client
+HEARTBEAT_SEC = 15.0 # Comment line sent while nothing changes, so dead connections are noticed
+PUBLISH_INTERVAL_SEC = 0.1 # How often the monitoring loop offers a new snapshot
+
+
+class LiveMetrics:
+    """
+    One consistent, read-only view of the live session numbers.
+
+    A snapshot is never modified after it is built; the monitoring loop
+    publishes a new one and readers pick up a single reference, so they can
+    never see fields from two different moments. `seq` only increases when
+    the content changes, so a reader holding the same `seq` can skip it.
+    """
+    __slots__ = ("seq", "session_id", "blinks", "active_time", "bpm", "yawns", "gaze_centered", "fatigue_score", "perclos", "avg_ear")
+
+    def __init__(self, seq, session_id, blinks, active_time, bpm, yawns, gaze_centered, fatigue_score, perclos=0.0, avg_ear=0.0):
+        for name, value in zip(self.__slots__, (seq, session_id, blinks, active_time, bpm, yawns, gaze_centered, fatigue_score, perclos, avg_ear)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LiveMetrics snapshots are immutable")
+
+    def values(self):
+        """Everything except `seq`, for change detection."""
+        return (self.session_id, self.blinks, self.active_time, self.bpm, self.yawns, self.gaze_centered, self.fatigue_score, self.perclos, self.avg_ear)
+
+    def as_dict(self):
+        return {
+            'seq': self.seq,
+            'blinks': self.blinks,
+            'active_time': self.active_time,
+            'bpm': self.bpm,
+            'yawns': self.yawns,
+            'gaze_status': "Centered" if self.gaze_centered else "Away",
+            'fatigue_score': self.fatigue_score,
+            'perclos': self.perclos, # Percent of the last minute with the eyes closed
+            'avg_ear': self.avg_ear,
+        }
+
+
+EMPTY_METRICS = LiveMetrics(0, None, 0, 0, 0, 0, False, 0)
+
+
+class LiveMetricsPublisher:
+    """
+    Owns the current LiveMetrics snapshot. The monitoring loop calls
+    `publish()`; readers use `latest` (a single attribute read) or block in
+    `wait_for_change()`. Publishing identical numbers keeps the current
+    snapshot and wakes nobody.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.latest = EMPTY_METRICS
+
+    def publish(self, session_id, blinks, active_time, bpm, yawns, gaze_centered, fatigue_score, perclos=0.0, avg_ear=0.0):
+        """Swaps in a new snapshot if anything changed; returns the current one."""
+        current = self.latest
+        if current.values() == (session_id, blinks, active_time, bpm, yawns, gaze_centered, fatigue_score, perclos, avg_ear):
+            return current
+        snapshot = LiveMetrics(current.seq + 1, session_id, blinks, active_time, bpm, yawns, gaze_centered, fatigue_score, perclos, avg_ear)
+        with self._cond:
+            self.latest = snapshot
+            self._cond.notify_all()
+        return snapshot
+
+    def wait_for_change(self, seen_seq, timeout):
+        """Blocks until a snapshot newer than `seen_seq` exists or `timeout` passes; returns the latest snapshot."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.latest.seq != seen_seq, timeout)
+            return self.latest
+
+
+def sse_stream(publisher, max_hz=DEFAULT_MAX_HZ, heartbeat_sec=HEARTBEAT_SEC):
+    """
+    Generates a Server-Sent Events stream of stats deltas.
+
+    The first message carries every field; later ones only the fields that
+    changed since the previous message. Snapshots arriving faster than
+    `max_hz` are coalesced into the next message.
+    """
+    min_interval = 1.0 / max_hz
+    sent = {}
+    seen_seq = -1
+    yield "retry: 3000\n\n"
+    while True:
+        metrics = publisher.wait_for_change(seen_seq, heartbeat_sec)
+        if metrics.seq == seen_seq:
+            yield ": keep-alive\n\n"
+            continue
+        seen_seq = metrics.seq
+        stats = metrics.as_dict()
+        del stats['seq'] # Sent as the event id instead
+        delta = {key: value for key, value in stats.items() if sent.get(key) != value}
+        sent = stats
+        if delta:
+            yield f"id: {metrics.seq}\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+            time.sleep(min_interval)
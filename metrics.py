@@ -0,0 +1,231 @@
+import bisect
+import functools
+import threading
+import time
+
+# --- Tunable Parameters ---
+LATENCY_BUCKETS_SEC = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # DB helpers and HTTP handlers
+FRAME_BUCKETS_SEC = (0.002, 0.005, 0.01, 0.02, 0.033, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0) # Per-frame stages; 0.033 is one 30 FPS frame
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """A monotonically increasing count."""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """A value that is set rather than accumulated."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. The bucket array is allocated once, so
+    `observe()` is a binary search and three additions under a lock.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # The last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value) # Bucket bounds are inclusive ("le")
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_since(self, started):
+        """Observes the time since `started`, a `time.perf_counter()` reading."""
+        self.observe(time.perf_counter() - started)
+
+    def read(self):
+        """A consistent (cumulative bucket counts, sum, count) copy."""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def quantile(self, q, cumulative=None, count=None):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation."""
+        if cumulative is None:
+            cumulative, _, count = self.read()
+        if not count:
+            return 0.0
+        rank = q * count
+        i = bisect.bisect_left(cumulative, rank)
+        if i >= len(self.bounds):
+            return self.bounds[-1] # Above the largest bound; the best the buckets can say
+        lower = self.bounds[i - 1] if i else 0.0
+        below = cumulative[i - 1] if i else 0
+        in_bucket = cumulative[i] - below
+        return lower + (self.bounds[i] - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+
+
+class MetricFamily:
+    """
+    One named metric, with a child instrument per label combination. Hot
+    paths bind their child once with `labels()` and keep it, so recording
+    never builds a label tuple. A family with a `fn` is read when exported
+    instead: `fn()` returns the value, or {label values: value}.
+    """
+
+    def __init__(self, kind, name, help_text, labelnames=(), factory=None, fn=None):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.fn = fn
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self.factory())
+        return child
+
+    def samples(self):
+        """[(label values, instrument or plain value)] at this moment."""
+        if self.fn is None:
+            return list(self._children.items())
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"[WARNING] Metric {self.name} could not be read: {e}")
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(tuple(str(v) for v in (k if isinstance(k, tuple) else (k,))), v) for k, v in value.items()]
+        return [((), value)]
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Every metric of the process, exported as Prometheus text or a JSON snapshot."""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _register(self, family):
+        with self._lock:
+            if family.name in self._families:
+                raise ValueError(f"Metric {family.name} is already registered")
+            self._families[family.name] = family
+        # An unlabelled instrument is returned directly; a labelled one is bound with `labels()`.
+        return family.labels() if not family.labelnames and family.fn is None else family
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(MetricFamily("counter", name, help_text, labelnames, Counter))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(MetricFamily("gauge", name, help_text, labelnames, Gauge))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS_SEC, labelnames=()):
+        bounds = tuple(sorted(buckets))
+        return self._register(MetricFamily("histogram", name, help_text, labelnames, lambda: Histogram(bounds)))
+
+    def function(self, kind, name, help_text, fn, labelnames=()):
+        """A counter or gauge whose value is read from `fn` at export time (e.g. counts another object keeps)."""
+        return self._register(MetricFamily(kind, name, help_text, labelnames, fn=fn))
+
+    def render_text(self):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for family in list(self._families.values()):
+            lines.append(f"# HELP {family.name} {family.help_text}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, item in family.samples():
+                if isinstance(item, Histogram):
+                    cumulative, total, count = item.read()
+                    for bound, n in zip(item.bounds + (float("inf"),), cumulative):
+                        lines.append(f"{family.name}_bucket{_format_labels(family.labelnames, values, (('le', _format_value(bound)),))} {n}")
+                    lines.append(f"{family.name}_sum{_format_labels(family.labelnames, values)} {_format_value(total)}")
+                    lines.append(f"{family.name}_count{_format_labels(family.labelnames, values)} {count}")
+                else:
+                    value = item.value if isinstance(item, (Counter, Gauge)) else item
+                    lines.append(f"{family.name}{_format_labels(family.labelnames, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """The same metrics as a JSON-ready dict; histograms also carry p50/p95/p99 estimates."""
+        result = {}
+        for family in list(self._families.values()):
+            samples = []
+            for values, item in family.samples():
+                sample = {"labels": dict(zip(family.labelnames, values))}
+                if isinstance(item, Histogram):
+                    cumulative, total, count = item.read()
+                    sample.update(count=count, sum=round(total, 6),
+                                  buckets={_format_value(b): n for b, n in zip(item.bounds + (float("inf"),), cumulative)},
+                                  **{f"p{int(q * 100)}": round(item.quantile(q, cumulative, count), 6) for q in (0.5, 0.95, 0.99)})
+                else:
+                    sample["value"] = item.value if isinstance(item, (Counter, Gauge)) else item
+                samples.append(sample)
+            result[family.name] = {"type": family.kind, "help": family.help_text, "samples": samples}
+        return result
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+function = REGISTRY.function
+render_text = REGISTRY.render_text
+snapshot = REGISTRY.snapshot
+
+
+def timed(histogram):
+    """Decorator observing each call's duration in `histogram` (a bound Histogram)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
@@ -0,0 +1,367 @@
+"""
+Monitoring several streams at once, one worker process per stream.
+
+Each worker opens its own source (a camera index or a video file), builds
+its own FaceMesh for up to `max_faces` faces and keeps one FatigueDetector
+per face, so nothing is shared between streams or between faces and each
+stream gets a core of its own. Workers send events back over one queue; the
+parent gives every (stream, face) pair its own session, tagged with
+`stream_id` and `face_id`, and writes all events through a single
+EventWriter.
+
+Faces are told apart by position: each detected face is matched to the
+nearest face seen recently on the same stream. A face missing for
+FACE_FORGET_SEC ends its session.
+
+    python multi_stream.py 0 1                        # two webcams
+    python multi_stream.py 0 lab_recording.mp4 --max-faces 4
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import db_schema
+import rollups
+import settings_cache
+from event_writer import EventWriter
+
+DEFAULT_DB_FILE = os.path.join(os.path.expanduser('~'), '.DrishtiAI', 'monitoring_data.db')
+DEFAULT_PROFILE_FILE = os.path.join(os.path.expanduser('~'), '.DrishtiAI', 'calibration_profile.json')
+
+# --- Tunable Parameters ---
+FACE_MATCH_DISTANCE = 0.15 # Largest nose movement between frames (normalized image units) for the same face
+FACE_FORGET_SEC = 300.0 # A face missing this long ends its session
+EVENT_SEND_INTERVAL_SEC = 0.25 # Workers batch events for this long before sending them to the parent
+STATS_INTERVAL_SEC = 1.0
+QUEUE_SIZE = 1000 # Messages waiting for the parent; a full queue makes workers wait, never drop
+
+# Messages from workers: (kind, stream_id, payload)
+MSG_FACE_START = "face_start" # (face_id, t)
+MSG_EVENTS = "events" # [(face_id, ts_ms, type_id, value_numeric), ...]
+MSG_FACE_END = "face_end" # (face_id, t, active_sec, idle_sec)
+MSG_STATS = "stats" # dict
+MSG_STREAM_END = "stream_end" # error message or None
+
+
+class FaceIdentities:
+    """
+    Gives each face on one stream a stable id from frame to frame by
+    matching it to the nearest face (by nose position) seen recently.
+    """
+
+    def __init__(self, max_distance=FACE_MATCH_DISTANCE, forget_after_sec=FACE_FORGET_SEC):
+        self.max_distance = max_distance
+        self.forget_after_sec = forget_after_sec
+        self.last_seen = {} # face_id -> (x, y, t)
+        self._next_id = 1
+
+    def assign(self, positions, t):
+        """Returns a face id for each (x, y) in `positions`, in the same order; unmatched faces get new ids."""
+        pairs = sorted(
+            (math.hypot(x - fx, y - fy), i, face_id)
+            for i, (x, y) in enumerate(positions)
+            for face_id, (fx, fy, _) in self.last_seen.items())
+        ids = [None] * len(positions)
+        taken = set()
+        for distance, i, face_id in pairs:
+            if distance > self.max_distance:
+                break
+            if ids[i] is None and face_id not in taken:
+                ids[i] = face_id; taken.add(face_id)
+        for i, (x, y) in enumerate(positions):
+            if ids[i] is None:
+                ids[i] = self._next_id; self._next_id += 1
+            self.last_seen[ids[i]] = (x, y, t)
+        return ids
+
+    def expire(self, t):
+        """Forgets faces missing for `forget_after_sec` and returns their ids."""
+        gone = [face_id for face_id, (_, _, seen) in self.last_seen.items() if t - seen > self.forget_after_sec]
+        for face_id in gone:
+            del self.last_seen[face_id]
+        return gone
+
+
+def _open_source(source):
+    """Returns (capture, clock, drop_frames) for a camera index or a video file path."""
+    import cv2
+    if source.isdigit():
+        return cv2.VideoCapture(int(source)), time.time, True
+    from video_source import ReplayClock, VideoReplaySource
+    # Files are analysed as fast as they decode, stamped with their own timeline like replay.py does.
+    clock = ReplayClock(time.time())
+    return VideoReplaySource(source, clock=clock), clock, False
+
+
+def run_stream(stream_id, source, config, out_queue, stop_event):
+    """Worker process body: monitors one source until it ends or `stop_event` is set."""
+    import cv2
+    import mediapipe as mp
+    from fatigue_detector import FatigueDetector, EVENT_LONG_BLINK_IGNORED
+    from frame_pipeline import FramePipeline
+    from landmark_features import LandmarkFeatureExtractor, NOSE_TIP_LANDMARK
+    from lazy_runtime import FACE_MESH_OPTIONS
+
+    # One core per stream: OpenCV's own thread pool would only compete with the other workers.
+    cv2.setNumThreads(1)
+    error = None
+    try:
+        cap, clock, drop_frames = _open_source(source)
+        if not cap.isOpened():
+            raise RuntimeError(f"cannot open source {source!r}")
+        max_faces = config["max_faces"]
+        face_mesh = mp.solutions.face_mesh.FaceMesh(**dict(FACE_MESH_OPTIONS, max_num_faces=max_faces))
+        pipeline = FramePipeline(cap, face_mesh, clock=clock, drop_frames=drop_frames).start()
+        extractor = LandmarkFeatureExtractor()
+        extractor.nose_baseline = config["nose_baseline"]
+        identities = FaceIdentities()
+        detectors = {}
+        pending = []
+        last_send = last_stats = clock()
+
+        def queue_events(face_id, events, t):
+            # Long blinks are only a detector diagnostic; they have no event type in the database.
+            for event_type, value in events:
+                if event_type != EVENT_LONG_BLINK_IGNORED:
+                    pending.append((face_id, db_schema.to_ms(t), db_schema.event_type_id(event_type), value))
+
+        def end_face(face_id, t):
+            active_sec, idle_sec = detectors.pop(face_id).finalize(t)
+            out_queue.put((MSG_FACE_END, stream_id, (face_id, t, active_sec, idle_sec)))
+
+        try:
+            while not stop_event.is_set():
+                packet = pipeline.get()
+                if packet is None:
+                    if pipeline.finished: break
+                    continue
+                analysis_started = time.perf_counter()
+                t = packet.capture_time
+                faces = packet.results.multi_face_landmarks or []
+                features = []
+                positions = []
+                for face_landmarks in faces:
+                    features.append(extractor.extract(face_landmarks).copy())
+                    positions.append(tuple(extractor.points[NOSE_TIP_LANDMARK, :2].tolist()))
+                seen = set()
+                for face_id, row in zip(identities.assign(positions, t), features):
+                    seen.add(face_id)
+                    detector = detectors.get(face_id)
+                    if detector is None:
+                        detector = detectors[face_id] = FatigueDetector(config["ear_threshold"], config["center_gaze"], config["face_height"],
+                                                                        config["break_interval_sec"], t0=t)
+                        out_queue.put((MSG_FACE_START, stream_id, (face_id, t)))
+                    queue_events(face_id, detector.step(row, t), t)
+                # Faces that are out of view still advance, so they go idle and take breaks like a single user does.
+                for face_id, detector in detectors.items():
+                    if face_id not in seen:
+                        queue_events(face_id, detector.step(None, t), t)
+                for face_id in identities.expire(t):
+                    end_face(face_id, t)
+                pipeline.record_analysis(packet, analysis_started)
+
+                if pending and t - last_send >= EVENT_SEND_INTERVAL_SEC:
+                    out_queue.put((MSG_EVENTS, stream_id, pending)); pending = []; last_send = t
+                if t - last_stats >= STATS_INTERVAL_SEC:
+                    out_queue.put((MSG_STATS, stream_id, _stream_stats(pipeline, detectors))); last_stats = t
+        finally:
+            pipeline.release()
+            if pending:
+                out_queue.put((MSG_EVENTS, stream_id, pending))
+            t = clock()
+            for face_id in list(detectors):
+                end_face(face_id, t)
+            out_queue.put((MSG_STATS, stream_id, _stream_stats(pipeline, detectors)))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    out_queue.put((MSG_STREAM_END, stream_id, error))
+
+
+def _stream_stats(pipeline, detectors):
+    stats = pipeline.stats()
+    return {
+        "frames": stats["analysis"]["frames"],
+        "dropped": stats["dropped_before_inference"] + stats["dropped_before_analysis"],
+        "inference_ms": stats["inference"]["avg_ms"],
+        "faces": {face_id: {"blinks": d.blink_count, "bpm": int(d.blink_rate_bpm), "yawns": d.yawn_count,
+                            "fatigue_score": d.drowsiness_score, "active": d.is_active}
+                  for face_id, d in detectors.items()},
+    }
+
+
+def load_profile(path=DEFAULT_PROFILE_FILE):
+    """The calibration profile every face starts from; defaults where it is missing or unreadable."""
+    profile = {"ear_threshold": 0.20, "avg_center_gaze": 0.0, "avg_face_height": 0.0, "avg_nose_y": 0.0}
+    try:
+        with open(path) as f:
+            profile.update(json.load(f))
+    except (OSError, json.JSONDecodeError):
+        print(f"[WARNING] Calibration profile {path} not found or unreadable. Using default values.")
+    return profile
+
+
+class MultiStreamMonitor:
+    """
+    Runs one worker process per source and records what they report.
+
+    Args:
+        sources (list): Camera indices or video file paths, as strings.
+        db_path (str): Monitoring database; every stream writes to it.
+        max_faces (int): Faces tracked per stream.
+        profile_path (str): Calibration profile shared by every face.
+    """
+
+    def __init__(self, sources, db_path=DEFAULT_DB_FILE, max_faces=1, profile_path=DEFAULT_PROFILE_FILE):
+        self.sources = list(sources)
+        self.db_path = db_path
+        self.max_faces = max_faces
+        self.profile_path = profile_path
+        self.stream_stats = {}
+        self.errors = {}
+        self._sessions = {} # (stream_id, face_id) -> (session_id, start_time_iso)
+        self._processes = []
+        self._collector = None
+        self._running_streams = set()
+
+    def start(self):
+        profile = load_profile(self.profile_path)
+        config = {
+            "max_faces": self.max_faces,
+            "ear_threshold": profile["ear_threshold"],
+            "center_gaze": profile["avg_center_gaze"],
+            "face_height": profile["avg_face_height"],
+            "nose_baseline": profile["avg_nose_y"] or 0.0,
+            "break_interval_sec": settings_cache.get(self.db_path).break_interval_min * 60,
+        }
+        # Spawned, not forked: MediaPipe and camera handles must not be inherited half-initialised.
+        context = multiprocessing.get_context("spawn")
+        self._queue = context.Queue(maxsize=QUEUE_SIZE)
+        self._stop = context.Event()
+        self.writer = EventWriter(self.db_path).start()
+        for i, source in enumerate(self.sources):
+            stream_id = f"stream{i}:{source}"
+            process = context.Process(target=run_stream, args=(stream_id, source, config, self._queue, self._stop),
+                                      name=f"Stream-{i}", daemon=True)
+            process.start()
+            self._processes.append(process)
+            self._running_streams.add(stream_id)
+        self._collector = threading.Thread(target=self._collect, name="StreamCollector", daemon=True)
+        self._collector.start()
+        return self
+
+    @property
+    def running(self):
+        return self._collector is not None and self._collector.is_alive()
+
+    def stop(self, timeout=10.0):
+        """Asks every worker to finish, waits for their final events and sessions, and closes the writer."""
+        self._stop.set()
+        if self._collector is not None:
+            self._collector.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.writer.close()
+
+    def stats(self):
+        return {"streams": dict(self.stream_stats), "errors": dict(self.errors),
+                "sessions": {f"{stream}/{face}": session for (stream, face), (session, _) in self._sessions.items()},
+                "events_written": self.writer.written_count, "events_dropped": self.writer.dropped_count}
+
+    # --- Parent-Side Recording ---
+    def _collect(self):
+        while self._running_streams:
+            try:
+                kind, stream_id, payload = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in self._processes):
+                    break
+                continue
+            if kind == MSG_EVENTS:
+                for face_id, ts_ms, type_id, value in payload:
+                    session = self._sessions.get((stream_id, face_id))
+                    if session is not None:
+                        # Blocking here stalls the workers on the full message queue rather than losing events.
+                        self.writer.submit((session[0], ts_ms, type_id, value, None), block=True)
+            elif kind == MSG_FACE_START:
+                face_id, t = payload
+                self._sessions[(stream_id, face_id)] = self._start_session(stream_id, face_id, t)
+            elif kind == MSG_FACE_END:
+                face_id, t, active_sec, idle_sec = payload
+                session = self._sessions.pop((stream_id, face_id), None)
+                if session is not None:
+                    self._end_session(session, t, active_sec, idle_sec)
+            elif kind == MSG_STATS:
+                self.stream_stats[stream_id] = payload
+            elif kind == MSG_STREAM_END:
+                self._running_streams.discard(stream_id)
+                if payload:
+                    self.errors[stream_id] = payload
+                    print(f"[ERROR] {stream_id} stopped: {payload}")
+
+    def _start_session(self, stream_id, face_id, t):
+        start_time_iso = datetime.fromtimestamp(t).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            session_id = conn.execute("INSERT INTO sessions (start_time, start_ms, stream_id, face_id) VALUES (?, ?, ?, ?)",
+                                      (start_time_iso, db_schema.to_ms(t), stream_id, face_id)).lastrowid
+            rollups.record_session_start(conn, start_time_iso)
+        conn.close()
+        self.writer.submit((session_id, db_schema.to_ms(t), db_schema.event_type_id("SESSION_START"), None, None), block=True)
+        print(f"[INFO] {stream_id}: face {face_id} started session {session_id}")
+        return session_id, start_time_iso
+
+    def _end_session(self, session, t, active_sec, idle_sec):
+        session_id, start_time_iso = session
+        end_time_iso = datetime.fromtimestamp(t).isoformat()
+        self.writer.submit((session_id, db_schema.to_ms(t), db_schema.event_type_id("SESSION_END"), None, None), block=True)
+        # The session's events must be on disk before its metrics are computed from them.
+        self.writer.flush()
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("UPDATE sessions SET end_time = ?, end_ms = ?, total_active_time_sec = ?, total_idle_time_sec = ? WHERE session_id = ?",
+                         (end_time_iso, db_schema.to_ms(t), int(active_sec), int(idle_sec), session_id))
+            rollups.record_session_end(conn, start_time_iso, end_time_iso, int(active_sec), int(idle_sec))
+            db_schema.record_session_metrics(conn, session_id)
+        conn.close()
+        print(f"[INFO] Session {session_id} ended. Active: {int(active_sec)}s, Idle: {int(idle_sec)}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor several cameras or video files at once, one process per stream.")
+    parser.add_argument("sources", nargs="+", help="Camera indices (0, 1, ...) or video file paths")
+    parser.add_argument("--max-faces", type=int, default=1, help="Faces tracked per stream (default: %(default)s)")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="Monitoring database (default: %(default)s)")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE_FILE, help="Calibration profile shared by every face")
+    parser.add_argument("--stats-every", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    db_schema.ensure_schema(conn)
+    rollups.create_tables(conn)
+    conn.commit(); conn.close()
+
+    monitor = MultiStreamMonitor(args.sources, args.db, args.max_faces, args.profile).start()
+    started = time.perf_counter()
+    try:
+        while monitor.running:
+            time.sleep(args.stats_every)
+            elapsed = time.perf_counter() - started
+            for stream_id, stats in sorted(monitor.stream_stats.items()):
+                print(f"[INFO] {stream_id}: {stats['frames'] / elapsed:.1f} fps, {len(stats['faces'])} face(s), {stats['dropped']} dropped")
+    except KeyboardInterrupt:
+        pass
+    monitor.stop()
+    print(json.dumps(monitor.stats(), indent=4, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,39 @@
 # --- Main Imports ---
-import webbrowser
-import cv2
-import mediapipe as mp
-import numpy as np
 import time
-from collections import deque, defaultdict
+_IMPORT_STARTED = time.perf_counter() # Start of the startup-time measurement
+import webbrowser
 import json
 import os
 import sqlite3
 from datetime import datetime, timedelta
 import threading
-import requests
+import importlib.util
 
 # --- Local Module Imports ---
-import wellness_assistant
+import session_reports
+from event_writer import EventWriter
+import settings_cache
+import rollups
+import db_schema
+import lazy_runtime
+import export
+import metrics
+from chat_client import ChatClient, ChatContextCache
+from alert_dispatcher import AlertDispatcher, PRIORITY_HIGH, PRIORITY_LOW
+from adaptive_calibration import AdaptiveCalibration, SOURCE_CALIBRATION, read_profile, write_profile
+from retention import RetentionEngine
+import calibration
+from calibration import CalibrationJobs, CALIBRATION_FRAMES_OPEN, CALIBRATION_FRAMES_BLINK
+from live_stream import LiveMetricsPublisher, sse_stream, DEFAULT_MAX_HZ as LIVE_STREAM_MAX_HZ, PUBLISH_INTERVAL_SEC as LIVE_METRICS_INTERVAL_SEC
+from fatigue_detector import (
+    FatigueDetector, BREAK_DURATION_SEC, HEAD_TILT_UP_THRESHOLD_PERCENT,
+    EVENT_YAWN, EVENT_MICRO_SLEEP, EVENT_LONG_BLINK_IGNORED, EVENT_STARE, EVENT_LOW_BPM, EVENT_FATIGUE,
+    EVENT_BREAK, EVENT_IDLE_START, EVENT_ACTIVE_RESUME,
+)
+from landmark_features import LandmarkFeatureExtractor, F_EAR, F_GAZE_RATIO, F_NOSE_Y, F_FACE_HEIGHT
 
 # --- Flask Imports for Web Server ---
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
 
 # --- Dependency Checks ---
 try:
@@ -25,48 +42,13 @@ try:
 except ImportError:
     print("[WARNING] 'plyer' not found. Desktop notifications will be disabled.")
     PLYER_AVAILABLE = False
-try:
-    import pyttsx3
-    PYTTSX_AVAILABLE = True
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 150)
-    engine.setProperty('volume', 0.9)
-except Exception as e:
-    print(f"[WARNING] pyttsx3 initialization failed: {e}. Voice alerts will be disabled.")
-    PYTTSX_AVAILABLE = False
-
-
-# --- MediaPipe and Calculation Functions ---
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True, min_detection_confidence=0.5, min_tracking_confidence=0.5)
-RIGHT_EYE_INDICES = [33, 160, 158, 133, 153, 144]
-LEFT_EYE_INDICES = [362, 385, 387, 263, 373, 380]
-LEFT_EYE_CORNER = 130
-RIGHT_EYE_CORNER = 359
-drowsiness_score = 0
-NOSE_TIP_LANDMARK = 1
-TOP_LIP_LANDMARK = 13
-BOTTOM_LIP_LANDMARK = 14
-MOUTH_LEFT_CORNER = 61
-MOUTH_RIGHT_CORNER = 291
-FOREHEAD_LANDMARK = 10
-CHIN_LANDMARK = 152
-def calculate_ear(landmarks, eye_indices):
-    p1=np.array([landmarks[eye_indices[0]].x, landmarks[eye_indices[0]].y]);p2=np.array([landmarks[eye_indices[1]].x, landmarks[eye_indices[1]].y]);p3=np.array([landmarks[eye_indices[2]].x, landmarks[eye_indices[2]].y]);p4=np.array([landmarks[eye_indices[3]].x, landmarks[eye_indices[3]].y]);p5=np.array([landmarks[eye_indices[4]].x, landmarks[eye_indices[4]].y]);p6=np.array([landmarks[eye_indices[5]].x, landmarks[eye_indices[5]].y]);v1=np.linalg.norm(p2-p6);v2=np.linalg.norm(p3-p5);h=np.linalg.norm(p1-p4);return(v1+v2)/(2.0*h+1e-6)
-def calculate_mar(landmarks):
-    t=np.array([landmarks[TOP_LIP_LANDMARK].x, landmarks[TOP_LIP_LANDMARK].y]);b=np.array([landmarks[BOTTOM_LIP_LANDMARK].x, landmarks[BOTTOM_LIP_LANDMARK].y]);l=np.array([landmarks[MOUTH_LEFT_CORNER].x, landmarks[MOUTH_LEFT_CORNER].y]);r=np.array([landmarks[MOUTH_RIGHT_CORNER].x, landmarks[MOUTH_RIGHT_CORNER].y]);vd=np.linalg.norm(t-b);hd=np.linalg.norm(l-r);return vd/(hd+1e-6)
+# OpenCV, MediaPipe, pyttsx3 and requests are imported on first use (see lazy_runtime), so the dashboard is up before they load.
+PYTTSX_AVAILABLE = importlib.util.find_spec("pyttsx3") is not None
+if not PYTTSX_AVAILABLE:
+    print("[WARNING] 'pyttsx3' not found. Voice alerts will be disabled.")
 
 # --- Tunable Parameters & File Paths ---
-# Drowsiness Score Parameters
-DROWSINESS_SCORE_THRESHOLD = 9
-SCORE_INCREMENT_LONG_BLINK = 5
-SCORE_INCREMENT_YAWN = 3
-SCORE_DECAY_RATE = 1
-SCORE_DECAY_INTERVAL_SEC = 10
-GAZE_STABILITY_THRESHOLD_FRAMES = 5
-# Other Parameters
-IDLE_TIME_THRESHOLD_SEC = 45; YAWN_MAR_THRESHOLD = 0.6; YAWN_DURATION_SEC = 1.5; MICRO_SLEEP_THRESHOLD_MS = 700; DROWSINESS_ALERT_DEBOUNCE_SEC = 10; EAR_VELOCITY_THRESHOLD = -0.008; NO_BLINK_THRESHOLD_SEC = 10; LOW_BLINK_RATE_THRESHOLD = 10; BLINK_RATE_WINDOW_SEC = 60; BREAK_DURATION_SEC = 20; NOTIFICATION_DEBOUNCE_SEC = 30; SUMMARY_LOG_INTERVAL_SEC = 15;HEAD_TILT_DOWN_THRESHOLD_PERCENT = 0.22;HEAD_TILT_UP_THRESHOLD_PERCENT = 0.19
-CALIBRATION_FRAMES_OPEN = 150; CALIBRATION_FRAMES_BLINK = 150
+# Detection parameters live with the FatigueDetector and are imported from fatigue_detector above.
 # --- ADD THIS HELPER FUNCTION AND NEW PATH DEFINITIONS ---
 import sys # Make sure you have this import at the top of your file
 
@@ -99,19 +81,49 @@ DB_FILE = get_user_data_path("monitoring_data.db")
 # --- END OF REPLACEMENT ---
 
 # --- Global State Variables ---
-conversation_history = []
 monitoring_active = False
 monitoring_thread = None
-yawn_count = 0; blink_count = 0; active_time_sec = 0; idle_time_sec = 0
-blink_rate_bpm = 0; is_gaze_centered = False; user_status = "Idle"
-last_status_change_time = time.time()
 current_session_id = None; session_start_time_iso = None
+event_writer = None
+frame_pipeline = None
+session_clock = time.time # Replaced by an injected clock when replaying recordings
+live_metrics = LiveMetricsPublisher() # The one source of live numbers for /api/stats, /api/stream and /api/chat
+calibration_jobs = CalibrationJobs()
+chat_client = ChatClient() # Pooled connection to the chat proxy; holds the conversation history
+chat_context = None # ChatContextCache for DB_FILE, created on first chat
+retention_engine = None # Compacts old events in the background once the app is running
+adaptive_calibration = None # AdaptiveCalibration of the running session, if its profile is complete
+
+# --- Instrumentation (exported at /metrics and /api/metrics) ---
+# Hot paths record into instruments bound here once; nothing is looked up or allocated per frame.
+frames_analysed = metrics.counter("drishti_frames_analysed_total", "Frames that went through the analysis stage.")
+frames_without_face = metrics.counter("drishti_frames_without_face_total", "Analysed frames in which FaceMesh found no face.")
+face_mesh_seconds = metrics.histogram("drishti_face_mesh_seconds", "FaceMesh inference time per frame, including flip and RGB conversion.", metrics.FRAME_BUCKETS_SEC)
+analysis_seconds = metrics.histogram("drishti_analysis_seconds", "Analysis-stage time per frame.", metrics.FRAME_BUCKETS_SEC)
+frame_latency_seconds = metrics.histogram("drishti_frame_latency_seconds", "Time from capture to the end of analysis per frame.", metrics.FRAME_BUCKETS_SEC)
+achieved_fps = metrics.gauge("drishti_achieved_fps", "Frames analysed per second over the last live-metrics interval.")
+db_seconds = metrics.histogram("drishti_db_operation_seconds", "Time spent in the monitoring database helpers.", labelnames=("operation",))
+alerts_raised = metrics.counter("drishti_alerts_total", "Alerts raised by the detector, by type (before notification settings apply).", labelnames=("type",))
+http_seconds = metrics.histogram("drishti_http_request_seconds", "Flask handler time by endpoint.", labelnames=("endpoint",))
+http_requests = metrics.counter("drishti_http_requests_total", "Flask requests by endpoint and status code.", labelnames=("endpoint", "status"))
+session_reports_served = metrics.counter("drishti_session_reports_total", "Session reports served, by where they came from (see session_reports.py).", labelnames=("source",))
+metrics.function("gauge", "drishti_monitoring_active", "1 while a monitoring session is running.", lambda: int(monitoring_active))
+metrics.function("gauge", "drishti_pipeline_dropped_frames", "Frames the current session's pipeline dropped, by stage.",
+                 lambda: None if frame_pipeline is None else {"before_inference": frame_pipeline.dropped_before_inference, "before_analysis": frame_pipeline.dropped_before_analysis},
+                 labelnames=("stage",))
+metrics.function("gauge", "drishti_session_events", "Events the current session's writer has written, or dropped because its queue was full.",
+                 lambda: None if event_writer is None else {"written": event_writer.written_count, "dropped": event_writer.dropped_count},
+                 labelnames=("outcome",))
+metrics.function("counter", "drishti_alert_deliveries_total", "Alert dispatcher outcomes by channel.",
+                 lambda: {(channel, outcome): n for channel, counts in alerts.stats().items() for outcome, n in counts.items() if outcome != "pending"},
+                 labelnames=("channel", "outcome"))
 
 # --- Profile and Database Functions ---
 def save_calibration_profile(ear_threshold, avg_open_ear, avg_face_height, avg_gaze_ratio, avg_nose_y):
+    # A full calibration is a new profile version and the new baseline adaptive updates are bounded by.
     profile_data = {"ear_threshold": ear_threshold, "avg_open_ear": avg_open_ear, "avg_face_height": avg_face_height, "avg_center_gaze": avg_gaze_ratio, "avg_nose_y": avg_nose_y}
-    with open(CONFIG_FILE, 'w') as f: json.dump(profile_data, f, indent=4)
-    print(f"[INFO] Calibration profile saved to {CONFIG_FILE}")
+    saved = write_profile(CONFIG_FILE, profile_data, SOURCE_CALIBRATION)
+    print(f"[INFO] Calibration profile v{saved['version']} saved to {CONFIG_FILE}")
 def load_calibration_profile():
     if os.path.exists(CONFIG_FILE):
         try:
@@ -125,8 +137,8 @@ def load_calibration_profile():
     return None, None, None, None,None
 def setup_database():
     conn = sqlite3.connect(DB_FILE, check_same_thread=False); cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS sessions (session_id INTEGER PRIMARY KEY AUTOINCREMENT, start_time TEXT NOT NULL, end_time TEXT, total_active_time_sec INTEGER DEFAULT 0, total_idle_time_sec INTEGER DEFAULT 0)''')
-    cursor.execute('''CREATE TABLE IF NOT EXISTS events (event_id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL, timestamp TEXT NOT NULL, event_type TEXT NOT NULL, value_numeric REAL, value_text TEXT, FOREIGN KEY (session_id) REFERENCES sessions (session_id))''')
+    # Sessions and events are owned by db_schema, which also upgrades databases from older releases.
+    db_schema.ensure_schema(conn, progress=lambda copied, total: print(f"[INFO] Upgrading database: {copied:,} / {total:,} events"))
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS settings (
             id INTEGER PRIMARY KEY,
@@ -137,21 +149,37 @@ def setup_database():
         )
     ''')
     cursor.execute("INSERT OR IGNORE INTO settings (id) VALUES (1)")
+    if rollups.create_tables(conn):
+        print("[INFO] Building dashboard rollups from existing history...")
+        rollups.rebuild(conn)
     conn.commit(); conn.close(); print(f"[INFO] Database '{DB_FILE}' is ready.")
+@metrics.timed(db_seconds.labels("start_session"))
 def start_new_session():
     conn = sqlite3.connect(DB_FILE, check_same_thread=False); cursor = conn.cursor()
-    start_time_iso = datetime.now().isoformat(); cursor.execute("INSERT INTO sessions (start_time) VALUES (?)", (start_time_iso,)); session_id = cursor.lastrowid; conn.commit(); conn.close(); print(f"[INFO] Started new session with ID: {session_id}")
+    now = session_clock(); start_time_iso = datetime.fromtimestamp(now).isoformat(); cursor.execute("INSERT INTO sessions (start_time, start_ms) VALUES (?, ?)", (start_time_iso, db_schema.to_ms(now))); session_id = cursor.lastrowid; rollups.record_session_start(conn, start_time_iso); conn.commit(); conn.close(); print(f"[INFO] Started new session with ID: {session_id}")
     return session_id, start_time_iso
+@metrics.timed(db_seconds.labels("log_event"))
 def log_event(session_id, event_type, value_numeric=None, value_text=None):
+    # Hand the row to the background writer while a session is running (a full queue drops it, counted in dropped_count); write directly otherwise.
+    row = (session_id, db_schema.to_ms(session_clock()), db_schema.event_type_id(event_type), value_numeric, value_text)
+    writer = event_writer
+    if writer is not None and writer.running:
+        writer.submit(row); return
     conn = sqlite3.connect(DB_FILE, check_same_thread=False); cursor = conn.cursor()
-    timestamp_iso = datetime.now().isoformat(); cursor.execute("INSERT INTO events (session_id, timestamp, event_type, value_numeric, value_text) VALUES (?, ?, ?, ?, ?)", (session_id, timestamp_iso, event_type, value_numeric, value_text)); conn.commit(); conn.close()
+    cursor.execute(EventWriter.INSERT_SQL, row); rollups.apply_events(conn, (row,)); conn.commit(); conn.close()
+@metrics.timed(db_seconds.labels("end_session"))
 def end_session(session_id, active_time, idle_time, end_time_iso):
     conn = sqlite3.connect(DB_FILE, check_same_thread=False); cursor = conn.cursor()
-    cursor.execute("UPDATE sessions SET end_time = ?, total_active_time_sec = ?, total_idle_time_sec = ? WHERE session_id = ?", (end_time_iso, int(active_time), int(idle_time), session_id)); conn.commit(); conn.close(); print(f"[INFO] Session {session_id} ended. Active: {int(active_time)}s, Idle: {int(idle_time)}s")
+    cursor.execute("UPDATE sessions SET end_time = ?, end_ms = ?, total_active_time_sec = ?, total_idle_time_sec = ? WHERE session_id = ?", (end_time_iso, db_schema.iso_to_ms(end_time_iso), int(active_time), int(idle_time), session_id))
+    start_row = cursor.execute("SELECT start_time FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    if start_row: rollups.record_session_end(conn, start_row[0], end_time_iso, int(active_time), int(idle_time))
+    db_schema.record_session_metrics(conn, session_id)
+    conn.commit(); conn.close(); print(f"[INFO] Session {session_id} ended. Active: {int(active_time)}s, Idle: {int(idle_time)}s")
+    if chat_context is not None: chat_context.invalidate() # The finished session changes the history-wide stats
 def calculate_current_streak(conn):
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT date(start_time) FROM sessions ORDER BY date(start_time) DESC")
+        cursor.execute("SELECT day FROM daily_rollups WHERE sessions > 0 ORDER BY day DESC")
         session_days_str = [row[0] for row in cursor.fetchall()]
         if not session_days_str: return 0
         session_dates = [datetime.strptime(day_str, '%Y-%m-%d').date() for day_str in session_days_str]
@@ -168,28 +196,80 @@ def calculate_current_streak(conn):
 
 # --- Alert Functions ---
 def should_send_notification(notification_type):
+    # Reads the in-memory settings snapshot only; no database access on the alert path.
     try:
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-        cursor.execute("SELECT * FROM settings WHERE id = 1"); settings = cursor.fetchone(); conn.close()
-        if not settings or not settings['master_notifications']: return False
-        if notification_type == 'drowsiness' and not settings['notify_blink']: return False
-        if notification_type in ['stare', 'low_bpm'] and not settings['notify_blink']: return False
-        if notification_type == 'break' and not settings['notify_break']: return False
+        settings = settings_cache.get(DB_FILE)
+        if not settings.values or not settings.get('master_notifications'): return False
+        if notification_type == 'drowsiness' and not settings.get('notify_blink'): return False
+        if notification_type in ['stare', 'low_bpm'] and not settings.get('notify_blink'): return False
+        if notification_type == 'break' and not settings.get('notify_break'): return False
+        if settings.active_start is None or settings.active_end is None: return True
         now = datetime.now().time()
-        start_time = datetime.strptime(settings['active_start_time'], '%H:%M').time()
-        end_time = datetime.strptime(settings['active_end_time'], '%H:%M').time()
-        if not (start_time <= now <= end_time): return False
+        if not (settings.active_start <= now <= settings.active_end): return False
         return True
     except Exception as e:
         print(f"[ERROR] Could not check notification settings: {e}")
         return True
-def send_notification_threaded(title, message):
-    if PLYER_AVAILABLE: threading.Thread(target=notification.notify, kwargs={'title':title,'message':message,'app_name':'Eye Monitor','timeout':10}, daemon=True).start()
-def speak_threaded(text):
-    if PYTTSX_AVAILABLE and not engine.isBusy(): threading.Thread(target=lambda:(engine.say(text), engine.runAndWait()), daemon=True).start()
+def show_notification(title, message):
+    notification.notify(title=title, message=message, app_name='Eye Monitor', timeout=10)
+def speak(text):
+    # Only ever called on the voice channel's worker, so the shared engine is driven by one thread.
+    engine = lazy_runtime.get_tts_engine()
+    if engine is not None: engine.say(text); engine.runAndWait()
+alerts = AlertDispatcher(notify=show_notification if PLYER_AVAILABLE else None, speak=speak if PYTTSX_AVAILABLE else None) # One worker per channel; call sites only enqueue
+def handle_detector_events(session_id, detector, events):
+    # Logs what the FatigueDetector reported for one frame and raises the matching alerts.
+    for event_type, value in events:
+        if event_type == EVENT_LONG_BLINK_IGNORED:
+            print(f"[INFO] Long blink ignored (no head nod). Duration: {int(value)}ms"); continue
+        log_event(session_id, event_type, value_numeric=value)
+        if event_type == EVENT_YAWN:
+            print(f"[SCORE] Yawn! Score is now: {detector.drowsiness_score}")
+        elif event_type == EVENT_MICRO_SLEEP:
+            print(f"[SCORE] Head Nod + Long Blink! Score is now: {detector.drowsiness_score}")
+        elif event_type == EVENT_STARE:
+            alerts_raised.labels("stare").inc()
+            if should_send_notification('stare'):
+                alerts.alert('stare', "Eye Strain Warning!", f"No blink for {int(value)}+ seconds!", "Please blink your eyes.")
+        elif event_type == EVENT_LOW_BPM:
+            alerts_raised.labels("low_bpm").inc()
+            if should_send_notification('low_bpm'):
+                alerts.alert('low_bpm', "Low Blink Rate", f"Low blink rate ({int(value)} BPM).", "Your blink rate is low.")
+        elif event_type == EVENT_FATIGUE:
+            alerts_raised.labels("fatigue").inc()
+            if should_send_notification('drowsiness'):
+                alerts.alert('fatigue', "Fatigue Alert!", f"High fatigue score: {value}. Consider taking a break.",
+                             "High level of fatigue detected. Please consider taking a break.", priority=PRIORITY_HIGH)
+        elif event_type == EVENT_BREAK:
+            alerts_raised.labels("break").inc()
+            if should_send_notification('break'):
+                alerts.alert('break', "Take a Break!", f"Time for a {BREAK_DURATION_SEC}-second break!", "It's time for a short eye break.")
+        elif event_type == EVENT_IDLE_START:
+            print("[INFO] User is idle. Pausing monitoring."); alerts.alert('presence', speech="Monitoring paused.", priority=PRIORITY_LOW)
+        elif event_type == EVENT_ACTIVE_RESUME:
+            print(f"[INFO] User returned after {int(value)}s. Resuming monitoring."); alerts.alert('presence', speech="Welcome back.", priority=PRIORITY_LOW)
+def publish_live_metrics(session_id, detector, now):
+    # Offers the detector's current numbers as one LiveMetrics snapshot; unchanged numbers keep the old snapshot and seq.
+    active_time = detector.active_time_sec + (now - detector.last_status_change_time if detector.is_active else 0)
+    # PERCLOS and the windowed EAR mean are rounded, so sub-display jitter doesn't count as a change.
+    return live_metrics.publish(session_id, detector.blink_count, int(active_time), int(detector.blink_rate_bpm),
+                                detector.yawn_count, detector.is_gaze_centered, detector.drowsiness_score,
+                                round(detector.perclos * 100, 1), round(detector.signals.mean(), 3))
 
 # --- Calibration Process Function ---
-def run_calibration_process(user_name=None):
+def run_calibration_process(user_name=None, cap=None, show_window=True, job=None, camera_index=0):
+    """
+    Measures the user's open-eye and blinking EAR, face height, gaze and nose
+    position, and saves them as the calibration profile. Returns True if a
+    profile was saved.
+
+    Args:
+        cap: An opened capture to read from. Defaults to the webcam; a webcam
+            opened here is kept warm afterwards for the monitoring session.
+        job (CalibrationJob): Optional; receives progress and the outcome, and
+            stops the run when cancelled.
+    """
+    import cv2
     print("[INFO] Starting calibration process...")
     if user_name:
         print(f"[INFO] Calibrating for user: {user_name}")
@@ -199,19 +279,27 @@ def run_calibration_process(user_name=None):
             cursor.execute("UPDATE settings SET user_name = ? WHERE id = 1", (user_name,))
             conn.commit()
             conn.close()
+            settings_cache.refresh(DB_FILE)
         except Exception as e:
             print(f"[ERROR] Could not save user name during calibration: {e}")
 
-    cap = cv2.VideoCapture(0)
+    owns_camera = cap is None
+    if owns_camera: cap = lazy_runtime.take_camera(camera_index) or cv2.VideoCapture(camera_index)
     if not cap.isOpened():
         print("[ERROR] Cannot open camera for calibration.")
-        return
+        if job is not None: job.finish(calibration.STATUS_FAILED, message="Cannot open camera.")
+        return False
+    face_mesh = lazy_runtime.get_face_mesh()
 
-    open_ears, closed_ears, face_heights, gaze_ratios ,nose_y_coords= [], [], [], [],[]
+    samples = calibration.CalibrationSamples()
+    feature_extractor = LandmarkFeatureExtractor()
     frame_count = 0
-    calibration_stage = "OPEN_EYES"
+    calibration_stage = calibration.STAGE_OPEN_EYES
+    cancelled = False
 
-    while cap.isOpened() and calibration_stage != "DONE":
+    while cap.isOpened() and calibration_stage != calibration.STAGE_DONE:
+        if job is not None and job.cancelled:
+            cancelled = True; break
         ret, frame = cap.read()
         if not ret: break
         
@@ -221,261 +309,235 @@ def run_calibration_process(user_name=None):
 
         if results.multi_face_landmarks:
             for face_landmarks in results.multi_face_landmarks:
-                landmarks = face_landmarks.landmark
-                avg_ear = (calculate_ear(landmarks, LEFT_EYE_INDICES) + calculate_ear(landmarks, RIGHT_EYE_INDICES)) / 2.0
+                features = feature_extractor.extract(face_landmarks)
+                avg_ear = float(features[F_EAR])
                 
-                if calibration_stage == "OPEN_EYES":
+                if calibration_stage == calibration.STAGE_OPEN_EYES:
                     if frame_count < CALIBRATION_FRAMES_OPEN:
-                        open_ears.append(avg_ear)
-                        face_heights.append(abs(landmarks[CHIN_LANDMARK].y - landmarks[FOREHEAD_LANDMARK].y))
-                        total_eye_dist = landmarks[RIGHT_EYE_CORNER].x - landmarks[LEFT_EYE_CORNER].x
-                        nose_y_coords.append(landmarks[NOSE_TIP_LANDMARK].y)
-                        gaze_ratios.append((landmarks[NOSE_TIP_LANDMARK].x - landmarks[LEFT_EYE_CORNER].x) / (total_eye_dist + 1e-6))
+                        samples.add_open(avg_ear, float(features[F_FACE_HEIGHT]), float(features[F_NOSE_Y]), float(features[F_GAZE_RATIO]))
                         frame_count += 1
                         cv2.putText(frame, f"Keep eyes open: {frame_count}/{CALIBRATION_FRAMES_OPEN}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                     else:
-                        calibration_stage = "BLINK"; frame_count = 0
+                        calibration_stage = calibration.STAGE_BLINK; frame_count = 0
                 
-                elif calibration_stage == "BLINK":
+                elif calibration_stage == calibration.STAGE_BLINK:
                     if frame_count < CALIBRATION_FRAMES_BLINK:
-                        closed_ears.append(avg_ear)
+                        samples.add_blink(avg_ear)
                         frame_count += 1
                         cv2.putText(frame, f"Now blink normally: {frame_count}/{CALIBRATION_FRAMES_BLINK}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
                     else:
-                        calibration_stage = "DONE"
-
-        cv2.imshow('Calibration', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'): break
-
-    cap.release()
-    cv2.destroyAllWindows()
-
-    if open_ears and closed_ears:
-        avg_open_ear = np.mean(open_ears)
-        avg_closed_ear = np.mean(closed_ears)
-        ear_threshold = (avg_open_ear + avg_closed_ear) / 2.0
-        avg_face_height = np.mean(face_heights)
-        avg_gaze_ratio = np.mean(gaze_ratios)
-        avg_nose_y = np.mean(nose_y_coords)
-        
-        save_calibration_profile(ear_threshold, avg_open_ear, avg_face_height, avg_gaze_ratio,avg_nose_y)
+                        calibration_stage = calibration.STAGE_DONE
+                if job is not None:
+                    job.report(calibration_stage, samples.open_ear.count + samples.blink_ear.count)
+
+        if show_window:
+            cv2.imshow('Calibration', frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                cancelled = True; break
+
+    if show_window: cv2.destroyAllWindows()
+    succeeded = not cancelled and samples.complete
+    # A successful run leaves the webcam open for a monitoring session started right after it.
+    if owns_camera and succeeded: lazy_runtime.park_camera(camera_index, cap)
+    else: cap.release()
+
+    if cancelled:
+        print("[INFO] Calibration cancelled.")
+        if job is not None: job.finish(calibration.STATUS_CANCELLED, stats=samples.summary())
+        return False
+    if succeeded:
+        save_calibration_profile(*samples.profile())
         print("[INFO] Calibration successful.")
-    else:
-        print("[ERROR] Calibration failed. Not enough data collected.")
+        if job is not None: job.finish(calibration.STATUS_COMPLETE, stats=samples.summary())
+        return True
+    print("[ERROR] Calibration failed. Not enough data collected.")
+    if job is not None: job.finish(calibration.STATUS_FAILED, message="Not enough data collected.", stats=samples.summary())
+    return False
+
+# --- Camera Pipeline ---
+def build_camera_pipeline(camera_index=0):
+    """The webcam pipeline used for live monitoring; reuses the camera calibration left open, if any."""
+    from input_scaler import InputScaler
+    from frame_pipeline import FramePipeline
+    from frame_scheduler import FrameRateScheduler
+    import cv2
+    cap = lazy_runtime.take_camera(camera_index) or cv2.VideoCapture(camera_index)
+    return FramePipeline(cap, lazy_runtime.get_face_mesh(), input_scaler=InputScaler(), scheduler=FrameRateScheduler())
+
+# --- Overlay Rendering ---
+def draw_monitoring_overlay(frame, is_gaze_centered, blink_count, avg_ear, blink_rate_bpm, yawn_count, drowsiness_score, is_head_tilted_vertically, y_delta, avg_face_height):
+    import cv2
+    w = frame.shape[1]
+    instruction_text = "Monitoring Active (Press 'q' in this window to stop)"
+    cv2.putText(frame, instruction_text, (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    gaze_text = "Gaze: Centered" if is_gaze_centered else "Gaze: Away"; gaze_color = (0, 255, 0) if is_gaze_centered else (0, 0, 255)
+    cv2.putText(frame, gaze_text, (w - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, gaze_color, 2)
+    cv2.putText(frame, f"Blinks: {blink_count}", (30, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    cv2.putText(frame, f"EAR: {avg_ear:.2f}", (30, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(frame, f"BPM: {int(blink_rate_bpm)}", (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    cv2.putText(frame, f"Yawns: {yawn_count}", (w - 200, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (128, 0, 128), 2)
+    cv2.putText(frame, f"Fatigue Score: {drowsiness_score}", (w - 250, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
+
+    tilt_text = "Head Tilted: YES" if is_head_tilted_vertically else "Head Tilted: NO"
+    tilt_color = (0, 0, 255) if is_head_tilted_vertically else (0, 255, 0)
+    cv2.putText(frame, tilt_text, (w - 250, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, tilt_color, 2)
+
+    up_threshold = -(avg_face_height * HEAD_TILT_UP_THRESHOLD_PERCENT)
+    debug_text = f"Y Delta: {y_delta:.3f} / Up Threshold: {up_threshold:.3f}"
+    cv2.putText(frame, debug_text, (30, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+
+def record_frame(pipeline, packet, analysis_started):
+    # The pipeline's own stage totals plus the exported per-frame metrics.
+    pipeline.record_analysis(packet, analysis_started)
+    analysis_seconds.observe_since(analysis_started)
+    face_mesh_seconds.observe(packet.inference_sec)
+    frame_latency_seconds.observe(max(0.0, session_clock() - packet.capture_time))
+    frames_analysed.inc()
+    if packet.results is None or not packet.results.multi_face_landmarks: frames_without_face.inc()
 
 # --- Main Monitoring Loop ---
 # --- Main Monitoring Loop ---
-def run_monitoring_loop():
+def run_monitoring_loop(pipeline=None, clock=time.time, adapt_calibration=True):
+    """
+    Runs one monitoring session until `monitoring_active` is cleared or the
+    source runs out of frames.
+
+    Args:
+        pipeline: An unstarted frame source with the FramePipeline interface.
+            Defaults to the webcam through FaceMesh with adaptive input scaling.
+        clock (callable): Time source for session bookkeeping and event
+            timestamps. Replays pass an injected clock that follows the recording.
+        adapt_calibration (bool): Keep the calibration profile current from
+            confident open-eye frames (see adaptive_calibration).
+    """
+    import cv2
     print("\n\n--- THIS IS THE LATEST VERSION OF THE CODE. IF YOU SEE THIS, THE FILE IS CORRECT. ---\n\n")
-    global monitoring_active, yawn_count, blink_count, active_time_sec, idle_time_sec, blink_rate_bpm, is_gaze_centered, user_status, last_status_change_time, current_session_id, session_start_time_iso,drowsiness_score
+    global monitoring_active, current_session_id, session_start_time_iso, event_writer, frame_pipeline, session_clock, adaptive_calibration
     
-    yawn_count = 0; blink_count = 0; active_time_sec = 0; idle_time_sec = 0
-    blink_rate_bpm = 0; is_gaze_centered = False; user_status = "Active"
-    last_status_change_time = time.time()
+    session_clock = clock
     
     current_session_id, session_start_time_iso = start_new_session()
+    event_writer = EventWriter(DB_FILE).start()
     log_event(current_session_id, "SESSION_START")
 
-    cap = cv2.VideoCapture(0)
-    
     EAR_THRESHOLD, avg_open_ear, avg_face_height, avg_center_gaze,avg_nose_y = load_calibration_profile()
     if not (EAR_THRESHOLD and avg_open_ear and avg_face_height > 0 and avg_center_gaze > 0 and avg_nose_y > 0):
         print("[WARNING] Calibration profile not found or incomplete. Using default values.")
         EAR_THRESHOLD = 0.20
     
-    user_settings = wellness_assistant.get_user_settings(DB_FILE)
-    work_duration_min = 20 # Default value
-    if user_settings:
-        freq = user_settings.get('notify_frequency')
-        if freq is not None:
-            work_duration_min = int(freq)
+    work_duration_min = settings_cache.get(DB_FILE).break_interval_min
     print(f"[INFO] Break reminder frequency set to {work_duration_min} minutes.")
 
-    last_blink_time = time.time(); on_break = False; last_break_time = time.time()
-    eye_state = "OPEN"; time_eye_closed_start = 0; last_drowsiness_alert_time = 0; yawn_start_time = 0
-    blink_timestamps = deque(maxlen=int(BLINK_RATE_WINDOW_SEC*1.5))
-    last_no_blink_alert_time = 0; last_low_blink_rate_alert_time = 0
-    ear_history = deque(maxlen=5)
-    time_no_face_start = 0; last_summary_log_time = 0
-    gaze_centered_frame_counter = 0 
-    last_score_decay_time = time.time()
-    y_delta = 0 # Initialize y_delta
+    detector = FatigueDetector(EAR_THRESHOLD, avg_center_gaze, avg_face_height, work_duration_min * 60, t0=clock())
+    # The fatigue score carries over from the previous session.
+    detector.drowsiness_score = live_metrics.latest.fatigue_score
+    publish_live_metrics(current_session_id, detector, clock()); last_publish_time = clock(); fps_mark = frames_analysed.value
+    feature_extractor = LandmarkFeatureExtractor()
+    feature_extractor.nose_baseline = avg_nose_y or 0.0
+    # Only a complete profile is adapted; defaults stay fixed until the user calibrates.
+    adaptive_calibration = AdaptiveCalibration.from_profile_file(CONFIG_FILE) if adapt_calibration else None
     
+    # Capture and inference run on their own threads; this thread is the analysis stage.
+    if pipeline is None:
+        pipeline = build_camera_pipeline()
+    frame_pipeline = pipeline.start(); input_scaler = frame_pipeline.input_scaler; scheduler = frame_pipeline.scheduler
     try:
-        while cap.isOpened() and monitoring_active:
-            ret, frame = cap.read()
-            if not ret: break
-            frame = cv2.flip(frame, 1); h, w, _ = frame.shape; rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB); results = face_mesh.process(rgb_frame); current_time = time.time()
-            avg_ear = 0.0
-            is_head_tilted_vertically = False # Reset on each frame
-            
-            if on_break:
-                time_left = BREAK_DURATION_SEC - (current_time - break_start_time)
-                if time_left > 0:
-                    cv2.putText(frame, "BREAK TIME!", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 255), 3); cv2.putText(frame, f"Resuming in: {int(time_left)}s", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-                    # cv2.imshow('Eye Monitoring', frame)
-                    if cv2.waitKey(1) & 0xFF == ord('q'): monitoring_active = False
-                    continue
-                else: on_break = False; last_break_time = current_time
-
+        while monitoring_active:
+            packet = frame_pipeline.get()
+            if packet is None:
+                if frame_pipeline.finished: break
+                continue
+            analysis_started = time.perf_counter()
+            # Timing decisions (blinks, yawns, breaks) use when the frame was captured, not when it was analysed.
+            frame = packet.frame; results = packet.results; current_time = packet.capture_time
+
+            time_left = detector.break_time_left(current_time)
+            if time_left > 0:
+                cv2.putText(frame, "BREAK TIME!", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 255, 255), 3); cv2.putText(frame, f"Resuming in: {int(time_left)}s", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+                # cv2.imshow('Eye Monitoring', frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'): monitoring_active = False
+                if scheduler is not None: scheduler.update(detector, False, current_time)
+                record_frame(frame_pipeline, packet, analysis_started)
+                continue
+
+            # Break frequency is re-read from the settings cache every frame, so changes saved mid-session apply immediately.
+            detector.break_interval_sec = settings_cache.get(DB_FILE).break_interval_min * 60
             if results.multi_face_landmarks:
-                if user_status == "Idle":
-                    idle_duration = current_time - last_status_change_time; idle_time_sec += idle_duration; log_event(current_session_id, "USER_ACTIVE_RESUME", value_numeric=idle_duration); print(f"[INFO] User returned after {int(idle_duration)}s. Resuming monitoring."); speak_threaded("Welcome back.")
-                    last_blink_time = current_time; last_break_time = current_time; last_status_change_time = current_time
-                user_status = "Active"; time_no_face_start = 0
-                
                 for face_landmarks in results.multi_face_landmarks:
-                    landmarks = face_landmarks.landmark
-                    avg_ear = (calculate_ear(landmarks, LEFT_EYE_INDICES) + calculate_ear(landmarks, RIGHT_EYE_INDICES)) / 2.0; ear_history.append(avg_ear)
-                    left_eye_x = landmarks[LEFT_EYE_CORNER].x; right_eye_x = landmarks[RIGHT_EYE_CORNER].x; nose_x = landmarks[NOSE_TIP_LANDMARK].x; total_eye_dist = right_eye_x - left_eye_x; gaze_ratio = (nose_x - left_eye_x) / (total_eye_dist + 1e-6)
-                    is_looking_away_horizontally = True
-                    if avg_center_gaze > 0:
-                        GAZE_CALIBRATED_TOLERANCE = 0.26; gaze_min_threshold = avg_center_gaze - GAZE_CALIBRATED_TOLERANCE; gaze_max_threshold = avg_center_gaze + GAZE_CALIBRATED_TOLERANCE
-                        is_looking_away_horizontally = not (gaze_min_threshold < gaze_ratio < gaze_max_threshold)
-                    
-                    current_nose_y = landmarks[NOSE_TIP_LANDMARK].y
-                    y_delta = current_nose_y - avg_nose_y
-
-                    is_head_tilted_down = y_delta > (avg_face_height * HEAD_TILT_DOWN_THRESHOLD_PERCENT)
-                    is_head_tilted_up = y_delta < -(avg_face_height * HEAD_TILT_UP_THRESHOLD_PERCENT)
-
-                    is_head_tilted_vertically = is_head_tilted_down
-                    is_gaze_centered = not (is_looking_away_horizontally or is_head_tilted_down or is_head_tilted_up)
-                    
-                    if (current_time - last_break_time) > (work_duration_min * 60):
-                        if should_send_notification('break'):
-                            alert_msg = f"Time for a {BREAK_DURATION_SEC}-second break!"; send_notification_threaded("Take a Break!", alert_msg); speak_threaded("It's time for a short eye break.")
-                        on_break = True; break_start_time = current_time; log_event(current_session_id, "20_20_20_BREAK_TAKEN"); continue
-                    
-                    mar = calculate_mar(landmarks)
-                    if mar > YAWN_MAR_THRESHOLD:
-                        if yawn_start_time == 0:
-                            yawn_start_time = current_time
-                        elif yawn_start_time > 0 and (current_time - yawn_start_time) > YAWN_DURATION_SEC:
-                            yawn_count += 1
-                            drowsiness_score += SCORE_INCREMENT_YAWN
-                            log_event(current_session_id, "YAWN_DETECTED")
-                            print(f"[SCORE] Yawn! Score is now: {drowsiness_score}")
-                            yawn_start_time = -1
-                    else:
-                        yawn_start_time = 0
-
-                    if is_gaze_centered:
-                        gaze_centered_frame_counter += 1
-                    else:
-                        gaze_centered_frame_counter = 0
-                        eye_state = "OPEN"
-                        time_eye_closed_start = 0
-                        last_blink_time = current_time
-
-                    if gaze_centered_frame_counter > GAZE_STABILITY_THRESHOLD_FRAMES:
-                        ear_velocity = ear_history[-1] - ear_history[-2]
-                        if eye_state == "OPEN" and ear_velocity < EAR_VELOCITY_THRESHOLD: eye_state = "CLOSING"
-                        elif eye_state == "CLOSING" and avg_ear < EAR_THRESHOLD: blink_count += 1; last_blink_time = current_time; blink_timestamps.append(current_time); log_event(current_session_id, "BLINK"); eye_state = "CLOSED"; time_eye_closed_start = current_time
-                        elif eye_state == "CLOSED" and avg_ear > (EAR_THRESHOLD * 1.1):
-                            eye_state = "OPEN"
-                            blink_duration_ms = (current_time - time_eye_closed_start) * 1000
-                            if blink_duration_ms > MICRO_SLEEP_THRESHOLD_MS:
-                                if is_head_tilted_vertically:
-                                    drowsiness_score += SCORE_INCREMENT_LONG_BLINK
-                                    log_event(current_session_id, "MICRO_SLEEP_DETECTED", value_numeric=blink_duration_ms)
-                                    print(f"[SCORE] Head Nod + Long Blink! Score is now: {drowsiness_score}")
-                                else:
-                                    print(f"[INFO] Long blink ignored (no head nod). Duration: {int(blink_duration_ms)}ms")
-                            time_eye_closed_start = 0
-                        
-                        time_since_last_blink = current_time - last_blink_time
-                        if time_since_last_blink > NO_BLINK_THRESHOLD_SEC and (current_time - last_no_blink_alert_time) > NOTIFICATION_DEBOUNCE_SEC:
-                            log_event(current_session_id, "STARE_ALERT_TRIGGERED", value_numeric=time_since_last_blink)
-                            if should_send_notification('stare'):
-                                send_notification_threaded("Eye Strain Warning!", f"No blink for {int(time_since_last_blink)}+ seconds!"); speak_threaded("Please blink your eyes.")
-                            last_no_blink_alert_time = current_time
-                        
-                        while blink_timestamps and blink_timestamps[0] < current_time - BLINK_RATE_WINDOW_SEC: blink_timestamps.popleft()
-                        blink_rate_bpm = (len(blink_timestamps) / BLINK_RATE_WINDOW_SEC) * 60 if BLINK_RATE_WINDOW_SEC > 0 else 0
-                        
-                        if (current_time - last_break_time) > BLINK_RATE_WINDOW_SEC and blink_rate_bpm < LOW_BLINK_RATE_THRESHOLD and len(blink_timestamps) > 1 and (current_time - last_low_blink_rate_alert_time) > NOTIFICATION_DEBOUNCE_SEC:
-                            log_event(current_session_id, "LOW_BPM_ALERT_TRIGGERED", value_numeric=blink_rate_bpm)
-                            if should_send_notification('low_bpm'):
-                                send_notification_threaded("Low Blink Rate", f"Low blink rate ({int(blink_rate_bpm)} BPM)."); speak_threaded("Your blink rate is low.")
-                            last_low_blink_rate_alert_time = current_time
-
-                    # SCORE DECAY & MASTER ALERT (applies regardless of gaze stability)
-                    if (current_time - last_score_decay_time) > SCORE_DECAY_INTERVAL_SEC:
-                        if drowsiness_score > 0:
-                            drowsiness_score = max(0, drowsiness_score - SCORE_DECAY_RATE)
-                        last_score_decay_time = current_time
-
-                    if drowsiness_score >= DROWSINESS_SCORE_THRESHOLD:
-                        if (current_time - last_drowsiness_alert_time) > DROWSINESS_ALERT_DEBOUNCE_SEC:
-                            alert_msg = f"High fatigue score: {drowsiness_score}. Consider taking a break."
-                            if should_send_notification('drowsiness'):
-                                send_notification_threaded("Fatigue Alert!", alert_msg)
-                                speak_threaded("High level of fatigue detected. Please consider taking a break.")
-                            log_event(current_session_id, "FATIGUE_SCORE_ALERT", value_numeric=drowsiness_score)
-                            last_drowsiness_alert_time = current_time
-
-                    if (current_time - last_summary_log_time) > SUMMARY_LOG_INTERVAL_SEC: 
-                        log_event(current_session_id, "SUMMARY_EAR", value_numeric=avg_ear)
-                        log_event(current_session_id, "SUMMARY_BPM", value_numeric=blink_rate_bpm)
-                        last_summary_log_time = current_time
-            else: 
-                if time_no_face_start == 0: time_no_face_start = current_time
-                elif (current_time - time_no_face_start) > IDLE_TIME_THRESHOLD_SEC:
-                    if user_status == "Active":
-                        active_duration = current_time - last_status_change_time; active_time_sec += active_duration; log_event(current_session_id, "USER_IDLE_START", value_numeric=active_duration); print("[INFO] User is idle. Pausing monitoring."); speak_threaded("Monitoring paused."); user_status = "Idle"; last_status_change_time = current_time
-            
-            instruction_text = "Monitoring Active (Press 'q' in this window to stop)"
-            cv2.putText(frame, instruction_text, (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-            gaze_text = "Gaze: Centered" if is_gaze_centered else "Gaze: Away"; gaze_color = (0, 255, 0) if is_gaze_centered else (0, 0, 255)
-            cv2.putText(frame, gaze_text, (w - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, gaze_color, 2)
-            cv2.putText(frame, f"Blinks: {blink_count}", (30, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            cv2.putText(frame, f"EAR: {avg_ear:.2f}", (30, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(frame, f"BPM: {int(blink_rate_bpm)}", (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-            cv2.putText(frame, f"Yawns: {yawn_count}", (w - 200, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (128, 0, 128), 2)
-            cv2.putText(frame, f"Fatigue Score: {drowsiness_score}", (w - 250, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
-            
-            tilt_text = "Head Tilted: YES" if is_head_tilted_vertically else "Head Tilted: NO"
-            tilt_color = (0, 0, 255) if is_head_tilted_vertically else (0, 255, 0)
-            cv2.putText(frame, tilt_text, (w - 250, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, tilt_color, 2)
+                    features = feature_extractor.extract(face_landmarks)
+                    handle_detector_events(current_session_id, detector, detector.step(features, current_time))
+                    if adaptive_calibration is not None: adaptive_calibration.observe(detector, features, current_time)
+            else:
+                handle_detector_events(current_session_id, detector, detector.step(None, current_time))
+
+            # Steady open-eye EAR is what the input scaler uses to judge whether a coarser input scale is safe.
+            if detector.steady_open and input_scaler is not None: input_scaler.report_ear(detector.last_ear)
+            # Capture and inference slow down while idle, on a break or during steady open-eye stretches.
+            if scheduler is not None: scheduler.update(detector, bool(results.multi_face_landmarks), current_time)
+
+            if adaptive_calibration is not None:
+                adaptive_calibration.maybe_apply(detector, feature_extractor, current_time)
+                if adaptive_calibration.maybe_checkpoint(CONFIG_FILE, current_time): print(f"[INFO] Calibration drift checkpointed: {adaptive_calibration.drift()}")
+
+            if current_time - last_publish_time >= LIVE_METRICS_INTERVAL_SEC:
+                achieved_fps.set(round((frames_analysed.value - fps_mark) / (current_time - last_publish_time), 2)); fps_mark = frames_analysed.value
+                publish_live_metrics(current_session_id, detector, current_time); last_publish_time = current_time
             
-            up_threshold = -(avg_face_height * HEAD_TILT_UP_THRESHOLD_PERCENT)
-            debug_text = f"Y Delta: {y_delta:.3f} / Up Threshold: {up_threshold:.3f}"
-            cv2.putText(frame, debug_text, (30, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+            draw_monitoring_overlay(frame, detector.is_gaze_centered, detector.blink_count, detector.last_ear, detector.blink_rate_bpm, detector.yawn_count, detector.drowsiness_score, detector.is_head_tilted, detector.last_y_delta, avg_face_height)
 
             # cv2.imshow('Eye Monitoring', frame)
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q'):
                 monitoring_active = False
+            record_frame(frame_pipeline, packet, analysis_started)
 
     finally:
         print("\n[INFO] Monitoring loop stopped. Finalizing session data.")
-        if user_status == "Active":
-            active_time_sec += time.time() - last_status_change_time
-        else:
-            idle_time_sec += time.time() - last_status_change_time
+        frame_pipeline.release()
+        print(f"[INFO] Pipeline stats: {json.dumps(frame_pipeline.stats())}")
+        active_time_sec, idle_time_sec = detector.finalize(clock())
+        if adaptive_calibration is not None: adaptive_calibration.maybe_checkpoint(CONFIG_FILE, clock(), force=True)
         
-        end_time_iso = datetime.now().isoformat()
+        end_time_iso = datetime.fromtimestamp(clock()).isoformat()
         log_event(current_session_id, "SESSION_END")
+        # Every queued event must be on disk before the session is closed and summarised.
+        event_writer.close(); event_writer = None
         end_session(current_session_id, active_time_sec, idle_time_sec, end_time_iso)
+        # The finished session's numbers stay on the dashboard; no session id marks it as no longer running.
+        publish_live_metrics(None, detector, clock())
         
-        summary_report = wellness_assistant.generate_session_summary(
-            session_id=current_session_id,
-            start_time_str=session_start_time_iso,
-            end_time_str=end_time_iso,
-            db_path=DB_FILE
-        )
+        # Built once and stored; /api/session_report serves it from then on.
+        summary_report = session_reports.record(DB_FILE, current_session_id, settings_cache.get(DB_FILE).values)
         print(json.dumps(summary_report, indent=4))
 
-        cap.release()
+        session_clock = time.time
         cv2.destroyAllWindows()
-        if PYTTSX_AVAILABLE:
+        # Prompts raised by the finished session are no longer relevant.
+        alerts.clear()
+        print(f"[INFO] Alert stats: {json.dumps(alerts.stats())}")
+        engine = lazy_runtime.tts_engine_if_loaded()
+        if PYTTSX_AVAILABLE and engine is not None:
             engine.stop()
 # --- Flask Web Server ---
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Endpoint names, not paths, label the series, so ids in URLs can't grow the label set.
+    endpoint = request.endpoint or "unmatched"
+    started = g.get("request_started")
+    if started is not None: http_seconds.labels(endpoint).observe_since(started)
+    http_requests.labels(endpoint, response.status_code).inc()
+    return response
+
 @app.route('/')
 def dashboard():
+    # The vision stack loads in the background while the user reads the dashboard.
+    lazy_runtime.prewarm()
     return render_template('dashboard.html')
 
 @app.route('/api/check_calibration', methods=['GET'])
@@ -483,21 +545,52 @@ def check_calibration():
     is_calibrated = os.path.exists(CONFIG_FILE)
     return jsonify({'is_calibrated': is_calibrated})
 
+@app.route('/api/calibration_profile')
+def get_calibration_profile():
+    # The stored profile with its version history, plus the running session's live estimate and drift.
+    profile = read_profile(CONFIG_FILE)
+    if profile is None:
+        return jsonify({'error': 'No calibration profile'}), 404
+    profile['adaptive'] = adaptive_calibration.stats() if adaptive_calibration is not None and monitoring_active else None
+    return jsonify(profile)
+
 @app.route('/api/start_calibration', methods=['POST'])
 def start_calibration():
-    data = request.get_json()
+    # Calibration runs as a background job; the dashboard follows it through /api/calibration/<job_id>.
+    if monitoring_active:
+        return jsonify({'status': 'failed', 'message': 'Stop monitoring before calibrating.'}), 409
+    data = request.get_json(silent=True)
     user_name = data.get('user_name') if data else None
-    calibration_thread = threading.Thread(target=run_calibration_process, args=(user_name,), daemon=True)
-    calibration_thread.start()
-    calibration_thread.join() # This line waits for the calibration to finish
-    if os.path.exists(CONFIG_FILE):
-        return jsonify({'status': 'complete', 'message': 'Calibration successful.'})
-    else:
-        return jsonify({'status': 'failed', 'message': 'Calibration failed to save profile.'}), 500
+    job, started = calibration_jobs.start(lambda job: run_calibration_process(user_name, job=job), user_name=user_name)
+    if not started:
+        return jsonify(dict(job.as_dict(), message='Calibration is already running.')), 409
+    return jsonify(job.as_dict()), 202
+
+@app.route('/api/calibration/<job_id>')
+def get_calibration_job(job_id):
+    job = calibration_jobs.get(job_id)
+    if job is None: return jsonify({'error': 'Unknown calibration job'}), 404
+    return jsonify(job.as_dict())
+
+@app.route('/api/calibration/<job_id>/stream')
+def stream_calibration_job(job_id):
+    job = calibration_jobs.get(job_id)
+    if job is None: return jsonify({'error': 'Unknown calibration job'}), 404
+    return Response(stream_with_context(calibration.job_event_stream(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/calibration/<job_id>/cancel', methods=['POST'])
+def cancel_calibration_job(job_id):
+    job = calibration_jobs.get(job_id)
+    if job is None: return jsonify({'error': 'Unknown calibration job'}), 404
+    job.cancel()
+    return jsonify(job.as_dict())
 
 @app.route('/api/start_monitoring', methods=['POST'])
 def start_monitoring():
     global monitoring_active, monitoring_thread
+    if calibration_jobs.running:
+        return jsonify({'status': 'Calibration in progress'}), 409
     if not monitoring_active:
         monitoring_active = True
         monitoring_thread = threading.Thread(target=run_monitoring_loop, daemon=True)
@@ -522,39 +615,59 @@ def stop_monitoring():
 
 @app.route('/api/stats')
 def get_stats():
-    live_data = {
-        'blinks': blink_count, 
-        'active_time': int(active_time_sec + (time.time() - last_status_change_time if user_status == "Active" else 0)),
-        'bpm': int(blink_rate_bpm),
-        'yawns': yawn_count,
-        'gaze_status': "Centered" if is_gaze_centered else "Away",
-        'fatigue_score': drowsiness_score
-    }
-    return jsonify(live_data)
+    return jsonify(live_metrics.latest.as_dict())
+
+@app.route('/api/stream')
+def stream_stats():
+    # Server-Sent Events: a full snapshot first, then only changed fields, at most `max_hz` messages per second.
+    max_hz = request.args.get('max_hz', default=LIVE_STREAM_MAX_HZ, type=float)
+    max_hz = min(max(max_hz, 0.1), LIVE_STREAM_MAX_HZ)
+    return Response(stream_with_context(sse_stream(live_metrics, max_hz)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/pipeline_stats')
+def get_pipeline_stats():
+    if frame_pipeline is None:
+        return jsonify({})
+    return jsonify(frame_pipeline.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render_text(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/metrics')
+def get_metrics():
+    return jsonify(metrics.snapshot())
+
+@app.route('/api/retention_stats')
+def get_retention_stats():
+    if retention_engine is None:
+        return jsonify({})
+    stats = retention_engine.stats()
+    stats['db_bytes'] = os.path.getsize(DB_FILE) if os.path.exists(DB_FILE) else 0
+    return jsonify(stats)
 
 @app.route('/api/summary_stats')
 def get_summary_stats():
     conn = sqlite3.connect(DB_FILE, check_same_thread=False)
     cursor = conn.cursor()
-    cursor.execute("SELECT value_numeric FROM events WHERE event_type = 'SUMMARY_BPM' AND value_numeric > 0")
-    bpm_records = cursor.fetchall()
-    avg_bpm = np.mean([r[0] for r in bpm_records]) if bpm_records else 15
+    # Everything here comes from the hourly rollups, so the cost doesn't grow with the event history.
+    cursor.execute("SELECT TOTAL(bpm_sum), SUM(bpm_count) FROM hourly_rollups")
+    bpm_sum, bpm_count = cursor.fetchone()
+    avg_bpm = bpm_sum / bpm_count if bpm_count else 15
     health_score = min(100, int((avg_bpm / 20.0) * 100))
-    cursor.execute("SELECT strftime('%H', timestamp) as hour FROM events WHERE event_type IN ('YAWN_DETECTED', 'MICRO_SLEEP_DETECTED', 'FATIGUE_SCORE_ALERT')")
-    fatigue_hours = [int(r[0]) for r in cursor.fetchall()]
-    fatigue_hotspots = defaultdict(int)
-    for hour in fatigue_hours: fatigue_hotspots[hour] += 1
-    cursor.execute("SELECT strftime('%H', timestamp) as hour FROM events WHERE event_type = 'SUMMARY_EAR'")
-    activity_hours = [int(r[0]) for r in cursor.fetchall()]
-    activity_clock = defaultdict(int)
-    for hour in activity_hours: activity_clock[hour] += 1
+    cursor.execute("SELECT hour, SUM(yawns + micro_sleeps + fatigue_alerts), SUM(summaries) FROM hourly_rollups GROUP BY hour")
+    fatigue_hotspots = {}; activity_clock = {}
+    for hour, fatigue_count, summary_count in cursor.fetchall():
+        if fatigue_count: fatigue_hotspots[hour] = fatigue_count
+        if summary_count: activity_clock[hour] = summary_count
     current_streak = calculate_current_streak(conn)
     conn.close()
     return jsonify({
         'health_score': health_score, 
         'avg_blink_rate': int(avg_bpm), 
-        'fatigue_hotspots': dict(fatigue_hotspots), 
-        'activity_clock': dict(activity_clock),
+        'fatigue_hotspots': fatigue_hotspots, 
+        'activity_clock': activity_clock,
         'current_streak': current_streak
     })
 
@@ -562,8 +675,8 @@ def get_summary_stats():
 def get_weekly_report():
     conn = sqlite3.connect(DB_FILE, check_same_thread=False)
     cursor = conn.cursor()
-    one_week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-    cursor.execute("SELECT strftime('%Y-%m-%d', start_time) as day, SUM(total_active_time_sec) FROM sessions WHERE start_time >= ? GROUP BY day", (one_week_ago,))
+    one_week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    cursor.execute("SELECT day, active_sec FROM daily_rollups WHERE day > ? AND sessions > 0 ORDER BY day", (one_week_ago,))
     daily_activity = cursor.fetchall()
     conn.close()
     report_data = {'labels': [datetime.strptime(day, '%Y-%m-%d').strftime('%a') for day, sec in daily_activity], 'data': [round(sec / 3600, 1) if sec else 0 for day, sec in daily_activity]}
@@ -572,27 +685,40 @@ def get_weekly_report():
 @app.route('/api/session_report/<int:session_id>')
 def get_session_report(session_id):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT start_time, end_time FROM sessions WHERE session_id = ?", (session_id,))
-        session_times = cursor.fetchone()
-        conn.close()
-
-        if not session_times:
-            return jsonify({"error": "Session not found"}), 404
-        
-        start_time, end_time = session_times
-        
-        report = wellness_assistant.generate_session_summary(
-            session_id=session_id,
-            start_time_str=start_time,
-            end_time_str=end_time,
-            db_path=DB_FILE
-        )
-        return jsonify(report)
+        found = session_reports.get(DB_FILE, session_id, settings_cache.get(DB_FILE).values)
     except Exception as e:
         print(f"[ERROR] Could not generate session report for ID {session_id}: {e}")
         return jsonify({"error": "Failed to generate report"}), 500
+    if found is None:
+        return jsonify({"error": "Session not found"}), 404
+
+    report_json, etag, source = found
+    session_reports_served.labels(source).inc()
+    response = Response(report_json, mimetype='application/json')
+    if etag is None:
+        response.headers['Cache-Control'] = 'no-store' # Still running: the report changes with every event
+        return response
+    # Revalidated on every use, since a goal-settings change replaces the stored report; unchanged reports cost a 304.
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/export/<dataset>')
+def export_data(dataset):
+    # Streams rows as they are read (see export.py); nothing is collected in memory first.
+    fmt = request.args.get('format', 'ndjson')
+    error = export.validate(dataset, fmt)
+    if error is None:
+        try:
+            since_ms, until_ms = export.parse_time(request.args.get('since')), export.parse_time(request.args.get('until'))
+            session_ids = export.parse_session_ids(request.args.get('sessions'))
+        except ValueError as e:
+            error = f"Invalid filter: {e}"
+    if error:
+        return jsonify({'error': error}), 400
+    mimetype, extension = export.FORMATS[fmt]
+    return Response(stream_with_context(export.stream_export(DB_FILE, dataset, fmt, since_ms, until_ms, session_ids)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="drishti_{dataset}.{extension}"', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/get_settings', methods=['GET'])
 def get_settings():
@@ -623,55 +749,36 @@ def save_settings():
             new_settings.get('activeEndTime')
         ))
         conn.commit(); conn.close()
+        settings_cache.refresh(DB_FILE)
         return jsonify({"status": "success", "message": "Settings saved."}), 200
     except Exception as e: return jsonify({"error": str(e)}), 500
 
 @app.route('/api/chat', methods=['POST'])
 def chat_with_gemini():
-    global conversation_history # Access the global list
+    import requests
     try:
-        user_message = request.json['message']
+        data = request.get_json()
+        user_message = data['message']
 
         # --- 1. GATHER ALL DATA LOCALLY ---
-        # This data-gathering code is the same as before. It stays here!
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False); cursor = conn.cursor()
-        cursor.execute("SELECT user_name FROM settings WHERE id = 1")
-        user_name_result = cursor.fetchone()
-        user_name = user_name_result[0] if user_name_result and user_name_result[0] else "friend"
-        cursor.execute("SELECT value_numeric FROM events WHERE event_type = 'SUMMARY_BPM' AND value_numeric > 0")
-        bpm_records = cursor.fetchall()
-        avg_bpm = np.mean([r[0] for r in bpm_records]) if bpm_records else 15
-        health_score = min(100, int((avg_bpm / 20.0) * 100))
-        cursor.execute("SELECT strftime('%H', timestamp) as hour, COUNT(*) as count FROM events WHERE event_type IN ('YAWN_DETECTED', 'MICRO_SLEEP_DETECTED', 'FATIGUE_SCORE_ALERT') GROUP BY hour ORDER BY count DESC LIMIT 1")
-        hotspot_result = cursor.fetchone()
-        fatigue_hotspot_hour = f"{hotspot_result[0]}:00" if hotspot_result else "Not enough data"
-        conn.close()
-        user_stats = { "avg_bpm": int(avg_bpm), "health_score": health_score, "fatigue_hotspot_hour": fatigue_hotspot_hour }
-        
-        # --- 2. PACKAGE THE DATA TO SEND TO THE SERVER ---
-        # The complex prompt is GONE from this file. We just package the data.
-        payload = {
-            'message': user_message,
-            'history': conversation_history,
-            'user_name': user_name,
-            'stats': user_stats
-        }
-
-        # --- 3. CALL YOUR SECURE VERCEL SERVER ---
-        # !!! IMPORTANT: Replace "your-frontend-project-name" with the actual name of your Vercel project !!!
-        VERCEL_API_URL = "https://drishtiai-website.vercel.app/api/chat" 
-        
-        response = requests.post(VERCEL_API_URL, json=payload, timeout=30) # Added a 30-second timeout
-        response.raise_for_status() # This will raise an error if the server returns 4xx or 5xx
-
-        # --- 4. RECEIVE AND PROCESS THE REPLY FROM YOUR SERVER ---
-        data = response.json()
-        bot_reply = data.get('reply')
-        
-        # The server now manages the history, so we get the updated version from it
-        conversation_history = data.get('history', []) 
-
-        return jsonify({'reply': bot_reply})
+        # History-wide stats come from a short-lived cache; only the live session numbers are read fresh.
+        user_name = settings_cache.get(DB_FILE).get('user_name') or "friend"
+        user_stats = dict(get_chat_context().get())
+        live = live_metrics.latest
+        if live.session_id is not None:
+            user_stats["current_session"] = { "blinks": live.blinks, "bpm": live.bpm, "active_time_sec": live.active_time, "fatigue_score": live.fatigue_score }
+
+        # --- 2. CALL THE CHAT PROXY ---
+        # The client keeps its connection alive between messages and owns the (bounded) conversation history.
+        if data.get('stream'):
+            def stream_reply():
+                try:
+                    yield from chat_client.stream(user_message, user_name, user_stats)
+                except requests.exceptions.RequestException as e:
+                    print(f"[ERROR] Streamed request to chat proxy failed: {e}")
+                    yield "\n[Sorry, the reply was interrupted. Please try again.]"
+            return Response(stream_with_context(stream_reply()), mimetype='text/plain', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        return jsonify({'reply': chat_client.send(user_message, user_name, user_stats)})
         
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] API request to Vercel proxy failed: {e}")
@@ -680,16 +787,63 @@ def chat_with_gemini():
         print(f"[ERROR] Chat handler failed: {e}")
         return jsonify({'reply': "An unexpected error occurred. Please try again later."}), 500
 
+def get_chat_context():
+    # Rebuilt if DB_FILE is repointed (replays and benchmarks use scratch databases).
+    global chat_context
+    if chat_context is None or chat_context.db_path != DB_FILE:
+        chat_context = ChatContextCache(DB_FILE)
+    return chat_context
+
 def run_flask_app():
     # This line triggers the browser to open automatically
     webbrowser.open_new_tab('http://127.0.0.1:5000') 
     app.run(port=5000, debug=False, use_reloader=False)
 
+def measure_startup(port=5000, camera_index=0, timeout_sec=60.0):
+    """
+    Starts the web server as the app does (without opening a browser) and
+    reports, in seconds since this module started importing, when the
+    dashboard first answered and when the first camera frame came out of
+    FaceMesh. Loading the dashboard starts the background prewarm, as it
+    does for a real user.
+    """
+    import urllib.request
+    threading.Thread(target=app.run, kwargs={'port': port, 'debug': False, 'use_reloader': False}, daemon=True).start()
+    report = {"first_http_response_sec": None, "first_processed_frame_sec": None}
+    deadline = time.perf_counter() + timeout_sec
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1.0) as response: response.read()
+            report["first_http_response_sec"] = round(time.perf_counter() - _IMPORT_STARTED, 3); break
+        except OSError:
+            time.sleep(0.01)
+
+    pipeline = build_camera_pipeline(camera_index).start()
+    try:
+        while time.perf_counter() < deadline and not pipeline.finished:
+            if pipeline.get() is not None:
+                report["first_processed_frame_sec"] = round(time.perf_counter() - _IMPORT_STARTED, 3); break
+    finally:
+        pipeline.release()
+    report["load_sec"] = dict(lazy_runtime.load_seconds)
+    return report
+
 # --- Main Execution Block ---
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Drishti AI eye-health monitor.")
+    parser.add_argument("--measure-startup", action="store_true", help="Report time to first HTTP response and first processed frame, then exit")
+    parser.add_argument("--camera", type=int, default=0, help="Camera index used by --measure-startup")
+    args = parser.parse_args()
+
     if not os.path.exists(DB_FILE):
         print("[INFO] No database found. Creating a new one for this user.")
-        setup_database()
+    # Also run for existing databases so schema upgrades are applied before the dashboard reads them.
+    setup_database()
+    retention_engine = RetentionEngine(DB_FILE).start()
+    if args.measure_startup:
+        print(json.dumps(measure_startup(camera_index=args.camera), indent=4))
+        sys.exit(0)
     print("Application ready. Starting web server...")
     print("Open your browser to http://localhost:5000 to control the application.")
     run_flask_app()
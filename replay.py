@@ -0,0 +1,219 @@
+"""
+Offline replay of recorded sessions through the live monitoring loop.
+
+A recording is either a video file or a landmark trace (.npz) produced with
+--record-trace. Replays write to a scratch database and, unless --realtime
+is given, run as fast as the machine allows on an injected clock that follows
+the recording's own timestamps.
+
+    python replay.py session.mp4 --profile calibration_profile.json
+    python replay.py session.mp4 --record-trace session.npz
+    python replay.py session.npz --json
+    python replay.py session.npz --adaptive     # with the adaptive frame-rate scheduler
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import lazy_runtime
+import real_time_eye_tracking as tracker
+import settings_cache
+import wellness_assistant
+from alert_dispatcher import AlertDispatcher
+from frame_pipeline import FramePacket, FramePipeline, StageTimer
+from frame_scheduler import FrameRateScheduler
+from input_scaler import InputScaler
+from landmark_features import LandmarkFeatureExtractor
+from video_source import ReplayClock, VideoReplaySource
+
+TRACE_FRAME_SIZE = (480, 640) # Blank canvas for overlays when replaying a trace
+
+
+class _TraceResults:
+    """Mimics the `multi_face_landmarks` field of FaceMesh results."""
+    __slots__ = ("multi_face_landmarks",)
+
+    def __init__(self, faces):
+        self.multi_face_landmarks = faces
+
+
+class LandmarkTracePipeline:
+    """
+    Feeds a recorded landmark trace to the analysis stage, skipping capture
+    and inference. Exposes the same interface the monitoring loop uses on
+    FramePipeline.
+
+    The trace is an .npz file with `landmarks` (T, N, 3) float32, NaN for
+    frames without a face, and `timestamps` (T,) seconds from the start.
+    """
+    input_scaler = None
+
+    def __init__(self, path, clock=None, realtime=False, scheduler=None):
+        self.scheduler = scheduler
+        with np.load(path) as trace:
+            self.landmarks = trace["landmarks"].astype(np.float32, copy=False)
+            self.timestamps = trace["timestamps"].astype(np.float64, copy=False)
+        self.face_present = ~np.isnan(self.landmarks[:, 0, 0])
+        self.clock = clock
+        self.realtime = realtime
+        self.index = 0
+        self._start = clock() if clock is not None else time.time()
+        self._canvas = np.zeros(TRACE_FRAME_SIZE + (3,), dtype=np.uint8)
+        self.analysis_timer = StageTimer()
+        self._last_kept = float("-inf")
+
+    def start(self):
+        self._start -= self.timestamps[0] if len(self.timestamps) else 0.0
+        return self
+
+    def stop(self):
+        pass
+
+    def release(self):
+        pass
+
+    @property
+    def finished(self):
+        return self.index >= len(self.timestamps)
+
+    def get(self, timeout=0.5):
+        if self.finished:
+            return None
+        i = self.index
+        self.index += 1
+        t = self._start + float(self.timestamps[i])
+        if self.scheduler is not None:
+            # Frames the scheduler would not have captured are passed over, as FramePipeline does.
+            while self.scheduler.should_skip(t - self._last_kept) and not self.finished:
+                i = self.index
+                self.index += 1
+                t = self._start + float(self.timestamps[i])
+            self._last_kept = t
+        if self.realtime:
+            delay = t - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        if self.clock is not None:
+            self.clock.now = t
+        self._canvas[:] = 0
+        packet = FramePacket(i, t, self._canvas)
+        packet.results = _TraceResults([self.landmarks[i]] if self.face_present[i] else None)
+        return packet
+
+    def record_analysis(self, packet, started_at):
+        self.analysis_timer.record(time.perf_counter() - started_at)
+
+    def stats(self):
+        return {"captured": len(self.timestamps), "analysis": self.analysis_timer.as_dict(),
+                "scheduler": self.scheduler.stats() if self.scheduler else None}
+
+
+def record_landmark_trace(video_path, out_path):
+    """Runs FaceMesh over every frame of a video and saves the landmarks as a trace."""
+    source = VideoReplaySource(video_path)
+    extractor = LandmarkFeatureExtractor()
+    landmarks, timestamps = [], []
+    face_mesh = lazy_runtime.get_face_mesh()
+    while True:
+        ret, frame = source.cap.read()
+        if not ret:
+            break
+        frame = cv2.flip(frame, 1)
+        results = face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if results.multi_face_landmarks:
+            landmarks.append(extractor.load_landmarks(results.multi_face_landmarks[0]).copy())
+        else:
+            landmarks.append(np.full_like(extractor.points, np.nan))
+        timestamps.append(len(timestamps) / source.fps)
+    source.release()
+    np.savez_compressed(out_path, landmarks=np.asarray(landmarks, dtype=np.float32), timestamps=np.asarray(timestamps))
+    print(f"[INFO] Recorded {len(timestamps)} frames of landmarks to {out_path}")
+
+
+def replay(path, db_path=None, profile_path=None, realtime=False, adaptive=False):
+    """
+    Replays a video or landmark trace through `run_monitoring_loop` and
+    returns throughput and per-type event counts for the replayed session.
+    With `adaptive`, frames are skipped as the live FrameRateScheduler would,
+    so its savings and any missed events can be measured on real recordings.
+    """
+    scratch_dir = tempfile.mkdtemp(prefix="drishti_replay_")
+    # Point the monitoring module at scratch files so the user's own data is never touched.
+    tracker.DB_FILE = db_path or os.path.join(scratch_dir, "monitoring_data.db")
+    profile_source = profile_path or tracker.CONFIG_FILE
+    tracker.CONFIG_FILE = os.path.join(scratch_dir, "calibration_profile.json")
+    if os.path.exists(profile_source):
+        shutil.copyfile(profile_source, tracker.CONFIG_FILE)
+    tracker.setup_database()
+    settings_cache.refresh(tracker.DB_FILE)
+    tracker.alerts = AlertDispatcher() # No channels: a replay never notifies or speaks
+
+    clock = time.time if realtime else ReplayClock(time.time())
+    source_clock = None if realtime else clock
+    scheduler = FrameRateScheduler() if adaptive else None
+    if path.endswith(".npz"):
+        pipeline = LandmarkTracePipeline(path, clock=source_clock, realtime=realtime, scheduler=scheduler)
+        media_sec = float(pipeline.timestamps[-1] - pipeline.timestamps[0]) if len(pipeline.timestamps) else 0.0
+    else:
+        source = VideoReplaySource(path, clock=source_clock, realtime=realtime)
+        frame_total = source.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        media_sec = frame_total / source.fps if frame_total > 0 else 0.0
+        pipeline = FramePipeline(source, lazy_runtime.get_face_mesh(), clock=clock, input_scaler=InputScaler(), drop_frames=realtime, scheduler=scheduler)
+
+    tracker.monitoring_active = True
+    started = time.perf_counter()
+    tracker.run_monitoring_loop(pipeline=pipeline, clock=clock)
+    wall_sec = time.perf_counter() - started
+    tracker.monitoring_active = False
+
+    frames = pipeline.analysis_timer.count
+    conn = sqlite3.connect(tracker.DB_FILE)
+    event_counts = dict(conn.execute(wellness_assistant.EVENT_COUNTS_SQL, (tracker.current_session_id,)).fetchall())
+    conn.close()
+    return {
+        "source": path,
+        "db_path": tracker.DB_FILE,
+        "session_id": tracker.current_session_id,
+        "frames": frames,
+        "wall_sec": round(wall_sec, 3),
+        "fps": round(frames / wall_sec, 1) if wall_sec > 0 else 0.0,
+        "speedup": round(media_sec / wall_sec, 2) if wall_sec > 0 else 0.0,
+        "events": event_counts,
+        "pipeline": pipeline.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session through the DrishtiAI monitoring loop.")
+    parser.add_argument("source", help="Video file, or landmark trace (.npz)")
+    parser.add_argument("--db", help="Scratch database to write to (default: a new temporary file)")
+    parser.add_argument("--profile", help="Calibration profile to use (default: the user's current profile)")
+    parser.add_argument("--realtime", action="store_true", help="Play at the recorded rate on the wall clock")
+    parser.add_argument("--adaptive", action="store_true", help="Skip frames as the adaptive frame-rate scheduler would")
+    parser.add_argument("--record-trace", metavar="OUT.npz", help="Save the video's landmarks as a trace instead of replaying")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    args = parser.parse_args()
+
+    if args.record_trace:
+        record_landmark_trace(args.source, args.record_trace)
+        return
+
+    result = replay(args.source, db_path=args.db, profile_path=args.profile, realtime=args.realtime, adaptive=args.adaptive)
+    if args.json:
+        print(json.dumps(result, indent=4))
+    else:
+        print(f"\nReplayed {result['frames']} frames in {result['wall_sec']}s ({result['fps']} fps, {result['speedup']}x real time)")
+        print(f"Events written to {result['db_path']} (session {result['session_id']}):")
+        for event_type, count in sorted(result["events"].items()):
+            print(f"  {event_type:<28} {count}")
+
+
+if __name__ == '__main__':
+    main()
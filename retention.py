@@ -0,0 +1,289 @@
+"""
+Retention and compaction of the monitoring history.
+
+Raw `events` rows older than the policy's `raw_days` are collapsed into
+per-minute buckets in `event_aggregates` (count, value count/sum/min/max
+and the positive-value sum the BPM rollups use); minute buckets older than
+`minute_days` are merged into per-hour buckets. Session markers and rows
+with text values are never compacted. Report queries read both tables, so
+dashboards, `generate_session_summary` and `rollups.rebuild()` give the
+same results before and after compaction.
+
+Work is done in transactions of at most `batch_size` rows with a short
+pause between them, so the background EventWriter is never held up for
+long. Databases created with incremental auto-vacuum then return the freed
+pages to the file system a few pages at a time; older databases reuse them
+for new rows until converted with `--vacuum`.
+
+    python retention.py                         # compact the user's own database
+    python retention.py --raw-days 7 --minute-days 90
+    python retention.py --vacuum                # one-off conversion to incremental auto-vacuum
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from db_schema import EVENT_TYPE_IDS, ensure_schema
+
+DEFAULT_DB_FILE = os.path.join(os.path.expanduser('~'), '.DrishtiAI', 'monitoring_data.db')
+
+# --- Tunable Parameters ---
+RAW_DAYS = 30 # Raw events kept this long
+MINUTE_DAYS = 180 # Minute buckets kept this long before merging into hours (None keeps them)
+BATCH_SIZE = 5000 # Rows per transaction
+BATCH_PAUSE_SEC = 0.05 # Gap between transactions, for the event writer to get in
+VACUUM_STEP_PAGES = 1000 # Pages freed per incremental_vacuum step
+RUN_INTERVAL_SEC = 6 * 3600 # How often the background engine compacts
+FIRST_RUN_DELAY_SEC = 120.0 # Keeps compaction out of the start-up path
+KEEP_RAW_TYPES = ("SESSION_START", "SESSION_END")
+
+MINUTE_SEC = 60
+HOUR_SEC = 3600
+
+_UPSERT_AGGREGATE_SQL = '''
+    INSERT INTO event_aggregates (session_id, type_id, bucket_sec, bucket_ms, count, value_count, value_sum, value_min, value_max, positive_sum, positive_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (session_id, type_id, bucket_sec, bucket_ms) DO UPDATE SET
+        count = count + excluded.count, value_count = value_count + excluded.value_count, value_sum = value_sum + excluded.value_sum,
+        value_min = min(IFNULL(value_min, excluded.value_min), IFNULL(excluded.value_min, value_min)),
+        value_max = max(IFNULL(value_max, excluded.value_max), IFNULL(excluded.value_max, value_max)),
+        positive_sum = positive_sum + excluded.positive_sum, positive_count = positive_count + excluded.positive_count'''
+
+
+class RetentionPolicy:
+    """
+    How long each level of detail is kept.
+
+    Args:
+        raw_days (float): Age after which raw events become minute buckets.
+        minute_days (float): Age after which minute buckets become hour
+            buckets; None keeps minute buckets indefinitely.
+        keep_raw_types (tuple): Event type names that are never compacted.
+    """
+
+    def __init__(self, raw_days=RAW_DAYS, minute_days=MINUTE_DAYS, keep_raw_types=KEEP_RAW_TYPES):
+        if minute_days is not None and minute_days < raw_days:
+            raise ValueError("minute_days must not be shorter than raw_days")
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.keep_raw_types = tuple(keep_raw_types)
+
+    def compacted_type_ids(self):
+        return [type_id for name, type_id in EVENT_TYPE_IDS.items() if name not in self.keep_raw_types]
+
+
+def _bucket_start_ms(ts_ms, bucket_sec):
+    """Start of the local-time minute or hour containing `ts_ms`, in epoch milliseconds."""
+    if bucket_sec == MINUTE_SEC:
+        # Every time zone offset is a whole number of minutes, so local and UTC minutes coincide.
+        return ts_ms - ts_ms % 60000
+    local_time = datetime.fromtimestamp(ts_ms / 1000.0)
+    return int(local_time.replace(minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+
+class _Buckets:
+    """Aggregate rows being built for one batch, keyed by (session_id, type_id, bucket_sec, bucket_ms)."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, key, count, value_count, value_sum, value_min, value_max, positive_sum, positive_count):
+        row = self.rows.get(key)
+        if row is None:
+            self.rows[key] = [count, value_count, value_sum, value_min, value_max, positive_sum, positive_count]
+            return
+        row[0] += count; row[1] += value_count; row[2] += value_sum
+        if value_min is not None and (row[3] is None or value_min < row[3]): row[3] = value_min
+        if value_max is not None and (row[4] is None or value_max > row[4]): row[4] = value_max
+        row[5] += positive_sum; row[6] += positive_count
+
+    def write(self, conn):
+        conn.executemany(_UPSERT_AGGREGATE_SQL, [(*key, *row) for key, row in self.rows.items()])
+        return len(self.rows)
+
+
+def compact(conn, policy=None, now=None, batch_size=BATCH_SIZE, pause_sec=BATCH_PAUSE_SEC, should_stop=None):
+    """
+    Applies `policy` to an open connection and returns what was reclaimed:
+    raw events compacted, aggregate rows written and minute buckets merged,
+    plus the bytes the file shrank by and the bytes still free inside it.
+
+    Args:
+        now (float): Epoch seconds the ages are measured from (default: now).
+        should_stop (callable): Checked between batches; returning True ends the run early.
+    """
+    policy = policy or RetentionPolicy()
+    now = time.time() if now is None else now
+    should_stop = should_stop or (lambda: False)
+    size_before = _file_bytes(conn)
+    stats = {"events_compacted": 0, "aggregates_written": 0, "minute_buckets_merged": 0}
+
+    raw_cutoff_ms = int((now - policy.raw_days * 86400) * 1000)
+    hour_cutoff_ms = None if policy.minute_days is None else int((now - policy.minute_days * 86400) * 1000)
+    for type_id in policy.compacted_type_ids():
+        while not should_stop():
+            with conn:
+                # Uses the (type_id, ts_ms) index; rows already past the minute horizon go straight to hour buckets.
+                rows = conn.execute('''SELECT event_id, session_id, ts_ms, value_numeric FROM events
+                                       WHERE type_id = ? AND ts_ms < ? AND value_text IS NULL LIMIT ?''',
+                                    (type_id, raw_cutoff_ms, batch_size)).fetchall()
+                if not rows:
+                    break
+                buckets = _Buckets()
+                for _, session_id, ts_ms, value in rows:
+                    bucket_sec = HOUR_SEC if hour_cutoff_ms is not None and ts_ms < hour_cutoff_ms else MINUTE_SEC
+                    has_value = value is not None
+                    positive = has_value and value > 0
+                    buckets.add((session_id, type_id, bucket_sec, _bucket_start_ms(ts_ms, bucket_sec)), 1, int(has_value),
+                                value if has_value else 0.0, value, value, value if positive else 0.0, int(positive))
+                stats["aggregates_written"] += buckets.write(conn)
+                conn.executemany("DELETE FROM events WHERE event_id = ?", [(row[0],) for row in rows])
+                stats["events_compacted"] += len(rows)
+            if len(rows) < batch_size:
+                break
+            time.sleep(pause_sec)
+
+    while hour_cutoff_ms is not None and not should_stop():
+        with conn:
+            rows = conn.execute('''SELECT session_id, type_id, bucket_ms, count, value_count, value_sum, value_min, value_max, positive_sum, positive_count
+                                   FROM event_aggregates WHERE bucket_sec = ? AND bucket_ms < ? LIMIT ?''',
+                                (MINUTE_SEC, hour_cutoff_ms, batch_size)).fetchall()
+            if not rows:
+                break
+            buckets = _Buckets()
+            for session_id, type_id, bucket_ms, *values in rows:
+                buckets.add((session_id, type_id, HOUR_SEC, _bucket_start_ms(bucket_ms, HOUR_SEC)), *values)
+            stats["aggregates_written"] += buckets.write(conn)
+            conn.executemany("DELETE FROM event_aggregates WHERE session_id = ? AND type_id = ? AND bucket_sec = ? AND bucket_ms = ?",
+                             [(row[0], row[1], MINUTE_SEC, row[2]) for row in rows])
+            stats["minute_buckets_merged"] += len(rows)
+        if len(rows) < batch_size:
+            break
+        time.sleep(pause_sec)
+
+    incremental_vacuum(conn, pause_sec=pause_sec, should_stop=should_stop)
+    stats["bytes_reclaimed"] = max(0, size_before - _file_bytes(conn))
+    stats["free_bytes"] = _free_bytes(conn)
+    return stats
+
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES, pause_sec=BATCH_PAUSE_SEC, should_stop=None):
+    """Returns free pages to the file system in small steps; does nothing unless auto_vacuum is INCREMENTAL."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return
+    while conn.execute("PRAGMA freelist_count").fetchone()[0] and not (should_stop and should_stop()):
+        conn.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+        time.sleep(pause_sec)
+
+
+def convert_to_incremental_vacuum(conn):
+    """One-off full VACUUM that switches an existing database to incremental auto-vacuum. Blocks writers while it runs."""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def _file_bytes(conn):
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def _free_bytes(conn):
+    return conn.execute("PRAGMA freelist_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+class RetentionEngine:
+    """
+    Runs `compact()` on a daemon thread: first after FIRST_RUN_DELAY_SEC,
+    then every RUN_INTERVAL_SEC. It opens its own WAL-mode connection per
+    run, so it never shares a connection with the request handlers or the
+    EventWriter. `stats()` reports the last run and the running totals.
+    """
+
+    def __init__(self, db_path, policy=None, interval_sec=RUN_INTERVAL_SEC, first_delay_sec=FIRST_RUN_DELAY_SEC):
+        self.db_path = db_path
+        self.policy = policy or RetentionPolicy()
+        self.interval_sec = interval_sec
+        self.first_delay_sec = first_delay_sec
+        self.last_run = None
+        self.totals = {"runs": 0, "events_compacted": 0, "aggregates_written": 0, "minute_buckets_merged": 0, "bytes_reclaimed": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="Retention", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        started = time.perf_counter()
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            result = compact(conn, self.policy, should_stop=self._stop.is_set)
+        finally:
+            conn.close()
+        result["finished_at"] = datetime.now().isoformat()
+        result["duration_sec"] = round(time.perf_counter() - started, 2)
+        self.last_run = result
+        self.totals["runs"] += 1
+        for key in ("events_compacted", "aggregates_written", "minute_buckets_merged", "bytes_reclaimed"):
+            self.totals[key] += result[key]
+        if result["events_compacted"] or result["minute_buckets_merged"]:
+            print(f"[INFO] Retention: compacted {result['events_compacted']:,} events, merged {result['minute_buckets_merged']:,} minute buckets, "
+                  f"reclaimed {result['bytes_reclaimed']:,} bytes in {result['duration_sec']}s")
+        return result
+
+    def stats(self):
+        return {
+            "policy": {"raw_days": self.policy.raw_days, "minute_days": self.policy.minute_days, "keep_raw_types": list(self.policy.keep_raw_types)},
+            "last_run": self.last_run,
+            "totals": dict(self.totals),
+        }
+
+    def _run(self):
+        delay = self.first_delay_sec
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print(f"[ERROR] Retention run failed: {e}")
+            delay = self.interval_sec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old DrishtiAI monitoring events into minute and hour aggregates.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="Monitoring database (default: %(default)s)")
+    parser.add_argument("--raw-days", type=float, default=RAW_DAYS, help="Keep raw events this many days (default: %(default)s)")
+    parser.add_argument("--minute-days", type=float, default=MINUTE_DAYS, help="Keep minute buckets this many days before merging them into hours (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="Afterwards, switch the database to incremental auto-vacuum with one full VACUUM")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA journal_mode=WAL")
+    ensure_schema(conn)
+    started = time.perf_counter()
+    stats = compact(conn, RetentionPolicy(args.raw_days, args.minute_days), batch_size=args.batch_size)
+    if args.vacuum:
+        size_before = _file_bytes(conn)
+        convert_to_incremental_vacuum(conn)
+        stats["bytes_reclaimed"] += max(0, size_before - _file_bytes(conn))
+        stats["free_bytes"] = _free_bytes(conn)
+    conn.close()
+    print(f"[INFO] {args.db}: compacted {stats['events_compacted']:,} events into {stats['aggregates_written']:,} aggregate rows, "
+          f"merged {stats['minute_buckets_merged']:,} minute buckets, reclaimed {stats['bytes_reclaimed']:,} bytes "
+          f"({stats['free_bytes']:,} free) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Hourly and daily rollups of the monitoring data.
+
+The dashboard endpoints read these small tables instead of scanning
+`events` and `sessions`, so their cost does not grow with history:
+
+- `hourly_rollups`, keyed by (day, hour), counts blinks, yawns,
+  micro-sleeps, fatigue alerts and summary samples, sums positive
+  SUMMARY_BPM values, and holds active seconds spread over the hours each
+  session covered.
+- `daily_rollups`, keyed by day, counts sessions started that day and sums
+  their active and idle time.
+
+Rollups are updated in the same transaction that writes the events and when
+a session starts or ends. `rebuild()` recreates them from the raw tables,
+including events the retention engine has compacted into `event_aggregates`:
+
+    python rollups.py                       # the user's own database
+    python rollups.py --db monitoring_data.db
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from db_schema import EVENT_TYPE_IDS, ensure_schema
+
+DEFAULT_DB_FILE = os.path.join(os.path.expanduser('~'), '.DrishtiAI', 'monitoring_data.db')
+
+CREATE_SQL = (
+    '''CREATE TABLE IF NOT EXISTS hourly_rollups (
+        day TEXT NOT NULL, hour INTEGER NOT NULL,
+        blinks INTEGER DEFAULT 0, yawns INTEGER DEFAULT 0, micro_sleeps INTEGER DEFAULT 0,
+        fatigue_alerts INTEGER DEFAULT 0, summaries INTEGER DEFAULT 0,
+        bpm_sum REAL DEFAULT 0, bpm_count INTEGER DEFAULT 0, active_sec REAL DEFAULT 0,
+        PRIMARY KEY (day, hour))''',
+    '''CREATE TABLE IF NOT EXISTS daily_rollups (
+        day TEXT PRIMARY KEY, sessions INTEGER DEFAULT 0,
+        active_sec REAL DEFAULT 0, idle_sec REAL DEFAULT 0)''',
+)
+
+# Event type id -> column index in an hourly bucket; SUMMARY_BPM feeds bpm_sum/bpm_count instead.
+_COUNTED_EVENTS = {EVENT_TYPE_IDS[name]: i for i, name in enumerate(("BLINK", "YAWN_DETECTED", "MICRO_SLEEP_DETECTED", "FATIGUE_SCORE_ALERT", "SUMMARY_EAR"))}
+_SUMMARY_BPM = EVENT_TYPE_IDS["SUMMARY_BPM"]
+_BUCKET_SIZE = 7
+
+_UPSERT_EVENTS_SQL = '''
+    INSERT INTO hourly_rollups (day, hour, blinks, yawns, micro_sleeps, fatigue_alerts, summaries, bpm_sum, bpm_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, hour) DO UPDATE SET
+        blinks = blinks + excluded.blinks, yawns = yawns + excluded.yawns,
+        micro_sleeps = micro_sleeps + excluded.micro_sleeps, fatigue_alerts = fatigue_alerts + excluded.fatigue_alerts,
+        summaries = summaries + excluded.summaries,
+        bpm_sum = bpm_sum + excluded.bpm_sum, bpm_count = bpm_count + excluded.bpm_count'''
+_UPSERT_ACTIVE_SQL = '''
+    INSERT INTO hourly_rollups (day, hour, active_sec) VALUES (?, ?, ?)
+    ON CONFLICT (day, hour) DO UPDATE SET active_sec = active_sec + excluded.active_sec'''
+_UPSERT_DAY_SQL = '''
+    INSERT INTO daily_rollups (day, sessions, active_sec, idle_sec) VALUES (?, ?, ?, ?)
+    ON CONFLICT (day) DO UPDATE SET
+        sessions = sessions + excluded.sessions,
+        active_sec = active_sec + excluded.active_sec, idle_sec = idle_sec + excluded.idle_sec'''
+
+
+def create_tables(conn):
+    """Creates the rollup tables if needed. Returns True if they did not exist before."""
+    existing = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('hourly_rollups', 'daily_rollups')").fetchone()[0]
+    for sql in CREATE_SQL:
+        conn.execute(sql)
+    return existing < len(CREATE_SQL)
+
+
+def apply_events(conn, rows):
+    """
+    Adds a batch of event rows, `(session_id, ts_ms, type_id, value_numeric,
+    value_text)`, to the hourly rollups. Call it inside the transaction that
+    inserts the rows.
+    """
+    buckets = {}
+    for row in rows:
+        type_id = row[2]
+        column = _COUNTED_EVENTS.get(type_id)
+        if column is None and type_id != _SUMMARY_BPM:
+            continue
+        local_time = datetime.fromtimestamp(row[1] / 1000.0)
+        key = (local_time.strftime('%Y-%m-%d'), local_time.hour)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [0] * _BUCKET_SIZE
+        if column is not None:
+            bucket[column] += 1
+        elif row[3] is not None and row[3] > 0:
+            bucket[5] += row[3]; bucket[6] += 1
+    if buckets:
+        conn.executemany(_UPSERT_EVENTS_SQL, [(day, hour, *bucket) for (day, hour), bucket in buckets.items()])
+
+
+def record_session_start(conn, start_time_iso):
+    conn.execute(_UPSERT_DAY_SQL, (start_time_iso[:10], 1, 0, 0))
+
+
+def record_session_end(conn, start_time_iso, end_time_iso, active_sec, idle_sec):
+    """Adds a finished session's active and idle time to the rollups."""
+    conn.execute(_UPSERT_DAY_SQL, (start_time_iso[:10], 0, active_sec, idle_sec))
+    conn.executemany(_UPSERT_ACTIVE_SQL, _spread_over_hours(start_time_iso, end_time_iso, active_sec))
+
+
+def _spread_over_hours(start_time_iso, end_time_iso, active_sec):
+    """Splits `active_sec` across the clock hours between start and end, in proportion to their overlap."""
+    try:
+        start = datetime.fromisoformat(start_time_iso); end = datetime.fromisoformat(end_time_iso)
+    except (TypeError, ValueError):
+        return []
+    span = (end - start).total_seconds()
+    if span <= 0 or not active_sec:
+        return []
+    ratio = active_sec / span
+    shares = []
+    cursor = start
+    while cursor < end:
+        next_hour = min(end, cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+        shares.append((cursor.strftime('%Y-%m-%d'), cursor.hour, (next_hour - cursor).total_seconds() * ratio))
+        cursor = next_hour
+    return shares
+
+
+def rebuild(conn):
+    """Recomputes both rollup tables from `events` and `sessions`."""
+    create_tables(conn)
+    conn.execute("DELETE FROM hourly_rollups")
+    conn.execute("DELETE FROM daily_rollups")
+    ids = EVENT_TYPE_IDS
+    conn.execute(f'''
+        INSERT INTO hourly_rollups (day, hour, blinks, yawns, micro_sleeps, fatigue_alerts, summaries, bpm_sum, bpm_count)
+        SELECT date(ts_ms / 1000, 'unixepoch', 'localtime') AS day, CAST(strftime('%H', ts_ms / 1000, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+               SUM(type_id = {ids['BLINK']}), SUM(type_id = {ids['YAWN_DETECTED']}), SUM(type_id = {ids['MICRO_SLEEP_DETECTED']}),
+               SUM(type_id = {ids['FATIGUE_SCORE_ALERT']}), SUM(type_id = {ids['SUMMARY_EAR']}),
+               TOTAL(CASE WHEN type_id = {ids['SUMMARY_BPM']} AND value_numeric > 0 THEN value_numeric END),
+               SUM(type_id = {ids['SUMMARY_BPM']} AND value_numeric > 0)
+        FROM events
+        WHERE type_id IN ({', '.join(str(type_id) for type_id in (*_COUNTED_EVENTS, _SUMMARY_BPM))})
+        GROUP BY day, hour''')
+    # Aggregate buckets are local-time minutes or hours, so each falls entirely within one rollup hour.
+    conn.execute(f'''
+        INSERT INTO hourly_rollups (day, hour, blinks, yawns, micro_sleeps, fatigue_alerts, summaries, bpm_sum, bpm_count)
+        SELECT date(bucket_ms / 1000, 'unixepoch', 'localtime') AS day, CAST(strftime('%H', bucket_ms / 1000, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+               TOTAL(CASE WHEN type_id = {ids['BLINK']} THEN count END), TOTAL(CASE WHEN type_id = {ids['YAWN_DETECTED']} THEN count END),
+               TOTAL(CASE WHEN type_id = {ids['MICRO_SLEEP_DETECTED']} THEN count END), TOTAL(CASE WHEN type_id = {ids['FATIGUE_SCORE_ALERT']} THEN count END),
+               TOTAL(CASE WHEN type_id = {ids['SUMMARY_EAR']} THEN count END),
+               TOTAL(CASE WHEN type_id = {ids['SUMMARY_BPM']} THEN positive_sum END),
+               TOTAL(CASE WHEN type_id = {ids['SUMMARY_BPM']} THEN positive_count END)
+        FROM event_aggregates
+        WHERE type_id IN ({', '.join(str(type_id) for type_id in (*_COUNTED_EVENTS, _SUMMARY_BPM))})
+        GROUP BY day, hour
+        ON CONFLICT (day, hour) DO UPDATE SET
+            blinks = blinks + excluded.blinks, yawns = yawns + excluded.yawns,
+            micro_sleeps = micro_sleeps + excluded.micro_sleeps, fatigue_alerts = fatigue_alerts + excluded.fatigue_alerts,
+            summaries = summaries + excluded.summaries,
+            bpm_sum = bpm_sum + excluded.bpm_sum, bpm_count = bpm_count + excluded.bpm_count''')
+    conn.execute('''
+        INSERT INTO daily_rollups (day, sessions, active_sec, idle_sec)
+        SELECT substr(start_time, 1, 10), COUNT(*), TOTAL(total_active_time_sec), TOTAL(total_idle_time_sec)
+        FROM sessions GROUP BY 1''')
+    for start_time, end_time, active_sec in conn.execute("SELECT start_time, end_time, total_active_time_sec FROM sessions WHERE end_time IS NOT NULL").fetchall():
+        conn.executemany(_UPSERT_ACTIVE_SQL, _spread_over_hours(start_time, end_time, active_sec))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the DrishtiAI dashboard rollups from the raw event history.")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE, help="Monitoring database (default: %(default)s)")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+    conn = sqlite3.connect(args.db)
+    ensure_schema(conn)
+    with conn:
+        rebuild(conn)
+    hours, days = conn.execute("SELECT (SELECT COUNT(*) FROM hourly_rollups), (SELECT COUNT(*) FROM daily_rollups)").fetchone()
+    conn.close()
+    print(f"[INFO] Rebuilt rollups in {args.db}: {hours} hour buckets, {days} days.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Persisted session reports.
+
+A finished session's report does not change, except for its goal section,
+which follows the goal settings. So the report is built once, when the
+session ends, and stored as JSON text in `session_reports` together with
+the goal version it was built with (a hash of the settings the goal section
+reads) and an ETag. /api/session_report serves the stored text as it is,
+so a repeated request costs one primary-key lookup, or a 304 when the
+dashboard already holds that version.
+
+When the goal settings change, the next request re-derives only the goal
+section from the stored report and stores it under the new version; the
+comparison with earlier sessions stays as it was when the session ended.
+Reports of sessions still in progress are built on every request and never
+stored, and neither are reports that failed on a database error.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+
+import wellness_assistant
+
+GOAL_SETTINGS = ("enable_weekly_goals", "goal_blink_rate") # Settings the report's goal section reads
+
+# Where a served report came from
+SOURCE_STORED = "stored"
+SOURCE_GOALS_UPDATED = "goals_updated"
+SOURCE_BUILT = "built"
+SOURCE_LIVE = "live"
+
+
+def goal_version(settings):
+    """A short, stable hash of the goal settings in `settings` (a settings dict, or None)."""
+    values = {key: (settings or {}).get(key) for key in GOAL_SETTINGS}
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _cacheable(report):
+    return not (report.get("error") or "").startswith(wellness_assistant.DATABASE_ERROR_PREFIX)
+
+
+def _store(conn, session_id, version, report):
+    """Saves `report` as the session's stored report; returns (report JSON text, ETag)."""
+    report_json = json.dumps(report, separators=(',', ':'))
+    etag = hashlib.sha1(f"{version}:{report_json}".encode("utf-8")).hexdigest()[:20]
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO session_reports (session_id, goal_version, etag, report_json, created_ms) VALUES (?, ?, ?, ?, ?)",
+                         (session_id, version, etag, report_json, int(time.time() * 1000)))
+    except sqlite3.Error as e:
+        # The report is still served; the next request tries to store it again.
+        print(f"[WARNING] Could not store the report for session {session_id}: {e}")
+    return report_json, etag
+
+
+def record(db_path, session_id, settings):
+    """
+    Builds and stores the report of a session that just ended and returns it
+    as a dict. Call it once the session's end and metrics are saved.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        start_time, end_time = conn.execute("SELECT start_time, end_time FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        report = wellness_assistant.generate_session_summary(session_id, start_time, end_time, db_path, user_settings=settings)
+        if _cacheable(report):
+            _store(conn, session_id, goal_version(settings), report)
+        return report
+    finally:
+        conn.close()
+
+
+def get(db_path, session_id, settings):
+    """
+    The session's report for the current goal settings, as
+    (report JSON text, ETag, source), or None if there is no such session.
+    The ETag is None for a report that was not stored.
+    """
+    version = goal_version(settings)
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT goal_version, etag, report_json FROM session_reports WHERE session_id = ?", (session_id,)).fetchone()
+        if row and row[0] == version:
+            return row[2], row[1], SOURCE_STORED
+
+        session = conn.execute("SELECT start_time, end_time FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if session is None:
+            return None
+        start_time, end_time = session
+        if end_time is None:
+            report = wellness_assistant.generate_session_summary(session_id, start_time, end_time, db_path, user_settings=settings)
+            return json.dumps(report, separators=(',', ':')), None, SOURCE_LIVE
+
+        if row:
+            # Built under other goal settings: only the goal section depends on them.
+            report = json.loads(row[2])
+            if "session_bpm" in report:
+                report["goal_achievement"] = wellness_assistant.goal_achievement(report["session_bpm"], settings)
+            return (*_store(conn, session_id, version, report), SOURCE_GOALS_UPDATED)
+
+        # Ended before reports were stored, or in a process that does not store them (multi_stream.py).
+        report = wellness_assistant.generate_session_summary(session_id, start_time, end_time, db_path, user_settings=settings)
+        if not _cacheable(report):
+            return json.dumps(report, separators=(',', ':')), None, SOURCE_BUILT
+        return (*_store(conn, session_id, version, report), SOURCE_BUILT)
+    finally:
+        conn.close()
@@ -0,0 +1,72 @@
+import threading
+from datetime import datetime
+
+import wellness_assistant
+
+DEFAULT_BREAK_INTERVAL_MIN = 20
+
+
+class SettingsSnapshot:
+    """
+    Parsed, read-only view of the `settings` row.
+
+    A snapshot is never modified after it is built; a refresh swaps in a new
+    object, so readers on other threads always see one consistent version.
+    """
+    __slots__ = ("db_path", "values", "active_start", "active_end", "break_interval_min", "version")
+
+    def __init__(self, db_path, values, version):
+        self.db_path = db_path
+        self.values = values
+        self.version = version
+        self.active_start = _parse_time(values.get('active_start_time'))
+        self.active_end = _parse_time(values.get('active_end_time'))
+        freq = values.get('notify_frequency')
+        try:
+            self.break_interval_min = int(freq) if freq not in (None, '') else DEFAULT_BREAK_INTERVAL_MIN
+        except (TypeError, ValueError):
+            self.break_interval_min = DEFAULT_BREAK_INTERVAL_MIN
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except (TypeError, ValueError):
+        print(f"[WARNING] Ignoring invalid active-hours value in settings: {value!r}")
+        return None
+
+
+_lock = threading.Lock()
+_snapshot = None
+_version = 0
+
+
+def refresh(db_path):
+    """
+    Reloads the settings row from disk and atomically replaces the cached
+    snapshot. Call this after every committed change to the settings table.
+    """
+    global _snapshot, _version
+    # The read happens under the lock too, so two racing refreshes cannot publish an older row last.
+    with _lock:
+        values = wellness_assistant.get_user_settings(db_path) or {}
+        _version += 1
+        _snapshot = SettingsSnapshot(db_path, values, _version)
+        return _snapshot
+
+
+def get(db_path):
+    """
+    Returns the current settings snapshot of `db_path`. Only the first call
+    for a database touches it; every later call is a plain attribute read.
+    """
+    snapshot = _snapshot
+    # Reloaded if the database is repointed (replays and benchmarks use scratch databases).
+    if snapshot is None or snapshot.db_path != db_path:
+        snapshot = refresh(db_path)
+    return snapshot
@@ -0,0 +1,178 @@
+import numpy as np
+
+# --- Tunable Parameters ---
+WINDOW_SEC = 60.0 # Trailing window the running sums cover
+CAPACITY = 4096 # Samples kept; 60 s at up to ~68 FPS
+RESUM_EVERY = 4096 # Pushes between exact re-summations, so add/subtract rounding never accumulates
+
+# Channels
+CH_EAR = 0
+CH_MAR = 1
+CH_GAZE = 2
+NUM_CHANNELS = 3
+
+
+class SignalWindow:
+    """
+    Per-frame eye signals over a trailing time window, in a fixed-capacity
+    ring of preallocated NumPy arrays.
+
+    Each `push()` writes one sample (time, EAR, MAR, gaze ratio, eyes-closed
+    flag) into the arrays and updates running sums; samples that fall out of
+    the window (or are overwritten when the ring is full) are subtracted
+    again. Windowed mean, variance, PERCLOS and blink rate are therefore
+    O(1) reads, and nothing is allocated per frame beyond the floats
+    themselves. Timestamps must not decrease.
+
+    Args:
+        window_sec (float): Length of the trailing window.
+        capacity (int): Maximum samples held; at frame rates where the window
+            needs more, the oldest samples leave early.
+    """
+    __slots__ = (
+        "window_sec", "capacity", "t", "values", "closed", "blink",
+        "_head", "_count", "_sum", "_sumsq", "_closed_count", "_blink_count", "_pushes",
+    )
+
+    def __init__(self, window_sec=WINDOW_SEC, capacity=CAPACITY):
+        self.window_sec = window_sec
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.values = np.zeros((NUM_CHANNELS, capacity))
+        self.closed = np.zeros(capacity, dtype=bool)
+        self.blink = np.zeros(capacity, dtype=bool)
+        self.reset()
+
+    def reset(self):
+        self._head = 0 # Index of the oldest sample in the window
+        self._count = 0
+        self._sum = [0.0] * NUM_CHANNELS
+        self._sumsq = [0.0] * NUM_CHANNELS
+        self._closed_count = 0
+        self._blink_count = 0
+        self._pushes = 0
+
+    def __len__(self):
+        return self._count
+
+    # --- Writing ---
+    def push(self, t, ear, mar, gaze, closed):
+        """Adds one frame's sample and drops samples older than `t - window_sec`."""
+        if self._count == self.capacity:
+            self._drop_oldest()
+        i = (self._head + self._count) % self.capacity
+        self.t[i] = t
+        values = self.values
+        values[CH_EAR, i] = ear; values[CH_MAR, i] = mar; values[CH_GAZE, i] = gaze
+        self.closed[i] = closed
+        self.blink[i] = False
+        self._count += 1
+        total, totalsq = self._sum, self._sumsq
+        total[CH_EAR] += ear; total[CH_MAR] += mar; total[CH_GAZE] += gaze
+        totalsq[CH_EAR] += ear * ear; totalsq[CH_MAR] += mar * mar; totalsq[CH_GAZE] += gaze * gaze
+        if closed:
+            self._closed_count += 1
+
+        cutoff = t - self.window_sec
+        while self._count > 1 and self.t[self._head] < cutoff:
+            self._drop_oldest()
+
+        self._pushes += 1
+        if self._pushes >= RESUM_EVERY:
+            self._resum()
+
+    def mark_blink(self):
+        """Flags the latest sample as the frame a blink was detected on."""
+        if not self._count:
+            return
+        i = (self._head + self._count - 1) % self.capacity
+        if not self.blink[i]:
+            self.blink[i] = True
+            self._blink_count += 1
+
+    def _drop_oldest(self):
+        i = self._head
+        values = self.values
+        ear, mar, gaze = float(values[CH_EAR, i]), float(values[CH_MAR, i]), float(values[CH_GAZE, i])
+        total, totalsq = self._sum, self._sumsq
+        total[CH_EAR] -= ear; total[CH_MAR] -= mar; total[CH_GAZE] -= gaze
+        totalsq[CH_EAR] -= ear * ear; totalsq[CH_MAR] -= mar * mar; totalsq[CH_GAZE] -= gaze * gaze
+        if self.closed[i]:
+            self._closed_count -= 1
+        if self.blink[i]:
+            self._blink_count -= 1
+        self._head = (i + 1) % self.capacity
+        self._count -= 1
+
+    def _resum(self):
+        # Exact sums over the window, once every RESUM_EVERY pushes (amortised O(1)).
+        self._pushes = 0
+        window = self._window_values()
+        for ch in range(NUM_CHANNELS):
+            column = window[ch]
+            self._sum[ch] = float(column.sum())
+            self._sumsq[ch] = float(np.dot(column, column))
+
+    def _window_values(self):
+        end = self._head + self._count
+        if end <= self.capacity:
+            return self.values[:, self._head:end]
+        return np.concatenate((self.values[:, self._head:], self.values[:, :end - self.capacity]), axis=1)
+
+    # --- Windowed Reads (O(1)) ---
+    @property
+    def span_sec(self):
+        """Time covered by the samples in the window."""
+        if self._count < 2:
+            return 0.0
+        return float(self.t[(self._head + self._count - 1) % self.capacity] - self.t[self._head])
+
+    def mean(self, channel=CH_EAR):
+        return self._sum[channel] / self._count if self._count else 0.0
+
+    def variance(self, channel=CH_EAR):
+        """Population variance of the channel over the window."""
+        if self._count < 2:
+            return 0.0
+        mean = self._sum[channel] / self._count
+        return max(0.0, self._sumsq[channel] / self._count - mean * mean)
+
+    def std(self, channel=CH_EAR):
+        return self.variance(channel) ** 0.5
+
+    def perclos(self):
+        """PERCLOS: the fraction of frames in the window with the eyes closed."""
+        return self._closed_count / self._count if self._count else 0.0
+
+    @property
+    def blink_count(self):
+        return self._blink_count
+
+    def blink_rate_bpm(self):
+        """Blinks per minute over the full window length."""
+        return self._blink_count / self.window_sec * 60
+
+    # --- Arbitrary Windows ---
+    def blinks_since(self, t0):
+        """Blinks on samples at or after `t0` still held in the ring (O(log n) search plus a vectorised count)."""
+        first = self._index_at_or_after(t0)
+        if first >= self._count:
+            return 0
+        start = (self._head + first) % self.capacity
+        end = start + self._count - first
+        if end <= self.capacity:
+            return int(np.count_nonzero(self.blink[start:end]))
+        return int(np.count_nonzero(self.blink[start:]) + np.count_nonzero(self.blink[:end - self.capacity]))
+
+    def blink_rate_since(self, t0, t_now):
+        """Blinks per minute between `t0` and `t_now`; windows longer than the ring holds are undercounted."""
+        return self.blinks_since(t0) / (t_now - t0) * 60 if t_now > t0 else 0.0
+
+    def _index_at_or_after(self, t0):
+        # Position (0 = oldest) of the first sample with t >= t0; the ring is sorted once unrolled at `_head`.
+        head, count, capacity = self._head, self._count, self.capacity
+        first_len = min(count, capacity - head)
+        first = int(np.searchsorted(self.t[head:head + first_len], t0, side='left'))
+        if first < first_len or count == first_len:
+            return first
+        return first_len + int(np.searchsorted(self.t[:count - first_len], t0, side='left'))
@@ -39,6 +39,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Calibration Modal Element References ---
     const calibrationModal = document.getElementById('calibration-modal');
     const startCalibrationBtn = document.getElementById('start-calibration-btn');
+    const cancelCalibrationBtn = document.getElementById('cancel-calibration-btn');
     const recalibrateBtn = document.getElementById('recalibrate-btn');
     const calibrationStatus = document.getElementById('calibration-status');
     const userNameInputCalibration = document.getElementById('user-name-calibration'); // Name input in calibration
@@ -46,6 +47,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- State Management ---
     let isSessionActive = false;
     let fetchDataInterval = null;
+    let liveStream = null;
+    let liveStats = {};
+    let liveChartInterval = null;
+    let calibrationJobId = null;
 
     // --- Chart Instances ---
     let liveBlinkChart, fatigueHotspotsChart, activityClockChart, weeklyReportChart;
@@ -128,32 +133,90 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
-        calibrationStatus.textContent = 'Calibrating... Please follow instructions on the camera window.';
+        calibrationStatus.textContent = 'Starting camera...';
         startCalibrationBtn.disabled = true;
         try {
-        const response = await fetch('/api/start_calibration', { 
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ user_name: userName })
-        });
-        
-        const result = await response.json();
+            const response = await fetch('/api/start_calibration', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ user_name: userName })
+            });
+            const job = await response.json();
+            if (!job.job_id) throw new Error(job.message || 'Calibration could not be started.');
+
+            // Calibration runs in the background; follow its progress until it finishes.
+            calibrationJobId = job.job_id;
+            cancelCalibrationBtn.classList.remove('hidden');
+            renderCalibrationProgress(job);
+            followCalibration(job.job_id);
+        } catch (error) {
+            showCalibrationError(error);
+        }
+    }
 
-        if (result.status === 'complete') {
+    function followCalibration(jobId) {
+        if (!window.EventSource) {
+            pollCalibration(jobId);
+            return;
+        }
+        const stream = new EventSource(`/api/calibration/${jobId}/stream`);
+        stream.onmessage = (event) => {
+            const job = JSON.parse(event.data);
+            renderCalibrationProgress(job);
+            if (job.status !== 'running') stream.close();
+        };
+        stream.onerror = () => {
+            if (stream.readyState === EventSource.CLOSED) pollCalibration(jobId);
+        };
+    }
+
+    async function pollCalibration(jobId) {
+        try {
+            const response = await fetch(`/api/calibration/${jobId}`);
+            const job = await response.json();
+            renderCalibrationProgress(job);
+            if (job.status === 'running') setTimeout(() => pollCalibration(jobId), 500);
+        } catch (error) {
+            showCalibrationError(error);
+        }
+    }
+
+    function renderCalibrationProgress(job) {
+        if (job.status === 'running') {
+            const step = job.stage === 'BLINK' ? 'Now blink normally.' : 'Keep your eyes open.';
+            calibrationStatus.textContent = `Calibrating... ${step} ${Math.round(job.progress * 100)}%`;
+            return;
+        }
+        calibrationJobId = null;
+        cancelCalibrationBtn.classList.add('hidden');
+        if (job.status === 'complete') {
             calibrationStatus.textContent = 'Calibration Complete! Reloading...';
             // Reload the page after a short delay
             setTimeout(() => {
                 window.location.reload();
             }, 1500);
+        } else if (job.status === 'cancelled') {
+            calibrationStatus.textContent = 'Calibration cancelled.';
+            startCalibrationBtn.disabled = false;
         } else {
-            throw new Error(result.message || 'Calibration failed on the server.');
+            showCalibrationError(new Error(job.message || 'Calibration failed on the server.'));
         }
+    }
 
-    } catch (error) {
+    function showCalibrationError(error) {
         console.error("Calibration error:", error);
         calibrationStatus.textContent = `Error: ${error.message}. Please try again.`;
+        cancelCalibrationBtn.classList.add('hidden');
         startCalibrationBtn.disabled = false;
     }
+
+    async function handleCancelCalibration() {
+        if (!calibrationJobId) return;
+        try {
+            await fetch(`/api/calibration/${calibrationJobId}/cancel`, { method: 'POST' });
+        } catch (error) {
+            console.error("Could not cancel calibration:", error);
+        }
     }
 
     // --- UI Update Functions ---
@@ -161,18 +224,59 @@ document.addEventListener('DOMContentLoaded', () => {
         if (isSessionActive) {
             idleView.classList.add('hidden');
             liveView.classList.remove('hidden');
-            fetchDataInterval = setInterval(fetchLiveData, 3000);
-            fetchLiveData();
+            startLiveUpdates();
         } else {
             liveView.classList.add('hidden');
             idleView.classList.remove('hidden');
-            if (fetchDataInterval) {
-                clearInterval(fetchDataInterval);
-            }
+            stopLiveUpdates();
             fetchSummaryData();
         }
     }
 
+    // Live stats are pushed over Server-Sent Events; polling is only the fallback.
+    function startLiveUpdates() {
+        stopLiveUpdates();
+        liveStats = {};
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+        liveStream = new EventSource('/api/stream');
+        liveStream.onmessage = (event) => renderLiveStats(JSON.parse(event.data));
+        // The chart keeps one point every 3 seconds however often updates arrive.
+        liveChartInterval = setInterval(() => {
+            if (liveStats.bpm !== undefined) updateLiveChart(liveStats.bpm);
+        }, 3000);
+        liveStream.onerror = () => {
+            // The browser retries dropped connections itself; it only gives up when the endpoint is unusable.
+            if (liveStream && liveStream.readyState === EventSource.CLOSED) {
+                console.warn('Live stream unavailable, falling back to polling.');
+                stopLiveUpdates();
+                startPolling();
+            }
+        };
+    }
+
+    function startPolling() {
+        fetchDataInterval = setInterval(fetchLiveData, 3000);
+        fetchLiveData();
+    }
+
+    function stopLiveUpdates() {
+        if (liveStream) {
+            liveStream.close();
+            liveStream = null;
+        }
+        if (fetchDataInterval) {
+            clearInterval(fetchDataInterval);
+            fetchDataInterval = null;
+        }
+        if (liveChartInterval) {
+            clearInterval(liveChartInterval);
+            liveChartInterval = null;
+        }
+    }
+
     // --- API Communication & Data Handling ---
     async function loadSettings() {
         try {
@@ -330,15 +434,8 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const response = await fetch('/api/stats');
             const data = await response.json();
-             console.log(data);
-            document.getElementById('total-blinks').textContent = data.blinks;
-            // document.getElementById('total-yawns').textContent = data.yawns;
-            if (document.getElementById('fatigue-score-value')) {
-             document.getElementById('fatigue-score-value').textContent = data.fatigue_score;
-            }
-            const hours = Math.floor(data.active_time / 3600);
-            const minutes = Math.floor((data.active_time % 3600) / 60);
-            document.getElementById('active-time').textContent = `${hours}h ${minutes}m`;
+            // `seq` only changes when the numbers do, so an unchanged snapshot needs no re-render.
+            if (data.seq !== liveStats.seq) renderLiveStats(data);
             updateLiveChart(data.bpm);
         } catch (error) {
             console.error('Failed to fetch live data:', error);
@@ -347,6 +444,23 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Accepts a full stats object (polling) or just the fields that changed (stream).
+    function renderLiveStats(delta) {
+        Object.assign(liveStats, delta);
+        const data = liveStats;
+        document.getElementById('total-blinks').textContent = data.blinks;
+        // document.getElementById('total-yawns').textContent = data.yawns;
+        if (document.getElementById('fatigue-score-value')) {
+         document.getElementById('fatigue-score-value').textContent = data.fatigue_score;
+        }
+        if (data.perclos !== undefined) {
+            document.getElementById('perclos-value').textContent = `${data.perclos.toFixed(1)}%`;
+        }
+        const hours = Math.floor(data.active_time / 3600);
+        const minutes = Math.floor((data.active_time % 3600) / 60);
+        document.getElementById('active-time').textContent = `${hours}h ${minutes}m`;
+    }
+
     async function fetchSummaryData() {
         try {
             const response = await fetch('/api/summary_stats');
@@ -498,6 +612,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Calibration Listeners
     startCalibrationBtn.addEventListener('click', handleStartCalibration);
+    cancelCalibrationBtn.addEventListener('click', handleCancelCalibration);
     recalibrateBtn.addEventListener('click', () => {
         closeSettingsModal();
         openCalibrationModal();
@@ -0,0 +1,110 @@
+"""
+Regression tests for the monitoring database migrations (db_schema.py).
+
+    python -m pytest tests
+"""
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_schema  # noqa: E402
+
+# The v1 tables, as the first release created them.
+V1_SESSIONS_SQL = '''CREATE TABLE sessions (session_id INTEGER PRIMARY KEY AUTOINCREMENT, start_time TEXT NOT NULL, end_time TEXT, total_active_time_sec INTEGER DEFAULT 0, total_idle_time_sec INTEGER DEFAULT 0)'''
+V1_EVENTS_SQL = '''CREATE TABLE events (event_id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL, timestamp TEXT NOT NULL, event_type TEXT NOT NULL, value_numeric REAL, value_text TEXT, FOREIGN KEY (session_id) REFERENCES sessions (session_id))'''
+V1_TYPES = ("SESSION_START", "BLINK", "YAWN_DETECTED", "SUMMARY_BPM", "BREAK_TAKEN", "SESSION_END") # BREAK_TAKEN was renamed later
+BATCH_SIZE = 100
+
+
+class Interrupted(Exception):
+    pass
+
+
+def make_v1_db(path, sessions=3, events_per_session=170):
+    conn = sqlite3.connect(path)
+    conn.execute(V1_SESSIONS_SQL)
+    conn.execute(V1_EVENTS_SQL)
+    start = datetime(2025, 3, 1, 9, 0, 0)
+    for s in range(sessions):
+        session_start = start + timedelta(days=s)
+        session_end = session_start + timedelta(seconds=events_per_session)
+        session_id = conn.execute("INSERT INTO sessions (start_time, end_time, total_active_time_sec) VALUES (?, ?, ?)",
+                                  (session_start.isoformat(), session_end.isoformat(), events_per_session)).lastrowid
+        conn.executemany("INSERT INTO events (session_id, timestamp, event_type, value_numeric) VALUES (?, ?, ?, ?)",
+                         [(session_id, (session_start + timedelta(seconds=i, microseconds=1000 * (i % 7))).isoformat(),
+                           V1_TYPES[i % len(V1_TYPES)], i * 0.5 if i % 3 else None) for i in range(events_per_session)])
+    conn.commit()
+    return conn
+
+
+def v1_events(conn):
+    return conn.execute("SELECT event_id, session_id, timestamp, event_type, value_numeric FROM events ORDER BY event_id").fetchall()
+
+
+def migrated_events(conn):
+    return conn.execute("SELECT e.event_id, e.session_id, e.ts_ms, t.name, e.value_numeric FROM events e JOIN event_types t ON t.type_id = e.type_id ORDER BY e.event_id").fetchall()
+
+
+def expected_rows(rows):
+    return [(event_id, session_id, db_schema.iso_to_ms(timestamp), event_type, value) for event_id, session_id, timestamp, event_type, value in rows]
+
+
+def test_v1_migration_resumes_after_interruption(tmp_path):
+    conn = make_v1_db(str(tmp_path / "v1.db"))
+
+    def interrupt_after_first_batch(copied, total):
+        if copied >= BATCH_SIZE:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        db_schema.ensure_schema(conn, batch_size=BATCH_SIZE, progress=interrupt_after_first_batch)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM events_v2").fetchone()[0] == BATCH_SIZE
+
+    # The old table stays live until the swap; rows written meanwhile must be carried over.
+    conn.execute("INSERT INTO events (session_id, timestamp, event_type) VALUES (1, ?, 'BLINK')", (datetime(2025, 3, 1, 9, 5).isoformat(),))
+    conn.commit()
+    original = v1_events(conn)
+
+    db_schema.ensure_schema(conn, batch_size=BATCH_SIZE)
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db_schema.SCHEMA_VERSION
+    assert not conn.execute("SELECT name FROM sqlite_master WHERE name = 'events_v2'").fetchone()
+    assert migrated_events(conn) == expected_rows(original)
+    assert conn.execute("SELECT start_ms FROM sessions WHERE session_id = 1").fetchone()[0] == db_schema.iso_to_ms("2025-03-01T09:00:00")
+    assert conn.execute("SELECT COUNT(*) FROM session_metrics").fetchone()[0] == 3
+
+
+def test_v1_migration_reserves_ids_for_legacy_types(tmp_path):
+    conn = make_v1_db(str(tmp_path / "v1.db"), sessions=1, events_per_session=20)
+    db_schema.ensure_schema(conn, batch_size=BATCH_SIZE)
+
+    type_ids = dict(conn.execute("SELECT name, type_id FROM event_types"))
+    for name, type_id in db_schema.EVENT_TYPE_IDS.items():
+        assert type_ids[name] == type_id
+    assert type_ids["BREAK_TAKEN"] >= db_schema.LEGACY_TYPE_ID_BASE
+
+
+def test_current_database_gets_new_event_types(tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "current.db"))
+    db_schema.ensure_schema(conn)
+    # A legacy type on the next free id, as migrations before reserved ids left it.
+    next_id = len(db_schema.EVENT_TYPES) + 1
+    conn.execute("INSERT INTO sessions (start_time, start_ms) VALUES ('2025-03-01T09:00:00', 0)")
+    conn.execute("INSERT INTO event_types (type_id, name) VALUES (?, 'BREAK_TAKEN')", (next_id,))
+    conn.executemany("INSERT INTO events (session_id, ts_ms, type_id) VALUES (1, ?, ?)", [(i, next_id) for i in range(5)])
+    conn.commit()
+
+    monkeypatch.setitem(db_schema.EVENT_TYPE_IDS, "NEW_EVENT", next_id)
+    db_schema.ensure_schema(conn)
+
+    type_ids = dict(conn.execute("SELECT name, type_id FROM event_types"))
+    assert type_ids["NEW_EVENT"] == next_id
+    assert type_ids["BREAK_TAKEN"] >= db_schema.LEGACY_TYPE_ID_BASE
+    names = conn.execute("SELECT t.name, COUNT(*) FROM events e JOIN event_types t ON t.type_id = e.type_id GROUP BY t.name").fetchall()
+    assert names == [("BREAK_TAKEN", 5)]
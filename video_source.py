@@ -0,0 +1,63 @@
+"""
+Video files as frame sources on their own timeline.
+
+Kept free of the dashboard module, so monitoring workers (multi_stream.py)
+can replay files without importing Flask and the rest of the application.
+"""
+import time
+
+import cv2
+
+DEFAULT_FPS = 30.0
+
+
+class ReplayClock:
+    """A clock that only moves when a replay source advances it."""
+    __slots__ = ("now",)
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class VideoReplaySource:
+    """
+    `cv2.VideoCapture` stand-in that reads a video file and stamps frames
+    with their position in the recording.
+
+    Args:
+        path (str): The video file.
+        clock (ReplayClock): Advanced to each frame's timestamp; None when
+            replaying in real time on the wall clock.
+        realtime (bool): Sleep between frames to play at the recorded rate.
+    """
+
+    def __init__(self, path, clock=None, realtime=False):
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        self.clock = clock
+        self.realtime = realtime
+        self.frame_index = 0
+        self._start = clock() if clock is not None else time.time()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return ret, frame
+        t = self._start + self.frame_index / self.fps
+        self.frame_index += 1
+        if self.realtime:
+            delay = t - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        if self.clock is not None:
+            self.clock.now = t
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
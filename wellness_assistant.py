@@ -1,6 +1,16 @@
 import sqlite3
 from datetime import datetime
-import numpy as np
+
+DATABASE_ERROR_PREFIX = "Database error"
+
+# Per-type event counts for one session, raw events plus any the retention engine compacted; both come from index seeks.
+EVENT_COUNTS_SQL = """
+    SELECT t.name, SUM(c.n) FROM (
+        SELECT type_id, COUNT(*) AS n FROM events WHERE session_id = ?1 GROUP BY type_id
+        UNION ALL
+        SELECT type_id, SUM(count) FROM event_aggregates WHERE session_id = ?1 GROUP BY type_id) c
+    JOIN event_types t ON t.type_id = c.type_id
+    GROUP BY t.name"""
 
 def get_user_settings(db_path):
     """
@@ -39,55 +49,37 @@ def get_historical_averages(db_path, current_session_id):
     """
     Calculates a more robust historical average for key wellness metrics by
     averaging the results of the most recent 20 past sessions.
+
+    Reads the per-session rows in `session_metrics` with a single query, so
+    the cost does not depend on how much history the database holds.
     """
     conn = None
     try:
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
 
+        # Sessions shorter than 30 seconds are part of the 20-session window but don't count towards the averages.
         cursor.execute("""
-            SELECT session_id, total_active_time_sec 
-            FROM sessions 
-            WHERE end_time IS NOT NULL AND session_id != ?
-            ORDER BY start_time DESC 
-            LIMIT 20
+            SELECT COUNT(*), AVG(bpm), AVG(stare_alerts), AVG(fatigue_events)
+            FROM (
+                SELECT active_sec, bpm, stare_alerts, fatigue_events
+                FROM session_metrics
+                WHERE session_id != ?
+                ORDER BY start_ms DESC
+                LIMIT 20
+            )
+            WHERE active_sec >= 30
         """, (current_session_id,))
-        
-        past_sessions = cursor.fetchall()
-
-        if not past_sessions:
-            return None
-
-        session_bpms = []
-        session_stares = []
-        session_fatigue_events = [] # New combined list
+        session_count, avg_bpm, avg_stare_alerts, avg_fatigue_events = cursor.fetchone()
 
-        for session_id, active_time_sec in past_sessions:
-            if active_time_sec < 30:
-                continue
-
-            cursor.execute("SELECT event_type, COUNT(*) FROM events WHERE session_id = ? GROUP BY event_type", (session_id,))
-            events = dict(cursor.fetchall())
-            
-            blinks = events.get('BLINK', 0)
-            active_minutes = active_time_sec / 60.0
-            bpm = blinks / active_minutes if active_minutes > 0 else 0
-            session_bpms.append(bpm)
-            
-            session_stares.append(events.get('STARE_ALERT_TRIGGERED', 0))
-            
-            # Combine all fatigue events into one metric
-            fatigue_count = events.get('MICRO_SLEEP_DETECTED', 0) + events.get('YAWN_DETECTED', 0) + events.get('FATIGUE_SCORE_ALERT', 0)
-            session_fatigue_events.append(fatigue_count)
-
-        if not session_bpms:
+        if not session_count:
             return None
 
         historical_data = {
-            "session_count": len(session_bpms),
-            "avg_bpm": np.mean(session_bpms),
-            "avg_stare_alerts": np.mean(session_stares),
-            "avg_fatigue_events": np.mean(session_fatigue_events) # New combined average
+            "session_count": session_count,
+            "avg_bpm": avg_bpm,
+            "avg_stare_alerts": avg_stare_alerts,
+            "avg_fatigue_events": avg_fatigue_events # Combined average of yawns, micro-sleeps and fatigue alerts
         }
         
         return historical_data
@@ -99,10 +91,29 @@ def get_historical_averages(db_path, current_session_id):
         if conn:
             conn.close()
 
-def generate_session_summary(session_id, start_time_str, end_time_str, db_path="monitoring_data.db"):
+def goal_achievement(current_bpm, user_settings):
+    """The report's goal section for a session's blink rate under the given settings."""
+    goals = {}
+    if user_settings and user_settings.get('enable_weekly_goals'):
+        goal_bpm = user_settings.get('goal_blink_rate')
+        if goal_bpm is not None and goal_bpm > 0:
+            if current_bpm >= goal_bpm:
+                goals["blink_rate"] = {
+                    "status": "good",
+                    "text": f"ACHIEVED! (Your avg of {current_bpm:.1f} BPM met the {goal_bpm} BPM target)"
+                }
+            else:
+                goals["blink_rate"] = {
+                    "status": "warning",
+                    "text": f"In Progress. (Your avg was {current_bpm:.1f} BPM, goal is {goal_bpm} BPM)"
+                }
+    return goals
+
+def generate_session_summary(session_id, start_time_str, end_time_str, db_path="monitoring_data.db", user_settings=None):
     """
     Analyzes a session and returns a structured JSON report with insights
-    and status indicators for frontend rendering.
+    and status indicators for frontend rendering. `user_settings` defaults
+    to the settings row read from `db_path`.
     """
     report_data = {
         "session_id": session_id,
@@ -129,31 +140,25 @@ def generate_session_summary(session_id, start_time_str, end_time_str, db_path="
         report_data["active_time_str"] = f"{minutes} minutes, {seconds} seconds"
         active_minutes = total_seconds / 60.0
         
-        cursor.execute("SELECT event_type, COUNT(*) FROM events WHERE session_id = ? GROUP BY event_type", (session_id,))
-        current_events = dict(cursor.fetchall())
-        
-        current_blinks = current_events.get('BLINK', 0)
+        # Finished sessions have their metrics stored; only a session still in progress needs its events counted.
+        cursor.execute("SELECT blinks, stare_alerts, fatigue_events FROM session_metrics WHERE session_id = ?", (session_id,))
+        metrics = cursor.fetchone()
+        if metrics:
+            current_blinks, current_stares, current_fatigue_events = metrics
+        else:
+            cursor.execute(EVENT_COUNTS_SQL, (session_id,))
+            current_events = dict(cursor.fetchall())
+            current_blinks = current_events.get('BLINK', 0)
+            current_stares = current_events.get('STARE_ALERT_TRIGGERED', 0)
+            # New: Combine all fatigue events for the current session
+            current_fatigue_events = current_events.get('MICRO_SLEEP_DETECTED', 0) + current_events.get('YAWN_DETECTED', 0) + current_events.get('FATIGUE_SCORE_ALERT', 0)
         current_bpm = (current_blinks / active_minutes) if active_minutes > 0 else 0
-        current_stares = current_events.get('STARE_ALERT_TRIGGERED', 0)
-        
-        # New: Combine all fatigue events for the current session
-        current_fatigue_events = current_events.get('MICRO_SLEEP_DETECTED', 0) + current_events.get('YAWN_DETECTED', 0) + current_events.get('FATIGUE_SCORE_ALERT', 0)
 
         # --- 2. Fetch User Settings & Check Goals ---
-        user_settings = get_user_settings(db_path)
-        if user_settings and user_settings['enable_weekly_goals']:
-            goal_bpm = user_settings.get('goal_blink_rate')
-            if goal_bpm is not None and goal_bpm > 0:
-                if current_bpm >= goal_bpm:
-                    report_data["goal_achievement"]["blink_rate"] = {
-                        "status": "good",
-                        "text": f"ACHIEVED! (Your avg of {current_bpm:.1f} BPM met the {goal_bpm} BPM target)"
-                    }
-                else:
-                    report_data["goal_achievement"]["blink_rate"] = {
-                        "status": "warning",
-                        "text": f"In Progress. (Your avg was {current_bpm:.1f} BPM, goal is {goal_bpm} BPM)"
-                    }
+        if user_settings is None:
+            user_settings = get_user_settings(db_path)
+        report_data["session_bpm"] = current_bpm # Lets the goal section be re-derived from a stored report (see session_reports.py)
+        report_data["goal_achievement"] = goal_achievement(current_bpm, user_settings)
         
         # --- 3. Get Historical Averages & Generate Insights ---
         history = get_historical_averages(db_path, session_id)
@@ -194,7 +199,7 @@ def generate_session_summary(session_id, start_time_str, end_time_str, db_path="
         return report_data
 
     except sqlite3.Error as e:
-        report_data["error"] = f"Database error: {e}"
+        report_data["error"] = f"{DATABASE_ERROR_PREFIX}: {e}"
         return report_data
     finally:
         if conn: